@@ -1,8 +1,22 @@
 from django.contrib.auth.models import UserManager
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
+from django.core.mail import EmailMessage, get_connection
 from django.contrib.auth.forms import PasswordResetForm
 from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.contrib.sites.models import Site
+from django.db import connections, router, transaction
+from django.db.models.signals import post_save
+from django.template import loader
+from django.utils.http import int_to_base36
+
+WELCOME_EMAIL_TEMPLATE = 'registration/welcome_email.html'
+WELCOME_SUBJECT_TEMPLATE = 'registration/welcome_subject.txt'
+# the scheme of the password reset link in welcome emails
+WELCOME_PROTOCOL = 'http'
+# most values we put in a single IN clause
+IN_BATCH_SIZE = 500
 
 
 class CustomPasswordResetForm(PasswordResetForm):
@@ -20,24 +34,30 @@ class CustomPasswordResetForm(PasswordResetForm):
 
 
 class CustomUserManager(UserManager):
-    def send_welcome_email(request, to_email):
+    def send_welcome_email(self, to_email):
         try:
             validate_email(to_email)
         except ValidationError:
             raise
 
-        # use the password reset form to send the welcome email to easily
-        # obtain password reset url
+        # use the password reset form to find the account(s) to welcome the
+        # way a password reset would
         form = CustomPasswordResetForm({'email': to_email})
         if form.is_valid():
-            opts = {
-                'email_template_name': 'registration/welcome_email.html',
-                'subject_template_name': 'registration/welcome_subject.txt',
-            }
-            form.save(**opts)
+            self.send_welcome_emails(form.users_cache)
         else:
             raise Exception(str(form.errors))
 
+    def send_welcome_emails(self, users):
+        """
+        Sends each of users the welcome email, all over one connection to the
+        mail server.
+        """
+        site = Site.objects.get_current()
+        messages = [_welcome_message(user, site) for user in users]
+        if messages:
+            get_connection().send_messages(messages)
+
     def get(self, *args, **kwargs):
         """
         Override the default get() method so that we can check all the emails
@@ -151,6 +171,63 @@ class CustomUserManager(UserManager):
 
         return user
 
+    def create_users(self, emails):
+        """
+        Creates a fresh account for each of emails, none of which may belong
+        to an account yet, in a handful of queries however many there are.
+        Returns an (Email objects, Users) tuple of the new accounts.
+
+        Unlike create_user, sends no signals but the Emails' post_save, and
+        no welcome emails: the caller should send_welcome_emails(users) once
+        the accounts are committed, so that a mail server failure can't undo
+        them and a rollback can't leave them welcomed.
+
+        Must run inside the caller's transaction (e.g. under
+        transaction.commit_on_success). It never commits, so that the
+        accounts and their Emails commit together.
+        """
+        from group_mail.apps.common.models import CustomUser, Email
+
+        for email in emails:
+            validate_email(email)
+        if not emails:
+            return [], []
+        db = router.db_for_write(CustomUser)
+        if not transaction.is_managed(using=db):
+            raise transaction.TransactionManagementError(
+                    'create_users must run inside a transaction')
+
+        users = []
+        for email in emails:
+            user = User(username=email, email=UserManager.normalize_email(email))
+            user.set_unusable_password()
+            users.append(user)
+        # bulk_create can't create inherited models, so we create the Users
+        # and then their CustomUser rows ourselves
+        User.objects.bulk_create(users)
+        user_ids = {}
+        for i in xrange(0, len(emails), IN_BATCH_SIZE):
+            user_ids.update(User.objects.filter(username__in=emails[i:i + IN_BATCH_SIZE])
+                            .values_list('username', 'id'))
+        qn = connections[db].ops.quote_name
+        cursor = connections[db].cursor()
+        cursor.executemany('INSERT INTO %s (%s, %s) VALUES (%%s, %%s)' % (
+                qn(CustomUser._meta.db_table), qn('user_ptr_id'), qn('phone_number')),
+                [(user_ids[email], '') for email in emails])
+
+        Email.objects.bulk_create([Email(email=email, user_id=user_ids[email])
+                                   for email in emails])
+        email_objs = []
+        for i in xrange(0, len(emails), IN_BATCH_SIZE):
+            email_objs.extend(Email.objects.filter(email__in=emails[i:i + IN_BATCH_SIZE]))
+        for email_obj in email_objs:
+            post_save.send(sender=Email, instance=email_obj, created=True,
+                           raw=False, using=db)
+
+        for user in users:
+            user.id = user_ids[user.username]
+        return email_objs, users
+
     def get_or_create_user(self, email, password=None, first_name=None, \
             last_name=None, phone_number=None, send_welcome=True):
         """
@@ -192,3 +269,24 @@ class CustomUserManager(UserManager):
 
         user.populate(email, first_name, last_name, phone_number)
         return user
+
+
+def _welcome_message(user, site):
+    """
+    Returns the welcome email for user, whose password reset link (see
+    PasswordResetForm.save) points at site.
+    """
+    c = {
+        'email': user.email,
+        'domain': site.domain,
+        'site_name': site.name,
+        'uid': int_to_base36(user.id),
+        'user': user,
+        'token': default_token_generator.make_token(user),
+        'protocol': WELCOME_PROTOCOL,
+    }
+    subject = loader.render_to_string(WELCOME_SUBJECT_TEMPLATE, c)
+    # email subject *must not* contain newlines
+    subject = ''.join(subject.splitlines())
+    body = loader.render_to_string(WELCOME_EMAIL_TEMPLATE, c)
+    return EmailMessage(subject, body, to=[user.email])
@@ -190,8 +190,9 @@ class Email(models.Model):
         he's admin of? Right now, we do nothing: he remains admin, even
         though he can't even access the group.
         """
-        for group in self.group_set.all():
-            group.remove_members([self.email])
+        # we do the import here to avoid a circular dependency
+        from group_mail.apps.group.models import Group
+        Group.objects.remove_members(self.group_set.all(), [self.email])
 
     def __unicode__(self):
         return self.email
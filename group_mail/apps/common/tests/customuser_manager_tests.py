@@ -1,3 +1,4 @@
+from django.core import mail
 from django.core.exceptions import ValidationError
 from group_mail.apps.test.test_utils import NoMMTestCase
 from group_mail.apps.common.models import CustomUser, Email
@@ -85,6 +86,16 @@ class CreateUserTest(NoMMTestCase):
             # we expect and want this exception to be thrown
             pass
 
+    def test_welcome_emails_match(self):
+        user = CustomUser.objects.create_user(send_welcome=False, **self.kwargs)
+        mail.outbox = []
+        CustomUser.objects.send_welcome_email(user.email)
+        CustomUser.objects.send_welcome_emails([user])
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].subject, mail.outbox[1].subject)
+        self.assertEqual(mail.outbox[0].body, mail.outbox[1].body)
+        self.assertEqual(mail.outbox[0].to, [user.email])
+
     def test_duplicate_phone_number(self):
         CustomUser.objects.create_user(**self.kwargs)
 
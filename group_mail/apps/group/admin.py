@@ -1,4 +1,32 @@
 from django.contrib import admin
 from group_mail.apps.group.models import Group
 
-admin.site.register(Group)
+
+class SizeListFilter(admin.SimpleListFilter):
+    """ Filters groups by member_count, so without joining their emails. """
+    title = 'size'
+    parameter_name = 'size'
+    SIZES = (('1', 'just the creator', 1, 1),
+             ('2-10', '2 to 10 members', 2, 10),
+             ('11-100', '11 to 100 members', 11, 100),
+             ('101-', 'over 100 members', 101, None))
+
+    def lookups(self, request, model_admin):
+        return [(value, title) for value, title, low, high in self.SIZES]
+
+    def queryset(self, request, queryset):
+        for value, title, low, high in self.SIZES:
+            if self.value() == value:
+                queryset = queryset.filter(member_count__gte=low)
+                if high is not None:
+                    queryset = queryset.filter(member_count__lte=high)
+        return queryset
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('name', 'code', 'member_count', 'admin_count',
+                    'members_changed', 'is_spare')
+    list_filter = (SizeListFilter, 'is_spare')
+    search_fields = ('name',)
+
+admin.site.register(Group, GroupAdmin)
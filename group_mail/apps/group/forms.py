@@ -42,23 +42,20 @@ class CreateGroupForm(GroupForm, PopulatedEmailForm):
 class JoinGroupForm(GroupForm, PopulatedEmailForm):
     def clean_group_name(self):
         group_name = self.cleaned_data['group_name']
-        self.groups = Group.objects.filter(name=group_name)
-        if len(self.groups) == 0:
+        if not Group.objects.filter(name=group_name).exists():
             raise forms.ValidationError('The group %s does not exist.' % group_name)
         return group_name
 
     def clean_group_code(self):
+        group_name = self.cleaned_data.get('group_name')
         group_code = self.cleaned_data['group_code']
-        if self.groups:
-            for group in self.groups:
-                if group.code == group_code:
-                    return group_code
-            # we didn't find a single group with this group code
-            raise Group.CodeInvalid(name=self.group.name, code=group_code)
-        else:
+        if group_name is None:
             # we'll focus the user on the 'no group with that name' error by
             # returning cleanly here
             return group_code
+        if not Group.objects.filter(name=group_name, code=group_code).exists():
+            raise Group.CodeInvalid(name=group_name, code=group_code)
+        return group_code
 
 
 class CreateOrJoinGroupForm(GroupForm, UserEmailForm):
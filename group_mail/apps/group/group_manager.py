@@ -1,16 +1,25 @@
 import re
-from django.db import models
+import sys
+from django.db import models, transaction, connections, IntegrityError
+from django.db.models.signals import m2m_changed
 from django.conf import settings
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
 from django.contrib.sites.models import Site
-from group_mail.apps.mailman import mailman_cmds
+from group_mail.apps.mailman import outbox, mailman_cmds
+from group_mail.apps.mailman.models import MailmanOperation
+from group_mail.apps.common.custom_user_manager import IN_BATCH_SIZE
 
 
 class GroupManager(models.Manager):
 
     valid_pattern = '^[\w\d]+$'
+    # times create_group tries again after an IntegrityError that wasn't
+    # caused by the group already existing
+    CREATE_RETRIES = 2
 
     def send_group_confirm_email(self, cmd_str, group_name, group_code, email):
         """
@@ -79,11 +88,8 @@ class GroupManager(models.Manager):
 
     def validate_group_uniqueness(self, group_name, group_code):
         from group_mail.apps.group.models import Group
-        try:
-            Group.objects.get(name=group_name, code=group_code)
+        if self.filter(name=group_name, code=group_code).exists():
             raise Group.AlreadyExists(name=group_name, code=group_code)
-        except Group.DoesNotExist:
-            pass
 
     def validate_group_name(self, group_name):
         from group_mail.apps.group.models import Group
@@ -100,41 +106,268 @@ class GroupManager(models.Manager):
             raise Group.CodeNotAllowed(code=group_code)
 
     def create_group(self, creator_email, group_name, group_code):
+        """
+        Creates the group with group_name and group_code, with creator_email
+        as its first member and admin, and its mailman list(s). The db work
+        happens in one transaction; a new creator is welcomed once it commits.
+        """
+        group, new_users = self._create_group(creator_email, group_name, group_code)
+        group.welcome(new_users)
+        return group
+
+    @transaction.commit_on_success
+    def _create_group(self, creator_email, group_name, group_code):
+        """
+        Does create_group's db (and, without the outbox, mailman) work.
+        Returns the group and the Users created for creator_email.
+        """
         from group_mail.apps.group.models import Group
 
         group_name = group_name.strip()
         group_code = group_code.strip()
 
+        self.validate_group_name(group_name)
+        self.validate_group_code(group_code)
+
+        # the unique (name, code) constraint, not a check beforehand, decides
+        # which of two concurrent creations of a group wins
+        for attempt in xrange(self.CREATE_RETRIES + 1):
+            sid = transaction.savepoint()
+            try:
+                group, claimed = self._insert_group(group_name, group_code)
+            except IntegrityError:
+                transaction.savepoint_rollback(sid)
+                if self.filter(name=group_name, code=group_code).exists():
+                    raise Group.AlreadyExists(name=group_name, code=group_code)
+                if attempt == self.CREATE_RETRIES:
+                    raise
+            else:
+                transaction.savepoint_commit(sid)
+                break
+
+        if settings.MODIFY_MAILMAN_DB:
+            if claimed:
+                # the group's list already exists; it just needs configuring
+                outbox.submit(MailmanOperation.ADOPT_LIST, group)
+            else:
+                # Try creating the mailman list first, since this is the last
+                # place we expect something might go wrong
+                outbox.submit(MailmanOperation.NEWLIST, group)
+
+        # adding members has to come after we make the mailman list, since it
+        # will try to add members to the mailman list
         try:
-            self.validate_group(group_name, group_code)
+            new_users = group.add_members_in_transaction([creator_email])
+            group.add_admin_email(creator_email)
         except Exception:
+            if settings.MODIFY_MAILMAN_DB and not settings.MAILMAN_OUTBOX:
+                # the group is about to be rolled back, so the lists we just
+                # made for it mustn't outlive it
+                mailman_cmds.remove_new_lists(group, internal=not claimed)
             raise
+        return group, new_users
+
+    def remove_members(self, groups, member_email_list):
+        """
+        Removes the emails in member_email_list from each of groups, as
+        members and as admins, in a few statements however many emails and
+        groups there are, and takes them off the groups' mailman lists, all
+        lists at once (see outbox.submit_many).
+
+        The db changes are committed before mailman is asked to make them,
+        so a list that fails doesn't undo the other lists' removals; it's
+        only logged, and the next sync_mailman catches it up, since the
+        group's members_changed moved.
+        """
+        groups = list(groups)
+        if not groups:
+            return
+        member_email_list = list(member_email_list)
+        transaction.commit_on_success(self._remove_members)(groups, member_email_list)
+
+        if settings.MODIFY_MAILMAN_DB and not settings.MAILMAN_OUTBOX:
+            outcomes = outbox.submit_many(MailmanOperation.REMOVE_MEMBERS,
+                    [(group, member_email_list) for group in groups],
+                    raise_errors=False)
+            for group in groups:
+                if isinstance(outcomes[group.id], Exception):
+                    print >>sys.stderr, 'failed to remove %s from %s: %s' % (
+                            ', '.join(member_email_list), group.name,
+                            outcomes[group.id])
+
+    def _remove_members(self, groups, member_email_list):
+        """ Does remove_members' db work, in the caller's transaction. """
+        from group_mail.apps.common.models import Email
+
+        email_objs = []
+        for i in xrange(0, len(member_email_list), IN_BATCH_SIZE):
+            email_objs.extend(Email.objects.filter(
+                    email__in=member_email_list[i:i + IN_BATCH_SIZE]))
+        group_ids = [group.id for group in groups]
+        if email_objs:
+            for field in (self.model.emails, self.model.admin_emails):
+                self._remove_emails(field.through, groups, email_objs)
+            now = timezone.now()
+            self.filter(id__in=group_ids).update(members_changed=now)
+            for group in groups:
+                group.members_changed = now
+
+        if settings.MODIFY_MAILMAN_DB and settings.MAILMAN_OUTBOX:
+            # the outbox's rows belong in the same transaction as the change
+            outbox.submit_many(MailmanOperation.REMOVE_MEMBERS,
+                    [(group, member_email_list) for group in groups])
 
+    def _remove_emails(self, through, groups, email_objs):
+        """
+        Deletes the rows of the m2m table through linking any of groups to
+        any of email_objs, in one statement per IN_BATCH_SIZE emails. Sends
+        m2m_changed as group.<field>.remove(*email_objs) would for each
+        group, or as email.group_set.remove(*groups) would for each email if
+        there are fewer emails.
+        """
+        from group_mail.apps.common.models import Email
+
+        group_ids = [group.id for group in groups]
+        email_ids = [email_obj.id for email_obj in email_objs]
+
+        def send(action):
+            if len(email_objs) < len(groups):
+                for email_obj in email_objs:
+                    m2m_changed.send(sender=through, instance=email_obj,
+                            action=action, reverse=True, model=self.model,
+                            pk_set=set(group_ids), using=self.db)
+            else:
+                for group in groups:
+                    m2m_changed.send(sender=through, instance=group,
+                            action=action, reverse=False, model=Email,
+                            pk_set=set(email_ids), using=self.db)
+        send('pre_remove')
+        # QuerySet.delete() would select the rows before deleting them
+        qn = connections[self.db].ops.quote_name
+        for i in xrange(0, len(email_ids), IN_BATCH_SIZE):
+            batch = email_ids[i:i + IN_BATCH_SIZE]
+            connections[self.db].cursor().execute(
+                    'DELETE FROM %s WHERE %s IN (%s) AND %s IN (%s)' % (
+                        qn(through._meta.db_table),
+                        qn(through._meta.get_field('group').column),
+                        ', '.join(['%s'] * len(group_ids)),
+                        qn(through._meta.get_field('email').column),
+                        ', '.join(['%s'] * len(batch))),
+                    group_ids + batch)
+        transaction.commit_unless_managed(using=self.db)
+        send('post_remove')
+
+    def update_counts(self, group_ids=None, members=True, admins=True):
+        """
+        Recomputes member_count (if members) and admin_count (if admins) of
+        the groups with group_ids, or of every group, in one statement.
+        """
+        if group_ids is not None:
+            group_ids = list(group_ids)
+            if not group_ids:
+                return
+        qn = connections[self.db].ops.quote_name
+        table = qn(self.model._meta.db_table)
+        counts = []
+        for count_field, field, wanted in (
+                ('member_count', self.model.emails, members),
+                ('admin_count', self.model.admin_emails, admins)):
+            if not wanted:
+                continue
+            opts = field.through._meta
+            counts.append('%s = (SELECT COUNT(*) FROM %s WHERE %s.%s = %s.%s)' % (
+                    qn(count_field), qn(opts.db_table), qn(opts.db_table),
+                    qn(opts.get_field('group').column), table, qn('id')))
+        if not counts:
+            return
+        sql = 'UPDATE %s SET %s' % (table, ', '.join(counts))
+        params = []
+        if group_ids is not None:
+            sql += ' WHERE %s IN (%s)' % (qn('id'), ', '.join(['%s'] * len(group_ids)))
+            params = group_ids
+        connections[self.db].cursor().execute(sql, params)
+        transaction.commit_unless_managed(using=self.db)
+
+    def _insert_group(self, group_name, group_code):
+        """
+        Claims a spare group for group_name and group_code, or creates one.
+        Returns the group and whether it was a spare.
+        """
+        group = self.claim_spare_group(group_name, group_code)
+        if group:
+            return group, True
         # we must create the group before the mailman list to get its id
-        group = Group.objects.create(name=group_name,
-                                    code=group_code)
+        return self.create(name=group_name, code=group_code), False
+
+    def claim_spare_group(self, group_name, group_code):
+        """
+        Turns one of the spare groups into the group with group_name and
+        group_code and returns it, or returns None if there are no spares.
+        """
+        spare_ids = self.filter(is_spare=True, spare_pending=False) \
+                .values_list('id', flat=True)
+        for group_id in spare_ids[:5]:
+            # somebody else may claim the same spare first
+            claimed = self.filter(id=group_id, is_spare=True,
+                    spare_pending=False).update(
+                    is_spare=False, name=group_name, code=group_code,
+                    members_changed=timezone.now())
+            if claimed:
+                return self.get(id=group_id)
+        return None
 
-        # Try creating the mailman list first, since this is the last place
-        # we expect something might go wrong
+    def create_spare_group(self):
+        """
+        Creates a spare group, along with its mailman list and postfix alias,
+        for claim_spare_group() to hand out later.
+        """
+        from group_mail.apps.group.models import Group
+        # the group is a spare from the start, so routing and syncing leave
+        # it alone, but pending until its list exists, so nobody claims it.
+        # Spares have no name, and a random code to keep (name, code) unique,
+        # which is also the list password until the spare is claimed.
+        group = Group.objects.create(name='', is_spare=True, spare_pending=True,
+                code=get_random_string(Group.MAX_LEN))
         if settings.MODIFY_MAILMAN_DB:
             try:
-                mailman_cmds.newlist(group)
-            except mailman_cmds.MailmanError:
+                # right away, whatever settings.MAILMAN_OUTBOX says, since the
+                # spare is no use until its list exists
+                outbox.execute(MailmanOperation.NEWLIST, group)
+            except Exception:
+                group.delete()
                 raise
-
-        # add_members has to come after we make the mailman list, since it will
-        # try to add members to the mailman list
-        group.add_members([creator_email])
-        group.add_admin_email(creator_email)
+        Group.objects.filter(id=group.id).update(spare_pending=False)
+        group.spare_pending = False
         return group
 
     def get_group_for_email(self, email_list, group_name):
         """
-        Returns the name of the group with name group_name to which
-        some email_obj in email_list is subscribed.
+        Returns the group with name group_name to which some email_obj in
+        email_list (a list or queryset of Emails) is subscribed, or None.
+        If there are several, returns the oldest.
         """
-        for email_obj in email_list:
-            for group in email_obj.group_set.all():
-                if group.name == group_name:
-                    return group
-        return None
+        groups = list(self.filter(name=group_name, emails__in=email_list)
+                .order_by('id')[:1])
+        return groups[0] if groups else None
+
+    def get_groups_for_senders(self, pairs):
+        """
+        Takes (sender email, group name) pairs and returns a dict mapping
+        each pair to the group with that name to which the sender is
+        subscribed, or None, like get_group_for_email does for one pair.
+        Looks them all up in a single query.
+        """
+        pairs = set(pairs)
+        found = {}
+        if pairs:
+            senders = set(sender for sender, name in pairs)
+            names = set(name for sender, name in pairs)
+            memberships = self.model.emails.through.objects \
+                    .select_related('email', 'group') \
+                    .filter(email__email__in=senders, group__name__in=names) \
+                    .order_by('-group__id')
+            for membership in memberships:
+                # the oldest group wins, since it comes last
+                key = (membership.email.email.lower(), membership.group.name)
+                found[key] = membership.group
+        return dict((pair, found.get((pair[0].lower(), pair[1]))) for pair in pairs)
@@ -0,0 +1,11 @@
+from django.core.management.base import NoArgsCommand
+from group_mail.apps.group.models import Group
+
+
+class Command(NoArgsCommand):
+
+    help = "Recomputes every group's member_count and admin_count."
+
+    def handle_noargs(self, **options):
+        Group.objects.update_counts()
+        self.stdout.write('recounted the members of %d groups\n' % Group.objects.count())
@@ -1,61 +1,152 @@
-from django.db import models
+import sys
+import socket
+import smtplib
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, pre_delete, post_delete
 from django.conf import settings
+from django.utils import timezone
 from group_mail.apps.common.errors import CustomException
-from group_mail.apps.mailman import mailman_cmds
+from group_mail.apps.mailman import outbox, results
+from group_mail.apps.mailman.models import MailmanOperation
 from group_mail.apps.group.group_manager import GroupManager
 from group_mail.apps.common.models import CustomUser, Email
+from group_mail.apps.common.custom_user_manager import IN_BATCH_SIZE
 
 
 class Group(models.Model):
     MAX_LEN = 20  # max length of group name, code
     ALLOWED_CHARS = "Only numbers and letters are allowed."
-    name = models.CharField(max_length=MAX_LEN)
+    # indexed for looking groups up by name when routing mail
+    name = models.CharField(max_length=MAX_LEN, db_index=True)
     code = models.CharField(max_length=MAX_LEN)
     # member management should go through add_members() and remove_members()
     # members = models.ManyToManyField(CustomUser, related_name='memberships')
     emails = models.ManyToManyField(Email)
     admin_emails = models.ManyToManyField(Email, related_name='groups_administrated')
+    # when emails last changed; lets sync_mailman skip groups that haven't
+    members_changed = models.DateTimeField(default=timezone.now, db_index=True)
+    # the number of emails and admin_emails, kept up to date by the signal
+    # handlers below; manage.py repair_group_counts recomputes them
+    member_count = models.PositiveIntegerField(default=0, db_index=True,
+            editable=False)
+    admin_count = models.PositiveIntegerField(default=0, editable=False)
+    # spare groups have a mailman list but no name or code yet; create_group
+    # claims them so it doesn't have to wait for newlist
+    is_spare = models.BooleanField(default=False, db_index=True)
+    # a spare whose mailman list is still being created, which can't be
+    # claimed yet
+    spare_pending = models.BooleanField(default=False, editable=False)
 
     objects = GroupManager()
 
+    class Meta:
+        # also the index for looking groups up by name and code
+        unique_together = ('name', 'code')
+
     def __unicode__(self):
         return self.name
 
     def remove_members(self, member_email_list):
-        for email in member_email_list:
-            try:
-                email_obj = Email.objects.get(email=email)
-                self.emails.remove(email_obj)
-                self.admin_emails.remove(email_obj)
-            except Email.DoesNotExist:
-                pass
-
-        if settings.MODIFY_MAILMAN_DB:
-            try:
-                mailman_cmds.remove_members(self, member_email_list)
-            except mailman_cmds.MailmanError:
-                raise
+        """ Removes the emails in member_email_list from the group. """
+        Group.objects.remove_members([self], member_email_list)
 
     def add_members(self, member_email_list):
+        """
+        Adds the emails in member_email_list to the group, creating (and
+        welcoming) accounts for the ones we don't know. Takes a fixed number
+        of queries however many emails there are.
+        """
+        new_users = transaction.commit_on_success(self.add_members_in_transaction)(
+                member_email_list)
+        self.welcome(new_users)
+
+    def welcome(self, new_users):
+        """
+        Sends new_users their welcome emails. Call this once their accounts
+        are committed; a mail server failure doesn't undo them, since they
+        can still reset their passwords.
+        """
+        try:
+            CustomUser.objects.send_welcome_emails(new_users)
+        except (smtplib.SMTPException, socket.error), e:
+            print >>sys.stderr, 'failed to send welcome emails to %s: %s' % (
+                    ', '.join(user.email for user in new_users), e)
+
+    def add_members_in_transaction(self, member_email_list):
+        """
+        Does add_members' work inside the caller's transaction, without
+        welcoming anyone. Returns the Users it created, for welcome().
+        """
+        emails, seen = [], set()
         for email in member_email_list:
             if not isinstance(email, basestring):
                 raise TypeError('email is not a string')
-            try:
-                CustomUser.objects.get(email=email)
-            except CustomUser.DoesNotExist:
-                # create an account for the new user
-                CustomUser.objects.create_user(email=email)
-            email_obj = Email.objects.get(email=email)
-            self.emails.add(email_obj)
+            if email.lower() not in seen:
+                seen.add(email.lower())
+                emails.append(email)
+
+        email_objs = []
+        for i in xrange(0, len(emails), IN_BATCH_SIZE):
+            email_objs.extend(Email.objects.filter(email__in=emails[i:i + IN_BATCH_SIZE]))
+        known = set(email_obj.email.lower() for email_obj in email_objs)
+        # create accounts for the new users
+        new_email_objs, new_users = CustomUser.objects.create_users(
+                [email for email in emails if email.lower() not in known])
+        email_objs.extend(new_email_objs)
+        self._add_emails(email_objs)
+        self.touch_members()
 
         if settings.MODIFY_MAILMAN_DB:
-            try:
-                mailman_cmds.add_members(self, member_email_list)
-            except mailman_cmds.MailmanError:
-                raise
+            outcomes = outbox.submit(MailmanOperation.ADD_MEMBERS, self,
+                    member_email_list)
+            if outcomes:
+                self.discard_rejected_members(outcomes)
+                failed = [m for m, outcome in outcomes.iteritems()
+                          if outcome == results.FAILED]
+                if failed:
+                    # they're in the group but not on its list until the
+                    # next sync_mailman
+                    print >>sys.stderr, 'mailman failed to subscribe %s to %s' % (
+                            ', '.join(failed), self.name)
+        return new_users
+
+    def _add_emails(self, email_objs):
+        """
+        Does what self.emails.add(*email_objs) does, in one insert rather than
+        one per email.
+        """
+        through = Group.emails.through
+        new_ids = set(email_obj.id for email_obj in email_objs) - \
+                set(through.objects.filter(group=self).values_list('email_id', flat=True))
+        if not new_ids:
+            return
+        signal_kwargs = dict(sender=through, instance=self, reverse=False,
+                             model=Email, pk_set=new_ids, using=self._state.db)
+        m2m_changed.send(action='pre_add', **signal_kwargs)
+        through.objects.bulk_create([through(group=self, email_id=email_id)
+                                     for email_id in sorted(new_ids)])
+        m2m_changed.send(action='post_add', **signal_kwargs)
+
+    def touch_members(self):
+        """ Records that the group's emails just changed. """
+        self.members_changed = timezone.now()
+        Group.objects.filter(id=self.id).update(members_changed=self.members_changed)
+
+    def discard_rejected_members(self, outcomes):
+        """
+        Takes a dict mapping emails to the outcome of subscribing them to
+        the group's mailman list, and removes the emails mailman rejected
+        from the group. Returns the rejected emails.
+        """
+        rejected = [email for email, outcome in outcomes.iteritems()
+                    if outcome == results.INVALID]
+        if rejected:
+            self.emails.remove(*Email.objects.filter(email__in=rejected))
+            self.touch_members()
+        return rejected
 
     def get_members(self):
-        return [email_obj.user for email_obj in self.emails.all()]
+        return [email_obj.user for email_obj in self.emails.select_related('user')]
 
     def add_admin_email(self, admin_email):
         try:
@@ -110,3 +201,45 @@ class Group(models.Model):
     class CodeNotAllowed(_FieldNotAllowed):
         def __init__(self, msg=None, code=''):
             super(Group.CodeNotAllowed, self).__init__(msg, 'code', code)
+
+
+""" Keeping member_count and admin_count up to date """
+
+
+def _memberships_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # by post_clear we can't tell which groups the email was in
+        instance._cleared_group_ids = list(sender.objects.filter(email=instance)
+                                           .values_list('group_id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        group_ids = [instance.id]
+    elif action == 'post_clear':
+        group_ids = instance.__dict__.pop('_cleared_group_ids', [])
+    else:
+        group_ids = pk_set
+    Group.objects.update_counts(group_ids,
+            members=sender is Group.emails.through,
+            admins=sender is Group.admin_emails.through)
+
+
+def _email_deleting(sender, instance, **kwargs):
+    # deleting an Email deletes its memberships without m2m_changed
+    group_ids = set()
+    for through in (Group.emails.through, Group.admin_emails.through):
+        group_ids.update(through.objects.filter(email=instance)
+                         .values_list('group_id', flat=True))
+    instance._group_ids = group_ids
+
+
+def _email_deleted(sender, instance, **kwargs):
+    Group.objects.update_counts(instance.__dict__.pop('_group_ids', []))
+
+
+for _through in (Group.emails.through, Group.admin_emails.through):
+    m2m_changed.connect(_memberships_changed, sender=_through,
+            dispatch_uid='group_counts_%s' % _through._meta.db_table)
+pre_delete.connect(_email_deleting, sender=Email, dispatch_uid='group_counts_email_deleting')
+post_delete.connect(_email_deleted, sender=Email, dispatch_uid='group_counts_email_deleted')
@@ -5,7 +5,19 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
+import smtplib
+from cStringIO import StringIO
+from django.conf import settings
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import IntegrityError
 from django.test import TestCase
+from django.test.utils import override_settings
+from group_mail.apps.test.test_utils import NoMMTestCase
+from group_mail.apps.common.models import CustomUser, Email
+from group_mail.apps.group.models import Group
+from group_mail.apps.group.forms import JoinGroupForm
 
 
 class SimpleTest(TestCase):
@@ -14,3 +26,226 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class SpareGroupTest(NoMMTestCase):
+    def setUp(self):
+        super(SpareGroupTest, self).setUp()
+        self.email = 'myemail@gmail.com'
+        CustomUser.objects.create_user(email=self.email, send_welcome=False)
+
+    def test_create_group_claims_spare(self):
+        spare = Group.objects.create_spare_group()
+        group = Group.objects.create_group(self.email, 'name', 'code')
+        self.assertEqual(group.id, spare.id, 'spare group was not claimed')
+        self.assertEqual((group.name, group.code), ('name', 'code'))
+        self.assertFalse(group.is_spare)
+        self.assertEqual([e.email for e in group.emails.all()], [self.email])
+
+    def test_create_group_without_spares(self):
+        group = Group.objects.create_group(self.email, 'name', 'code')
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertFalse(group.is_spare)
+
+    def test_spare_claimed_once(self):
+        Group.objects.create_spare_group()
+        g1 = Group.objects.create_group(self.email, 'name1', 'code')
+        g2 = Group.objects.create_group(self.email, 'name2', 'code')
+        self.assertNotEqual(g1.id, g2.id)
+        self.assertEqual(Group.objects.filter(is_spare=True).count(), 0)
+
+    def test_pending_spare_is_not_claimed(self):
+        pending = Group.objects.create(name='', code='pending', is_spare=True,
+                                       spare_pending=True)
+        group = Group.objects.create_group(self.email, 'name', 'code')
+        self.assertNotEqual(group.id, pending.id)
+
+    def test_pool_survives_failures(self):
+        from group_mail.apps.mailman import mailman_cmds
+
+        def newlist_helper(group, **kwargs):
+            raise ValueError('mail db is down')
+        old_helper, mailman_cmds.newlist_helper = \
+                mailman_cmds.newlist_helper, newlist_helper
+        settings.MODIFY_MAILMAN_DB = True
+        try:
+            call_command('maintain_list_pool', size=2, stderr=StringIO())
+        finally:
+            mailman_cmds.newlist_helper = old_helper
+            settings.MODIFY_MAILMAN_DB = False
+        self.assertEqual(Group.objects.count(), 0)
+
+
+class GroupForEmailTest(NoMMTestCase):
+    def setUp(self):
+        super(GroupForEmailTest, self).setUp()
+        for email in ('a@gmail.com', 'b@gmail.com'):
+            CustomUser.objects.create_user(email=email, send_welcome=False)
+        self.first = Group.objects.create_group('a@gmail.com', 'name', 'code')
+        self.second = Group.objects.create_group('b@gmail.com', 'name', 'code2')
+        self.other = Group.objects.create_group('a@gmail.com', 'other', 'code')
+
+    def test_get_group_for_email(self):
+        user = CustomUser.objects.get(email='b@gmail.com')
+        with self.assertNumQueries(1):
+            group = Group.objects.get_group_for_email(user.email_set.all(), 'name')
+        self.assertEqual(group, self.second)
+        self.assertEqual(Group.objects.get_group_for_email(user.email_set.all(),
+                'other'), None)
+
+    def test_get_groups_for_senders(self):
+        pairs = [('a@gmail.com', 'name'), ('B@gmail.com', 'name'),
+                 ('b@gmail.com', 'other'), ('c@gmail.com', 'name')]
+        with self.assertNumQueries(1):
+            groups = Group.objects.get_groups_for_senders(pairs)
+        self.assertEqual(groups, {('a@gmail.com', 'name'): self.first,
+                                  ('B@gmail.com', 'name'): self.second,
+                                  ('b@gmail.com', 'other'): None,
+                                  ('c@gmail.com', 'name'): None})
+
+
+class AddMembersTest(NoMMTestCase):
+    def setUp(self):
+        super(AddMembersTest, self).setUp()
+        CustomUser.objects.create_user(email='creator@gmail.com', send_welcome=False)
+        CustomUser.objects.create_user(email='old@gmail.com', send_welcome=False)
+        self.group = Group.objects.create_group('creator@gmail.com', 'name', 'code')
+
+    def add_members(self, emails):
+        mail.outbox = []
+        self.group.add_members(emails)
+        return sorted(e.email for e in self.group.emails.all())
+
+    def test_add_members(self):
+        emails = self.add_members(['old@gmail.com', 'new1@gmail.com',
+                                   'new2@gmail.com', 'NEW1@gmail.com'])
+        self.assertEqual(emails, ['creator@gmail.com', 'new1@gmail.com',
+                                  'new2@gmail.com', 'old@gmail.com'])
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         ['new1@gmail.com', 'new2@gmail.com'])
+        user = CustomUser.objects.get(email='new2@gmail.com')
+        self.assertEqual([e.email for e in user.email_set.all()], ['new2@gmail.com'])
+        self.assertFalse(user.has_usable_password())
+
+    def test_queries_independent_of_count(self):
+        self.add_members(['warm@gmail.com'])  # caches the current site
+        mail.outbox = []
+        with self.assertNumQueries(10):
+            self.group.add_members(['a%d@gmail.com' % i for i in xrange(3)])
+        with self.assertNumQueries(10):
+            self.group.add_members(['b%d@gmail.com' % i for i in xrange(30)] +
+                                   ['a%d@gmail.com' % i for i in xrange(3)])
+        self.assertEqual(len(mail.outbox), 33)
+        self.assertEqual(self.group.emails.count(), 35)
+        self.assertEqual(Group.objects.get(id=self.group.id).member_count, 35)
+
+    def test_mail_failure_keeps_accounts(self):
+        with override_settings(EMAIL_BACKEND='group_mail.apps.group.tests.DownEmailBackend'):
+            emails = self.add_members(['new@gmail.com'])
+        self.assertEqual(emails, ['creator@gmail.com', 'new@gmail.com'])
+        self.assertEqual(CustomUser.objects.filter(email='new@gmail.com').count(), 1)
+
+
+class DownEmailBackend(BaseEmailBackend):
+    """ Stands in for a mail server that's down. """
+    def send_messages(self, messages):
+        raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+
+
+class RemoveMembersTest(NoMMTestCase):
+    def setUp(self):
+        super(RemoveMembersTest, self).setUp()
+        CustomUser.objects.create_user(email='creator@gmail.com', send_welcome=False)
+        self.groups = [Group.objects.create_group('creator@gmail.com', 'name%d' % i, 'code')
+                       for i in xrange(5)]
+        for group in self.groups:
+            group.add_members(['a@gmail.com', 'b@gmail.com'])
+
+    def test_remove_members(self):
+        # including a member_count and an admin_count update
+        with self.assertNumQueries(6):
+            self.groups[0].remove_members(['creator@gmail.com', 'a@gmail.com',
+                                           'nobody@gmail.com'])
+        self.assertEqual([e.email for e in self.groups[0].emails.all()],
+                         ['b@gmail.com'])
+        self.assertEqual(self.groups[0].admin_emails.count(), 0)
+        self.assertEqual(self.groups[1].emails.count(), 3)
+        self.assertEqual(Group.objects.filter(id=self.groups[0].id)
+                         .values_list('member_count', 'admin_count')[0], (1, 0))
+
+    def test_remove_from_every_group(self):
+        # the counts are updated per email, since there are fewer emails
+        with self.assertNumQueries(8):
+            Group.objects.remove_members(self.groups, ['a@gmail.com', 'b@gmail.com'])
+        for group in self.groups:
+            self.assertEqual([e.email for e in group.emails.all()],
+                             ['creator@gmail.com'])
+        self.assertEqual(set(Group.objects.values_list('member_count', flat=True)),
+                         set([1]))
+
+
+class GroupUniquenessTest(NoMMTestCase):
+    def setUp(self):
+        super(GroupUniquenessTest, self).setUp()
+        self.email = 'creator@gmail.com'
+        self.user = CustomUser.objects.create_user(email=self.email, send_welcome=False)
+        self.group = Group.objects.create_group(self.email, 'name', 'code')
+
+    def test_constraint(self):
+        self.assertRaises(IntegrityError, Group.objects.create, name='name', code='code')
+
+    def test_create_existing_group(self):
+        spare = Group.objects.create_spare_group()
+        self.assertRaises(Group.AlreadyExists,
+                Group.objects.create_group, self.email, 'name', 'code')
+        self.assertTrue(Group.objects.get(id=spare.id).is_spare)
+        self.assertEqual(Group.objects.filter(name='name').count(), 1)
+
+    def test_validate_group_uniqueness(self):
+        with self.assertNumQueries(1):
+            self.assertRaises(Group.AlreadyExists,
+                    Group.objects.validate_group_uniqueness, 'name', 'code')
+        Group.objects.validate_group_uniqueness('name', 'code2')
+
+    def test_join_group_form(self):
+        def errors(name, code):
+            form = JoinGroupForm(self.user, {'group_name': name, 'group_code': code,
+                                             'email': self.email})
+            form.is_valid()
+            return form.errors
+        self.assertEqual(errors('name', 'code'), {})
+        self.assertEqual(errors('name', 'wrong').keys(), ['group_code'])
+        self.assertEqual(errors('nosuchgroup', 'code').keys(), ['group_name'])
+
+
+class GroupCountsTest(NoMMTestCase):
+    def setUp(self):
+        super(GroupCountsTest, self).setUp()
+        CustomUser.objects.create_user(email='creator@gmail.com', send_welcome=False)
+        self.group = Group.objects.create_group('creator@gmail.com', 'name', 'code')
+        self.group.add_members(['a@gmail.com', 'b@gmail.com'])
+
+    def counts(self):
+        return Group.objects.filter(id=self.group.id) \
+                .values_list('member_count', 'admin_count')[0]
+
+    def test_counts_follow_changes(self):
+        self.assertEqual(self.counts(), (3, 1))
+        email = Email.objects.get(email='a@gmail.com')
+        email.group_set.clear()
+        self.assertEqual(self.counts(), (2, 1))
+        self.group.emails.add(email)
+        self.assertEqual(self.counts(), (3, 1))
+        Email.objects.get(email='creator@gmail.com').delete()
+        self.assertEqual(self.counts(), (2, 0))
+
+    def test_repair(self):
+        Group.objects.update(member_count=0, admin_count=7)
+        call_command('repair_group_counts')
+        self.assertEqual(self.counts(), (3, 1))
+
+    def test_sort_and_filter_by_size(self):
+        small = Group.objects.create_group('creator@gmail.com', 'small', 'code')
+        self.assertEqual(list(Group.objects.filter(member_count__gte=2)), [self.group])
+        self.assertEqual(list(Group.objects.order_by('member_count')),
+                         [small, self.group])
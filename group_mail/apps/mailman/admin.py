@@ -0,0 +1,4 @@
+from django.contrib import admin
+from group_mail.apps.mailman.models import MailmanOperation
+
+admin.site.register(MailmanOperation)
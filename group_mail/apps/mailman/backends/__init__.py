@@ -0,0 +1,36 @@
+"""
+Backends carry out the list-level mailman operations behind mailman_cmds.
+settings.MAILMAN_BACKEND is the dotted path of the backend class to use:
+
+    group_mail.apps.mailman.backends.scripts.ScriptBackend
+        runs mailman's bin/ scripts, through the mailman worker if
+        settings.MAILMAN_WORKER_SOCKET is set, or by spawning sudo.
+    group_mail.apps.mailman.backends.api.ApiBackend
+        uses mailman's python API inside our own process.
+    group_mail.apps.mailman.backends.memory.MemoryBackend
+        keeps lists in memory, with injected latency and failures, so the
+        app can be load tested without a mailman box.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.importlib import import_module
+
+_backends = {}
+
+
+def get_backend(path=None):
+    """
+    Returns the backend named by path, settings.MAILMAN_BACKEND by default.
+    Each backend class is instantiated once per process.
+    """
+    path = path or settings.MAILMAN_BACKEND
+    if path not in _backends:
+        module_name, _, class_name = path.rpartition('.')
+        try:
+            backend_class = getattr(import_module(module_name), class_name)
+        except (ImportError, AttributeError), e:
+            raise ImproperlyConfigured('Error loading mailman backend %s: %s'
+                    % (path, e))
+        _backends[path] = backend_class()
+    return _backends[path]
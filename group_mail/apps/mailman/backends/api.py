@@ -0,0 +1,28 @@
+from group_mail.apps.mailman import mailman_api
+from group_mail.apps.mailman.backends.scripts import ScriptBackend
+
+
+class ApiBackend(ScriptBackend):
+    """
+    Changes lists through mailman's python API inside our own process (see
+    the mailman_api module), which must be able to write mailman's lists/
+    and locks/ directories. rmlist still runs bin/rmlist.
+    """
+
+    def newlist(self, listname, owner_email, list_password):
+        return mailman_api.newlist(listname, owner_email, list_password)
+
+    def add_members(self, listname, members):
+        return mailman_api.add_members(listname, members)
+
+    def remove_members(self, listname, members):
+        return mailman_api.remove_members(listname, members)
+
+    def list_members(self, listname):
+        return mailman_api.list_members(listname)
+
+    def change_pw(self, listname, list_password):
+        return mailman_api.change_pw(listname, list_password)
+
+    def dumpdb(self, listname):
+        return mailman_api.dumpdb(listname)
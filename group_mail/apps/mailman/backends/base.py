@@ -0,0 +1,48 @@
+class BaseBackend(object):
+    """
+    The operations a mailman backend provides. Each takes a mailman listname
+    rather than a group; mailman_cmds does the translation.
+
+    Problems with the list as a whole are returned as a list of error lines
+    worded like the bin/ scripts' output (e.g. 'No such list: _42'), which
+    mailman_cmds turns into a MailmanError. Membership operations report
+    each address's outcome using the constants in the results module.
+    """
+
+    def newlist(self, listname, owner_email, list_password):
+        """ Creates listname. Returns a list of errors. """
+        raise NotImplementedError
+
+    def add_members(self, listname, members):
+        """
+        Subscribes each address in members to listname. Returns an
+        (outcomes, errors) tuple.
+        """
+        raise NotImplementedError
+
+    def remove_members(self, listname, members):
+        """
+        Unsubscribes each address in members from listname. Returns an
+        (outcomes, errors) tuple.
+        """
+        raise NotImplementedError
+
+    def list_members(self, listname):
+        """ Returns a (members, errors) tuple. """
+        raise NotImplementedError
+
+    def change_pw(self, listname, list_password):
+        """ Sets listname's administrator password. Returns a list of errors. """
+        raise NotImplementedError
+
+    def dumpdb(self, listname):
+        """ Reads listname's configuration. Returns a list of errors. """
+        raise NotImplementedError
+
+    def rmlist(self, listname):
+        """ Deletes listname and its archives. Returns a list of errors. """
+        raise NotImplementedError
+
+    def add_aliases(self, listnames):
+        """ Routes mail for each of listnames to mailman. """
+        raise NotImplementedError
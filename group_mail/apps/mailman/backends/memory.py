@@ -0,0 +1,184 @@
+"""
+An in-memory stand-in for mailman, for load testing and development.
+
+Every operation sleeps for a configurable time before doing anything, and
+fails for the whole list at a configurable rate, so that the rest of the
+app sees roughly the timing and the errors a real mailman box produces.
+Like mailman, operations on the same list wait for each other.
+
+The lists only live as long as the process, and aren't shared between
+processes; with settings.MAILMAN_OUTBOX on, the lists live in the
+mailman_outbox process.
+
+settings.MAILMAN_MEMORY_BACKEND configures it:
+
+    'LATENCY': seconds each operation takes, by operation name, with
+        'default' for the operations not named.
+    'JITTER': how much the latency varies, as a fraction of it.
+    'FAILURE_RATE': the probability that an operation fails.
+    'SEED': seeds the random numbers, to repeat a run.
+"""
+
+import time
+import random
+import threading
+from django.conf import settings
+from group_mail.apps.mailman import results
+from group_mail.apps.mailman.backends.base import BaseBackend
+
+
+class MemoryBackend(BaseBackend):
+
+    def __init__(self, latency=None, jitter=None, failure_rate=None, seed=None):
+        options = getattr(settings, 'MAILMAN_MEMORY_BACKEND', {})
+        if latency is None:
+            latency = options.get('LATENCY', {})
+        if isinstance(latency, (int, float)):
+            latency = {'default': latency}
+        self.latency = latency
+        self.jitter = options.get('JITTER', 0) if jitter is None else jitter
+        self.failure_rate = (options.get('FAILURE_RATE', 0)
+                if failure_rate is None else failure_rate)
+        self.random = random.Random(options.get('SEED') if seed is None else seed)
+
+        self.lists = {}  # listname -> {'members': {lower address: address}, ...}
+        self.aliases = set()
+        self.running = 0
+        self.max_running = 0  # the most operations that have run at once
+        self._lock = threading.Lock()
+        self._list_locks = {}
+
+    def newlist(self, listname, owner_email, list_password):
+        with self._operation('newlist', listname) as errors:
+            if errors:
+                return errors
+            if listname in self.lists:
+                return ['List already exists: %s' % listname]
+            if not _is_valid(owner_email):
+                return ['Bad/Invalid email address: %s' % owner_email]
+            self.lists[listname] = {'owner': owner_email,
+                                    'password': list_password,
+                                    'members': {}}
+            return []
+
+    def add_members(self, listname, members):
+        with self._operation('add_members', listname) as errors:
+            if errors:
+                return {}, errors
+            roster = self.lists[listname]['members']
+            outcomes = {}
+            for member in members:
+                address = member.strip()
+                if not _is_valid(address):
+                    outcomes[member] = results.INVALID
+                elif address.lower() in roster:
+                    outcomes[member] = results.ALREADY_MEMBER
+                else:
+                    roster[address.lower()] = address
+                    outcomes[member] = results.ADDED
+            return outcomes, []
+
+    def remove_members(self, listname, members):
+        with self._operation('remove_members', listname) as errors:
+            if errors:
+                return {}, errors
+            roster = self.lists[listname]['members']
+            outcomes = {}
+            for member in members:
+                if roster.pop(member.strip().lower(), None) is None:
+                    outcomes[member] = results.NO_SUCH_MEMBER
+                else:
+                    outcomes[member] = results.REMOVED
+            return outcomes, []
+
+    def list_members(self, listname):
+        with self._operation('list_members', listname) as errors:
+            if errors:
+                return [], errors
+            return self.lists[listname]['members'].values(), []
+
+    def change_pw(self, listname, list_password):
+        with self._operation('change_pw', listname) as errors:
+            if not errors:
+                self.lists[listname]['password'] = list_password
+            return errors
+
+    def dumpdb(self, listname):
+        with self._operation('dumpdb', listname) as errors:
+            return errors
+
+    def rmlist(self, listname):
+        with self._operation('rmlist', listname) as errors:
+            if not errors:
+                del self.lists[listname]
+            return errors
+
+    def add_aliases(self, listnames):
+        self._sleep('add_aliases')
+        with self._lock:
+            self.aliases.update(listnames)
+
+    def _operation(self, name, listname):
+        return _Operation(self, name, listname)
+
+    def _list_lock(self, listname):
+        with self._lock:
+            return self._list_locks.setdefault(listname, threading.Lock())
+
+    def _sleep(self, name):
+        latency = self.latency.get(name, self.latency.get('default', 0))
+        if latency:
+            with self._lock:
+                spread = self.random.uniform(-self.jitter, self.jitter)
+            time.sleep(max(0, latency * (1 + spread)))
+
+    def _start(self):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+    def _finish(self):
+        with self._lock:
+            self.running -= 1
+
+    def _fails(self):
+        with self._lock:
+            return self.random.random() < self.failure_rate
+
+
+class _Operation(object):
+    """
+    Holds listname's lock for the duration of an operation, as mailman
+    does, after the injected latency. Yields the list-wide errors the
+    operation should return, if any.
+    """
+    def __init__(self, backend, name, listname):
+        self.backend = backend
+        self.name = name
+        self.listname = listname
+        self.lock = backend._list_lock(listname)
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.backend._start()
+        try:
+            self.backend._sleep(self.name)
+        except:
+            self.backend._finish()
+            self.lock.release()
+            raise
+        if self.backend._fails():
+            return ['Simulated mailman failure: %s %s' % (self.name, self.listname)]
+        if self.name != 'newlist' and self.listname not in self.backend.lists:
+            return ['No such list: %s' % self.listname]
+        return []
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.backend._finish()
+        self.lock.release()
+
+
+def _is_valid(address):
+    # roughly what mailman's Utils.ValidateEmail rejects
+    return ('@' in address and not address.startswith('@')
+            and not any(c.isspace() for c in address))
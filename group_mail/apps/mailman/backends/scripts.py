@@ -0,0 +1,171 @@
+""" Runs mailman's bin/ scripts, as root. """
+
+import os
+import sys
+import socket
+import subprocess
+from django.conf import settings
+from group_mail.apps.mailman import unix_rpc, maildb, results
+from group_mail.apps.mailman.paths import get_script_dir, get_list_dir
+from group_mail.apps.mailman.backends.base import BaseBackend
+
+MAILMAN_ERRORS = ['No such member', 'Already a member',
+                  'Bad/Invalid email address', 'Illegal list name',
+                  'List already exists', 'No such list',
+                  'sudo',  # catch sudo (permission) errors
+                  'Traceback (most recent call last)',  # the script crashed
+                  ]
+
+
+class ScriptBackend(BaseBackend):
+
+    def newlist(self, listname, owner_email, list_password):
+        args = [get_script_dir('newlist'), listname, owner_email, list_password]
+        return _exec_cmd(*args, stdin_hook='\n')
+
+    def add_members(self, listname, members):
+        args = [get_script_dir('add_members'), '-r', '-', listname]
+        result = _run_cmd(*args, stdin_hook='\n'.join(members))
+        # add_members reports every address it subscribes
+        outcomes, errors = results.parse_member_output(_get_output(result),
+                members, default=results.FAILED)
+        return outcomes, errors + _status_errors(args, result)
+
+    def remove_members(self, listname, members):
+        args = [get_script_dir('remove_members'), listname] + members
+        result = _run_cmd(*args)
+        # remove_members is silent about the addresses it removes
+        outcomes, errors = results.parse_member_output(_get_output(result),
+                members, default=results.REMOVED)
+        return outcomes, errors + _status_errors(args, result)
+
+    def list_members(self, listname):
+        result = _run_cmd(get_script_dir('list_members'), listname)
+        errors = [line for line in _get_output(result).split('\n')
+                  if any(err in line for err in results.LIST_ERRORS)]
+        members = [line.strip() for line in result[0].split('\n') if line.strip()]
+        return members, errors
+
+    def change_pw(self, listname, list_password):
+        args = [get_script_dir('change_pw'), '-q', '-l', listname,
+                '-p', list_password]
+        return _exec_cmd(*args)
+
+    def dumpdb(self, listname):
+        """
+        this will throw an IOError if the list doesn't exist. Not robust enough
+        for use in production.
+        """
+        args = [get_script_dir('dumpdb'), get_list_dir(listname) + '/config.pck']
+        return _exec_cmd(*args)
+
+    def rmlist(self, listname):
+        args = [get_script_dir('rmlist'), '-a', get_list_dir(listname)]
+        return _exec_cmd(*args)
+
+    def add_aliases(self, listnames):
+        """
+        We have to add an alias to the postfix mysql db which maps
+        listname@domain.com to list_Name@lists.domain.com to make mailman
+        and postfix cooperate.
+        """
+        maildb.add_aliases(listnames)
+
+
+def _get_output(result):
+    """
+    returns the combined output in the tuple result, which is presumed to be
+    of the form (sysout, syserr)
+    """
+    return result[0] + result[1]
+
+
+def _status_errors(args, result):
+    """ Returns an error if the command args exited with a non-zero status. """
+    if result[2]:
+        return ['%s exited with status %d' % (os.path.basename(args[0]), result[2])]
+    return []
+
+
+def _get_errors(result):
+    """
+    returns a list of errors specified in the tuple result, which is
+    presumed to be of the form (sysout, syserr)
+    """
+    errors = []
+    output = _get_output(result)
+
+    # we assume each error appears on its own line
+    lines = output.split('\n')
+    for line in lines:
+        for err in MAILMAN_ERRORS:
+            if line.find(err) != -1:
+                errors.append(line)
+
+    print >>sys.stderr, errors
+    return errors
+
+
+def _exec_cmd(*args, **kwargs):
+    """
+    Runs the command given by args (see _run_cmd) and returns a list of the
+    errors in its output.
+    """
+    return _get_errors(_run_cmd(*args, **kwargs))
+
+
+def _run_cmd(*args, **kwargs):
+    """"
+    args[0] should be a string giving the command to be executed.
+    args[1:] should be strings, where each string is an argument to the command.
+    kwargs['stdin_hook'] is optional; if set, the value will be sent to the
+    process executing the command on stdin.
+
+    Returns a (sysout, syserr, exit status) tuple.
+
+    If settings.MAILMAN_WORKER_SOCKET is set, the command is run by the
+    mailman worker. If the worker can't be reached, we spawn the command
+    ourselves.
+    """
+    if settings.MAILMAN_WORKER_SOCKET:
+        try:
+            return _exec_worker_cmd(args, kwargs.get('stdin_hook'))
+        except (socket.error, unix_rpc.RPCError), e:
+            print >>sys.stderr, 'mailman worker unavailable, spawning: %s' % e
+
+    try:
+        args = list(args)
+        if args[0] != 'sudo':
+            args.insert(0, 'sudo')
+        PIPE = subprocess.PIPE
+
+        if 'stdin_hook' in kwargs:
+            p = subprocess.Popen(args, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        else:
+            p = subprocess.Popen(args, stdout=PIPE, stderr=PIPE)
+
+        sysout, syserr = p.communicate(kwargs.get('stdin_hook'))
+
+        print >>sys.stderr, '---sysout---\n' + sysout
+        print >>sys.stderr, '---syserr---\n' + syserr
+        return sysout, syserr, p.returncode
+    except OSError:  # , e:
+        raise
+        # print >>sys.stderr, 'Execution failed: ', e
+        # return [e]
+
+
+def _exec_worker_cmd(args, stdin_hook=None):
+    """
+    Runs the command given by args in the mailman worker and returns a
+    (sysout, syserr, exit status) tuple, just like _run_cmd.
+    """
+    response = unix_rpc.call(settings.MAILMAN_WORKER_SOCKET,
+            {'args': list(args), 'stdin': stdin_hook},
+            timeout=settings.MAILMAN_WORKER_TIMEOUT)
+    try:
+        if 'error' in response:
+            raise unix_rpc.RPCError(response['error'])
+        return (response['stdout'], response['stderr'], int(response['status']))
+    except (KeyError, TypeError, ValueError):
+        raise unix_rpc.RPCError('malformed response: %r' % (response,))
@@ -0,0 +1,102 @@
+"""
+Coalesces membership changes to mailman lists.
+
+Every add_members or remove_members run takes the list's lock and rewrites
+its config.pck. When changes arrive in bursts (e.g. lots of people texting
+#join at once), MembershipCoalescer collects them per list and applies
+them with at most one add_members and one remove_members per list. The
+outbox gives each list's changes a short window to collect in; see
+outbox.drain.
+"""
+
+import sys
+from group_mail.apps.mailman import mailman_cmds, results
+
+# the two kinds of change
+ADDED = results.ADDED
+REMOVED = results.REMOVED
+
+# outcomes reported in addition to the ones in the results module
+SUPERSEDED = 'superseded'  # a later change to the same address replaced this one
+FAILED = results.FAILED
+
+
+class MembershipCoalescer(object):
+    """
+    Usage:
+        coalescer = MembershipCoalescer()
+        coalescer.add(group, ['brian@gmail.com', 'anne@gmail.com'])
+        coalescer.remove(group, ['ellie@gmail.com'])
+        results = coalescer.flush()
+
+    Only the last change to each address on each list is sent to mailman.
+    An add followed by a remove of the same address cancels the add; the
+    remove is still sent, since the address may have been a member before.
+    """
+    def __init__(self):
+        # listname -> (group, {address.lower(): [address, action]})
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def has_changes(self, listname):
+        return listname in self._pending
+
+    def add(self, group, members):
+        self._record(group, members, ADDED)
+
+    def remove(self, group, members):
+        self._record(group, members, REMOVED)
+
+    def _record(self, group, members, action):
+        listname = mailman_cmds.to_listname(group)
+        group, changes = self._pending.setdefault(listname, (group, {}))
+        for member in members:
+            changes[member.lower()] = [member, action]
+
+    def flush(self):
+        """
+        Sends the pending changes to mailman. Returns a dict mapping each
+        listname to a dict mapping each (lowercased) address that was sent
+        to mailman to an (action, outcome) tuple, where outcome is one of
+        the outcomes in the results module.
+
+        Use outcome() to get the outcome of a particular change.
+        """
+        pending, self._pending = self._pending, {}
+        flushed = {}
+        for listname, (group, changes) in pending.iteritems():
+            flushed[listname] = self._flush_list(group, changes)
+        return flushed
+
+    def _flush_list(self, group, changes):
+        adds = [m for m, action in changes.itervalues() if action == ADDED]
+        removes = [m for m, action in changes.itervalues() if action == REMOVED]
+        flushed = {}
+        for members, action, cmd in ((adds, ADDED, mailman_cmds.add_members),
+                (removes, REMOVED, mailman_cmds.remove_members)):
+            if not members:
+                continue
+            try:
+                outcomes = cmd(group, members)
+            except Exception, e:
+                # anything that went wrong fails the whole batch, which the
+                # outbox retries
+                print >>sys.stderr, '%s failed for %s: %r' % (cmd.__name__,
+                        mailman_cmds.to_listname(group), e)
+                outcomes = {}
+            for member in members:
+                flushed[member.lower()] = (action, outcomes.get(member, FAILED))
+        return flushed
+
+
+def outcome(flushed, group, member, action):
+    """
+    Returns the outcome of the change action (ADDED or REMOVED) to member of
+    group, given the return value of a flush.
+    """
+    result = flushed.get(mailman_cmds.to_listname(group), {}).get(member.lower())
+    if result is None or result[0] != action:
+        return SUPERSEDED
+    return result[1]
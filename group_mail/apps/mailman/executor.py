@@ -0,0 +1,175 @@
+"""
+Runs mailman operations on a bounded pool of threads.
+
+Operations on different lists don't share a lock in mailman, so they can
+overlap; operations on the same list would only queue up on its lock, and
+must happen in the order they were submitted anyway. ListExecutor runs
+each list's operations one at a time, in order, and different lists' in
+parallel, up to max_workers at once.
+
+    futures = [get_executor().submit(listname, mailman_cmds.rmlist, group)
+               for ...]
+    wait(futures)  # then future.result() returns or raises
+
+Work that itself waits on other operations mustn't wait on the executor
+it runs on, which deadlocks once every worker is waiting; spawn runs such
+operations on threads of their own instead.
+"""
+
+import sys
+import threading
+from collections import deque
+from django.conf import settings
+
+
+class Future(object):
+    """ The eventual result of a submitted operation. """
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._exc_info = None
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Waits for the operation and returns what it returned, or raises what
+        it raised. Raises Timeout if it's still running after timeout seconds.
+        """
+        if not self._done.wait(timeout):
+            raise Timeout()
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        """ Waits for the operation and returns what it raised, or None. """
+        if not self._done.wait(timeout):
+            raise Timeout()
+        return self._exc_info[1] if self._exc_info else None
+
+    def _set_result(self, result):
+        self._result = result
+        self._done.set()
+
+    def _set_exc_info(self, exc_info):
+        self._exc_info = exc_info
+        self._done.set()
+
+
+class Timeout(Exception):
+    pass
+
+
+class ListExecutor(object):
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._runnable = deque()  # listnames with work and no worker on them
+        self._pending = {}  # listname -> deque of (future, fn, args, kwargs)
+        self._workers = 0
+        self._idle = 0
+
+    def submit(self, listname, fn, *args, **kwargs):
+        """
+        Schedules fn(*args, **kwargs) to run after everything submitted
+        earlier for listname, and returns its Future.
+        """
+        future = Future()
+        with self._lock:
+            queue = self._pending.get(listname)
+            if queue is None:
+                # nothing is running or waiting for listname
+                queue = self._pending[listname] = deque()
+                self._runnable.append(listname)
+                if self._idle:
+                    self._ready.notify()
+                elif self._workers < self.max_workers:
+                    self._start_worker()
+            queue.append((future, fn, args, kwargs))
+        return future
+
+    def _start_worker(self):
+        self._workers += 1
+        worker = threading.Thread(target=self._work)
+        worker.daemon = True
+        worker.start()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._runnable:
+                    self._idle += 1
+                    self._ready.wait()
+                    self._idle -= 1
+                listname = self._runnable.popleft()
+                future, fn, args, kwargs = self._pending[listname].popleft()
+            try:
+                future._set_result(fn(*args, **kwargs))
+            except Exception:
+                future._set_exc_info(sys.exc_info())
+            finally:
+                _close_db_connection()
+            with self._lock:
+                if self._pending[listname]:
+                    # the list's next operation goes to the back of the line
+                    self._runnable.append(listname)
+                else:
+                    del self._pending[listname]
+
+
+def _close_db_connection():
+    # operations that touch the db would otherwise leave a connection open
+    # in each worker, outside any request
+    from django.db import connection
+    connection.close()
+
+
+def spawn(fn, *args, **kwargs):
+    """
+    Runs fn(*args, **kwargs) on a new thread, outside any executor, and
+    returns its Future.
+    """
+    future = Future()
+
+    def run():
+        try:
+            future._set_result(fn(*args, **kwargs))
+        except Exception:
+            future._set_exc_info(sys.exc_info())
+        finally:
+            _close_db_connection()
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return future
+
+
+def wait(futures):
+    """ Waits for all of futures to finish. """
+    for future in futures:
+        future._done.wait()
+
+
+def gather(futures):
+    """
+    Waits for all of futures and returns their results in order, or raises
+    the first of their exceptions once they're all done.
+    """
+    wait(futures)
+    return [future.result() for future in futures]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """ Returns the process's executor, of settings.MAILMAN_CONCURRENCY workers. """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ListExecutor(settings.MAILMAN_CONCURRENCY)
+        return _executor
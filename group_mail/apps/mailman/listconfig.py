@@ -0,0 +1,117 @@
+"""
+Reads a list's roster and settings straight from its config.pck, without
+running bin/dumpdb or taking the list lock.
+
+Mailman writes config.pck to a temporary file and renames it into place, so
+we always see a complete file. Parsed configs are cached by the file's mtime
+and size; reading an unchanged list costs a single stat(). The process must
+be able to read mailman's lists/ directory, e.g. by running as a user in
+the mailman group.
+"""
+
+import os
+import cPickle
+import copy_reg
+from django.conf import settings
+from group_mail.apps.mailman.lru import LRUCache
+from group_mail.apps.mailman.mailman_cmds import MailmanError
+from group_mail.apps.mailman.paths import get_list_dir
+
+# the settings ListConfig.settings reports
+SETTINGS = ('real_name', 'owner', 'moderator', 'host_name', 'description',
+            'subject_prefix', 'archive', 'private_roster', 'digestable',
+            'nondigestable', 'generic_nonmember_action', 'max_message_size',
+            'max_num_recipients')
+
+# listname -> ((mtime, size), ListConfig)
+_cache = LRUCache(settings.MAILMAN_CONFIG_CACHE_SIZE)
+
+
+class ListConfig(object):
+    """
+    The parts of a list's configuration we care about. Instances are shared
+    between callers through the cache, so treat them as read-only.
+    """
+    def __init__(self, listname, data):
+        self.listname = listname
+        self.members = _addresses(data.get('members', {}))
+        self.digest_members = _addresses(data.get('digest_members', {}))
+        self.settings = dict((key, data[key]) for key in SETTINGS if key in data)
+
+    @property
+    def all_members(self):
+        return self.members + self.digest_members
+
+
+def read_config(listname):
+    """
+    Returns listname's ListConfig, reading config.pck only if it changed
+    since we last read it. Raises MailmanError if the list doesn't exist or
+    its config can't be read.
+    """
+    path = os.path.join(get_list_dir(listname), 'config.pck')
+    try:
+        st = os.stat(path)
+    except OSError:
+        _cache.delete(listname)
+        raise MailmanError(['No such list: %s' % listname])
+
+    version = (st.st_mtime, st.st_size)
+    cached = _cache.get(listname)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    try:
+        data = _load(path)
+    except (IOError, EOFError, cPickle.UnpicklingError), e:
+        raise MailmanError(['Unreadable config for %s: %s' % (listname, e)])
+    config = ListConfig(listname, data)
+    _cache.set(listname, (version, config))
+    return config
+
+
+def _load(path):
+    f = open(path, 'rb')
+    try:
+        unpickler = cPickle.Unpickler(f)
+        unpickler.find_global = _find_global
+        data = unpickler.load()
+    finally:
+        f.close()
+    if not isinstance(data, dict):
+        raise cPickle.UnpicklingError('config is not a dict')
+    return data
+
+
+class _Opaque(object):
+    """ Stands in for the mailman objects (bounce info, ...) in a config. """
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+_SAFE_GLOBALS = {
+    ('copy_reg', '_reconstructor'): copy_reg._reconstructor,
+    ('__builtin__', 'object'): object,
+    ('__builtin__', 'set'): set,
+    ('__builtin__', 'frozenset'): frozenset,
+}
+
+
+def _find_global(module, name):
+    """
+    Only lets the pickle build plain data. config.pck is written by the
+    mailman user, and unpickling arbitrary globals would let whoever can
+    write it run code as us.
+    """
+    if (module, name) in _SAFE_GLOBALS:
+        return _SAFE_GLOBALS[(module, name)]
+    if module == 'Mailman' or module.startswith('Mailman.'):
+        return _Opaque
+    raise cPickle.UnpicklingError('global not allowed: %s.%s' % (module, name))
+
+
+def _addresses(members):
+    # mailman keys members by lowercased address; the value is 0 if that's
+    # how it was subscribed, otherwise the address as subscribed
+    return sorted(value if isinstance(value, basestring) else key
+                  for key, value in members.iteritems())
@@ -0,0 +1,18 @@
+"""
+How groups map to mailman listnames. Kept free of other imports so the
+mail routing code can use it without loading django.
+"""
+
+INTERNAL_LISTNAME_PREFIX = '_'
+
+
+def to_listname(group):
+    if not group:
+        return None
+    # internal, private listnames will start with _
+    name = '%c%d' % (INTERNAL_LISTNAME_PREFIX, group.id)
+    return name
+
+
+def is_internal_listname(listname):
+    return listname[0] == INTERNAL_LISTNAME_PREFIX
@@ -0,0 +1,61 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    A thread-safe mapping holding at most maxsize items; adding an item to
+    a full cache evicts the least recently used one. If ttl is given, items
+    also expire ttl seconds after they were set.
+    """
+    def __init__(self, maxsize, ttl=None, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._items = OrderedDict()  # key -> (expiry time or None, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._items.pop(key)
+            except KeyError:
+                return default
+            if expires is not None and expires <= self.clock():
+                return default
+            self._items[key] = (expires, value)  # most recently used go last
+            return value
+
+    def set(self, key, value):
+        expires = self.clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (expires, value)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def delete_where(self, predicate):
+        """ Deletes every item for which predicate(key, value) is true. """
+        with self._lock:
+            doomed = [key for key, (expires, value) in self._items.iteritems()
+                      if predicate(key, value)]
+            for key in doomed:
+                del self._items[key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+
+_MISSING = object()
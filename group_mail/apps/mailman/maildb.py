@@ -0,0 +1,143 @@
+"""
+Pooled access to the postfix mysql database (maildb) and its aliases table.
+
+Every mailman list needs a row in aliases mapping listname@domain.com to
+listname@lists.domain.com so that postfix hands the list's mail to mailman.
+The functions here change many rows in a single transaction using one
+pooled connection, instead of connecting once per row.
+"""
+
+import Queue
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+
+INSERT_SQL = "INSERT INTO aliases (mail, destination) VALUES (%s, %s)"
+UPDATE_SQL = "UPDATE aliases SET destination = %s WHERE mail = %s"
+DELETE_SQL = "DELETE FROM aliases WHERE mail = %s"
+
+
+class ConnectionPool(object):
+    """
+    A thread-safe pool of MySQLdb connections. At most size idle connections
+    are kept around; callers never wait for a connection.
+    """
+    def __init__(self, size=4, **connect_kwargs):
+        self.connect_kwargs = connect_kwargs
+        self._idle = Queue.Queue(maxsize=size)
+
+    def _connect(self):
+        import MySQLdb
+        return MySQLdb.connect(**self.connect_kwargs)
+
+    def _get(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Queue.Empty:
+                return self._connect()
+            try:
+                conn.ping()
+                return conn
+            except Exception:
+                # the server hung up on this idle connection; try the next one
+                self._close(conn)
+
+    def _put(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except Queue.Full:
+            self._close(conn)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def transaction(self):
+        """
+        Yields a cursor. The transaction is committed if the block completes
+        and rolled back if it raises.
+        """
+        conn = self._get()
+        try:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                # the connection is unusable, so don't return it to the pool
+                self._close(conn)
+                raise
+            self._put(conn)
+            raise
+        self._put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except Queue.Empty:
+                return
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """ Returns the process-wide pool for maildb, creating it on first use. """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                conf = settings.MAILDB
+                _pool = ConnectionPool(size=conf.get('POOL_SIZE', 4),
+                        host=conf['HOST'], user=conf['USER'],
+                        passwd=conf['PASSWORD'], db=conf['NAME'])
+    return _pool
+
+
+def alias_row(listname):
+    """ Returns the (mail, destination) aliases row for listname. """
+    domain = settings.EMAIL_DOMAIN
+    return (listname + '@' + domain, listname + '@lists.' + domain)
+
+
+def change_aliases(add=(), update=(), delete=()):
+    """
+    Inserts aliases for the listnames in add, points the aliases for the
+    (old_listname, new_listname) pairs in update at new_listname's mailman
+    list, and deletes the aliases for the listnames in delete.
+    Everything happens in one transaction.
+    """
+    inserts = [alias_row(listname) for listname in add]
+    updates = [(alias_row(new)[1], alias_row(old)[0]) for old, new in update]
+    deletes = [(alias_row(listname)[0],) for listname in delete]
+
+    with get_pool().transaction() as cursor:
+        if inserts:
+            cursor.executemany(INSERT_SQL, inserts)
+        if updates:
+            cursor.executemany(UPDATE_SQL, updates)
+        if deletes:
+            cursor.executemany(DELETE_SQL, deletes)
+
+
+def add_aliases(listnames):
+    change_aliases(add=listnames)
+
+
+def update_aliases(listname_pairs):
+    change_aliases(update=listname_pairs)
+
+
+def delete_aliases(listnames):
+    change_aliases(delete=listnames)
@@ -0,0 +1,165 @@
+"""
+Runs mailman operations in-process through mailman's own python API rather
+than by spawning its bin/ scripts.
+
+Each function locks the MailList once, applies every change, saves once and
+unlocks, so adding 500 addresses costs a single lock/save cycle. The calling
+process must be able to write mailman's lists/ and locks/ directories, e.g.
+by running as a user in the mailman group.
+
+The membership functions return per-address outcomes from the results
+module; the others return a list of error lines worded like the bin/
+scripts' output, so callers can treat both paths the same way.
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+from django.conf import settings
+from group_mail.apps.mailman import results
+
+
+def _mailman():
+    """
+    Imports mailman's modules on first use; they live outside our python path
+    and we don't want to pay for them in processes that never use them.
+    """
+    if settings.MAILMAN_PREFIX not in sys.path:
+        sys.path.insert(0, settings.MAILMAN_PREFIX)
+    from Mailman import mm_cfg, MailList, Errors, Utils
+    from Mailman.UserDesc import UserDesc
+    return mm_cfg, MailList, Errors, Utils, UserDesc
+
+
+@contextmanager
+def locked_list(listname):
+    """
+    Yields the locked MailList listname. The list is saved if the block
+    completes and is always unlocked afterwards.
+    """
+    mm_cfg, MailList, Errors, Utils, UserDesc = _mailman()
+    mlist = MailList.MailList(listname)
+    try:
+        yield mlist
+        mlist.Save()
+    finally:
+        mlist.Unlock()
+
+
+def add_members(listname, members):
+    """ Subscribes each address in members to listname as a regular member. """
+    return apply_changes(listname, adds=members)
+
+
+def remove_members(listname, members):
+    """ Unsubscribes each address in members from listname. """
+    return apply_changes(listname, removes=members)
+
+
+def apply_changes(listname, adds=(), removes=()):
+    """
+    Subscribes every address in adds and unsubscribes every address in
+    removes under a single lock and save.
+
+    Returns a (results, errors) tuple, where results maps each address to
+    its outcome (see the results module) and errors lists list-wide errors.
+    """
+    mm_cfg, MailList, Errors, Utils, UserDesc = _mailman()
+    outcomes = {}
+    try:
+        with locked_list(listname) as mlist:
+            for member in adds:
+                outcomes[member] = _add_member(mlist, member)
+            for member in removes:
+                outcomes[member] = _remove_member(mlist, member)
+    except Errors.MMUnknownListError:
+        return {}, ['No such list: %s' % listname]
+    return outcomes, []
+
+
+def newlist(listname, owner_email, list_password):
+    """
+    Creates the list listname, like bin/newlist does, and registers it with
+    the MTA. Unlike bin/newlist, we don't mail the owner a notice.
+    """
+    mm_cfg, MailList, Errors, Utils, UserDesc = _mailman()
+    if Utils.list_exists(listname):
+        return ['List already exists: %s' % listname]
+
+    mlist = MailList.MailList()
+    try:
+        oldmask = os.umask(002)
+        try:
+            mlist.Create(listname, owner_email,
+                         Utils.sha_new(list_password).hexdigest())
+        finally:
+            os.umask(oldmask)
+        mlist.Save()
+    except Errors.BadListNameError:
+        return ['Illegal list name: %s' % listname]
+    except Errors.MMBadEmailError:
+        return ['Bad/Invalid email address: %s' % owner_email]
+    except Errors.MMListAlreadyExistsError:
+        return ['List already exists: %s' % listname]
+    finally:
+        mlist.Unlock()
+
+    if mm_cfg.MTA:
+        modname = 'Mailman.MTA.' + mm_cfg.MTA
+        __import__(modname)
+        sys.modules[modname].create(mlist)
+    return []
+
+
+def change_pw(listname, list_password):
+    """ Sets listname's administrator password. """
+    mm_cfg, MailList, Errors, Utils, UserDesc = _mailman()
+    try:
+        with locked_list(listname) as mlist:
+            mlist.password = Utils.sha_new(list_password).hexdigest()
+    except Errors.MMUnknownListError:
+        return ['No such list: %s' % listname]
+    return []
+
+
+def dumpdb(listname):
+    """ Loads listname's configuration without locking it. """
+    mm_cfg, MailList, Errors, Utils, UserDesc = _mailman()
+    try:
+        MailList.MailList(listname, lock=0)
+    except Errors.MMUnknownListError:
+        return ['No such list: %s' % listname]
+    return []
+
+
+def list_members(listname):
+    """
+    Returns a (members, errors) tuple, where members lists the addresses
+    subscribed to listname.
+    """
+    mm_cfg, MailList, Errors, Utils, UserDesc = _mailman()
+    try:
+        mlist = MailList.MailList(listname, lock=0)
+    except Errors.MMUnknownListError:
+        return [], ['No such list: %s' % listname]
+    return mlist.getMembers(), []
+
+
+def _add_member(mlist, member):
+    mm_cfg, MailList, Errors, Utils, UserDesc = _mailman()
+    userdesc = UserDesc(member.strip(), '', Utils.MakeRandomPassword(), 0)
+    try:
+        mlist.ApprovedAddMember(userdesc, whence='group_mail')
+    except Errors.MMAlreadyAMember:
+        return results.ALREADY_MEMBER
+    except (Errors.MMBadEmailError, Errors.MMHostileAddress,
+            Errors.MembershipIsBanned):
+        return results.INVALID
+    return results.ADDED
+
+
+def _remove_member(mlist, member):
+    if not mlist.isMember(member):
+        return results.NO_SUCH_MEMBER
+    mlist.ApprovedDeleteMember(member, whence='group_mail')
+    return results.REMOVED
@@ -2,37 +2,80 @@
 #### surfacing mechanism
 ### 5/21 note: this may apply to all commands.
 
-""" Provides wrappers for the necessary mailman commands. """
+"""
+Provides wrappers for the necessary mailman commands. These take groups;
+the backend chosen by settings.MAILMAN_BACKEND (see the backends package)
+carries out the corresponding operation on the group's list.
+"""
 
 import sys
-import subprocess
-import MySQLdb
-from django.conf import settings
+from group_mail.apps.mailman.backends import get_backend
+from group_mail.apps.mailman.executor import spawn, wait
+# re-exported; most callers import these from here
+from group_mail.apps.mailman.listnames import (INTERNAL_LISTNAME_PREFIX,
+        to_listname, is_internal_listname)
 
-INTERNAL_LISTNAME_PREFIX = '_'
 
+def newlist(group, owner_email=None, list_password=None):
+    """
+    Creates group's list(s), both at once when there are two. The lists are
+    made on threads of their own rather than on the executor, since newlist
+    may itself be running on one of the executor's workers.
 
-def to_listname(group):
-    if not group:
-        return None
-    # internal, private listnames will start with _
-    name = '%c%d' % (INTERNAL_LISTNAME_PREFIX, group.id)
-    return name
+    A spare group (see GroupManager.create_spare_group) has no name, and so
+    only gets its internal list.
+    """
+    futures = []
+    if group.name and _has_unique_name(group):
+        # if there are no other groups with group.name, we need to create both
+        # group.name@tmail.com and _group.id@tmail.com in mailman
+        futures.append((group.name, spawn(newlist_helper, group,
+                None, None, group.name, add_alias=False)))
+    listname = to_listname(group)
+    futures.append((listname, spawn(newlist_helper, group, owner_email,
+            list_password, add_alias=False)))
+    wait([future for listname, future in futures])
 
+    # add the aliases for whichever lists we managed to create
+    listnames = [listname for listname, future in futures if not future.exception()]
+    if listnames:
+        get_backend().add_aliases(listnames)
+    for listname, future in futures:
+        future.result()
 
-def is_internal_listname(listname):
-    return listname[0] == INTERNAL_LISTNAME_PREFIX
 
+def adopt_list(group):
+    """
+    Finishes setting up the list of a group claimed from the pool of spare
+    groups (see GroupManager.claim_spare_group), whose internal list already
+    exists: creates the group.name list if group is the first with its name,
+    and sets the list password to the group code.
+    """
+    if _has_unique_name(group):
+        newlist_helper(group, listname=group.name)
+    change_pw(group)
 
-def newlist(group, owner_email=None, list_password=None):
-    try:
-        if _has_unique_name(group):
-            # if there are no other groups with group.name, we need to create both
-            # group.name@tmail.com and _group.id@tmail.com in mailman
-            newlist_helper(group, listname=group.name)
-        newlist_helper(group, owner_email, list_password)
-    except MailmanError:
-        raise
+
+def remove_new_lists(group, internal=True):
+    """
+    Removes the lists newlist made for group (or adopt_list, with internal
+    False, since the internal list belongs to the spare pool) when creating
+    the group failed after all. Only logs its own errors, since the caller
+    is already handling one.
+    """
+    listnames = []
+    if _has_unique_name(group):
+        listnames.append(group.name)
+    if internal:
+        listnames.append(to_listname(group))
+    for listname in listnames:
+        try:
+            errors = get_backend().rmlist(listname)
+        except Exception, e:
+            errors = [str(e)]
+        if errors:
+            print >>sys.stderr, 'failed to remove list %s: %s' % (
+                    listname, '; '.join(errors))
 
 
 def _has_unique_name(group):
@@ -46,7 +89,7 @@ def _has_unique_name(group):
     that name even though this function suggests it is.
     """
     from group_mail.apps.group.models import Group
-    return len(Group.objects.filter(name=group.name)) == 1
+    return not Group.objects.filter(name=group.name).exclude(id=group.id).exists()
 
 
 def _get_defaults(group, owner_email, list_password, listname):
@@ -59,17 +102,21 @@ def _get_defaults(group, owner_email, list_password, listname):
     return owner_email, list_password, listname
 
 
-def newlist_helper(group, owner_email=None, list_password=None, listname=None, add_creator=False):
+def newlist_helper(group, owner_email=None, list_password=None, listname=None,
+        add_creator=False, add_alias=True):
+    """
+    Creates the mailman list listname. If add_alias is False, the caller is
+    responsible for adding the postfix alias for the list.
+    """
     owner_email, list_password, listname = \
             _get_defaults(group, owner_email, list_password, listname)
 
-    args = [_get_script_dir('newlist'), listname, owner_email, list_password]
-    errors = _exec_cmd(*args, stdin_hook='\n')
+    errors = get_backend().newlist(listname, owner_email, list_password)
     if not errors:
         if add_creator:
             # mailman doesn't automatically add the list creator as a member
-            errors = add_members(group, owner_email)
-        if not errors:
+            add_members(group, [owner_email])
+        if add_alias:
             add_postfix_mysql_alias(listname)
     else:
         raise MailmanError(errors)
@@ -79,28 +126,46 @@ def remove_members(group, members):
     """
     members should be a single string or a list of strings, where each string is
     a members' email which will be removed from listname.
+
+    Returns a dict mapping each member to its outcome (see the results module).
+    Raises MailmanError if the command failed for the whole list.
     """
     listname = to_listname(group)
-    members = list(members)  # in case members is a single string
-    args = ['remove_members', listname] + members
-    errors = _exec_cmd(*args)
+    if isinstance(members, basestring):
+        members = [members]
+    members = list(members)
+    outcomes, errors = get_backend().remove_members(listname, members)
     if errors:
         raise MailmanError(errors)
+    return outcomes
 
 
 def add_members(group, members):
     """
     members should be a list or newline-delimited string of emails to add
     to listname. e.g.: 'brian@gmail.com\nellie@gmail.com\nanne@gmail.com'
+
+    Returns a dict mapping each member to its outcome (see the results module).
+    Raises MailmanError if the command failed for the whole list.
     """
     listname = to_listname(group)
-    if isinstance(members, list):
-        members = '\n'.join(members)
-    elif not isinstance(members, basestring):
+    if isinstance(members, basestring):
+        members = members.split('\n')
+    elif not isinstance(members, list):
         raise TypeError('members must be a list or string')
+    members = [m for m in members if m.strip()]
+    outcomes, errors = get_backend().add_members(listname, members)
+    if errors:
+        raise MailmanError(errors)
+    return outcomes
 
-    args = [_get_script_dir('add_members'), '-r', '-', listname]
-    errors = _exec_cmd(*args, stdin_hook=members)
+
+def change_pw(group, list_password=None):
+    """ Sets the password of group's list, by default to the group code. """
+    listname = to_listname(group)
+    if not list_password:
+        list_password = group.code
+    errors = get_backend().change_pw(listname, list_password)
     if errors:
         raise MailmanError(errors)
 
@@ -111,16 +176,26 @@ def dumpdb(group):
     for use in production.
     """
     listname = to_listname(group)
-    args = [_get_script_dir('dumpdb'), _get_list_dir(listname) + '/config.pck']
-    errors = _exec_cmd(*args)
+    errors = get_backend().dumpdb(listname)
+    if errors:
+        raise MailmanError(errors)
+
+
+def list_members(group):
+    """
+    Returns the addresses subscribed to group's mailman list, regular and
+    digest members alike.
+    """
+    listname = to_listname(group)
+    members, errors = get_backend().list_members(listname)
     if errors:
         raise MailmanError(errors)
+    return members
 
 
 def rmlist(group):
     listname = to_listname(group)
-    args = [_get_script_dir('rmlist'), '-a', _get_list_dir(listname)]
-    errors = _exec_cmd(*args)
+    errors = get_backend().rmlist(listname)
     if errors:
         raise MailmanError(errors)
 
@@ -137,95 +212,17 @@ class MailmanError(Exception):
     def __str__(self):
         return repr(self.msg)
 
-##########################################################################
-""" Private helper functions """
-
-MAILMAN_ERRORS = ['No such member', 'Already a member',
-                  'Bad/Invalid email address', 'Illegal list name',
-                  'List already exists', 'No such list',
-                  'sudo'  # catch sudo (permission) errors
-                  ]
-
-ROOT_MAILMAN_DIR = '/var/lib/mailman'
-
-
-def _get_script_dir(script_name):
-    return ROOT_MAILMAN_DIR + '/bin/' + script_name
-
-
-def _get_list_dir(listname):
-    return ROOT_MAILMAN_DIR + '/lists/' + listname
-
-
-def _get_errors(result):
-    """
-    returns a list of errors specified in the tuple result, which is
-    presumed to be of the form (sysout, syserr)
-    """
-    errors = []
-    output = result[0] + result[1]
-
-    # we assume each error appears on its own line
-    lines = output.split('\n')
-    for line in lines:
-        for err in MAILMAN_ERRORS:
-            if line.find(err) != -1:
-                errors.append(line)
-
-    print >>sys.stderr, errors
-    return errors
-
-
-def _exec_cmd(*args, **kwargs):
-    """"
-    args[0] should be a string giving the command to be executed.
-    args[1:] should be strings, where each string is an argument to the command.
-    kwargs['stdin_hook'] is optional; if set, the value will be sent to the
-    process executing the command on stdin.
-    """
-    try:
-        args = list(args)
-        if args[0] != 'sudo':
-            args.insert(0, 'sudo')
-        PIPE = subprocess.PIPE
-
-        if 'stdin_hook' in kwargs:
-            p = subprocess.Popen(args, stdin=PIPE, stdout=PIPE, stderr=PIPE)
-        else:
-            p = subprocess.Popen(args, stdout=PIPE, stderr=PIPE)
-
-        result = p.communicate(kwargs.get('stdin_hook'))
-
-        print >>sys.stderr, '---sysout---\n' + result[0]
-        print >>sys.stderr, '---syserr---\n' + result[1]
-        return _get_errors(result)
-    except OSError:  # , e:
-        raise
-        # print >>sys.stderr, 'Execution failed: ', e
-        # return [e]
-
 
 def add_postfix_mysql_alias(listname):
     """
     We have to add an alias to the postfix mysql db which maps
     listname@domain.com to list_Name@lists.domain.com to make mailman
     and postfix cooperate.
-    """
-    domain = settings.EMAIL_DOMAIN
-    sql_args = {'from_list': listname + '@' + domain,
-                'to_list':  listname + '@lists.' + domain}
 
-    db = MySQLdb.connect(host='localhost', user='root', passwd='root',
-            db='maildb')
-    cursor = db.cursor()
-
-    sql = "INSERT INTO aliases (mail, destination) VALUES (%(from_list)s, %(to_list)s)"
-    cursor.execute(sql, sql_args)
-
-    cursor.close()
-    db.commit()
-    db.close()
-##########################################################################
+    Use get_backend().add_aliases() directly when adding several aliases
+    at once.
+    """
+    get_backend().add_aliases([listname])
 
 
 class TestGroup():
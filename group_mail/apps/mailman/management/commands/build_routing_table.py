@@ -0,0 +1,34 @@
+import time
+from django.conf import settings
+from django.core.management.base import NoArgsCommand, CommandError
+from optparse import make_option
+from group_mail.apps.mailman import routing_table
+
+
+class Command(NoArgsCommand):
+
+    help = ("Updates the routing table redirect_list uses to route mail "
+            "without the db.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--full', action='store_true', dest='full', default=False,
+            help='Rebuild every group rather than only the changed ones.'),
+        make_option('--loop', action='store_true', dest='loop', default=False,
+            help='Keep the table up to date instead of exiting.'),
+        make_option('--interval', dest='interval', type='float', default=10.0,
+            help='Seconds between updates when looping.'),
+    )
+
+    def handle_noargs(self, **options):
+        path = settings.ROUTING_TABLE_FILE
+        if not path:
+            raise CommandError('settings.ROUTING_TABLE_FILE is not set')
+        full = options['full']
+        while True:
+            count = routing_table.build(path, full=full)
+            if count:
+                self.stdout.write('rebuilt routes for %d groups\n' % count)
+            if not options['loop']:
+                return
+            full = False
+            time.sleep(options['interval'])
@@ -0,0 +1,29 @@
+import time
+from django.conf import settings
+from django.core.management.base import NoArgsCommand, CommandError
+from optparse import make_option
+from group_mail.apps.mailman import sender_filter
+
+
+class Command(NoArgsCommand):
+
+    help = ("Rebuilds the filter of known senders redirect_list uses to turn "
+            "away strangers without the db.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--loop', action='store_true', dest='loop', default=False,
+            help='Keep rebuilding the filter instead of exiting.'),
+        make_option('--interval', dest='interval', type='float', default=3600.0,
+            help='Seconds between rebuilds when looping.'),
+    )
+
+    def handle_noargs(self, **options):
+        path = settings.SENDER_FILTER_FILE
+        if not path:
+            raise CommandError('settings.SENDER_FILTER_FILE is not set')
+        while True:
+            count = sender_filter.build(path, settings.SENDER_FILTER_ERROR_RATE)
+            self.stdout.write('built the sender filter from %d addresses\n' % count)
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import NoArgsCommand
+from optparse import make_option
+from group_mail.apps.mailman import outbox
+
+
+class Command(NoArgsCommand):
+
+    help = ("Carries out the mailman operations waiting in the outbox. "
+            "Several of these may run at once.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--loop', action='store_true', dest='loop', default=False,
+            help='Keep draining the outbox instead of exiting when it is empty.'),
+        make_option('--interval', dest='interval', type='float', default=1.0,
+            help='Seconds to sleep between passes when there is nothing to do.'),
+        make_option('--window', dest='window', type='float', default=None,
+            help='Seconds to collect membership changes to a list for before '
+                 'applying them together. Defaults to '
+                 'settings.MAILMAN_OUTBOX_COALESCE_WINDOW with --loop, and to '
+                 '0 without it, so that a single run empties the outbox.'),
+        make_option('--batch-size', dest='batch_size', type='int', default=100,
+            help='Maximum number of operations to carry out per pass.'),
+        make_option('--max-attempts', dest='max_attempts', type='int', default=None,
+            help='Attempts before an operation is marked dead. '
+                 'Defaults to settings.MAILMAN_OUTBOX_MAX_ATTEMPTS.'),
+    )
+
+    def handle_noargs(self, **options):
+        window = options['window']
+        if window is None and not options['loop']:
+            window = 0
+        while True:
+            counts = outbox.drain(options['batch_size'], options['max_attempts'],
+                                  window)
+            if sum(counts.values()):
+                self.stdout.write('done: %(done)d, retried: %(retried)d, '
+                                  'dead: %(dead)d\n' % counts)
+            elif not options['loop']:
+                return
+            else:
+                time.sleep(options['interval'])
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import NoArgsCommand, CommandError
+from optparse import make_option
+from group_mail.apps.mailman import worker
+
+
+class Command(NoArgsCommand):
+
+    help = ("Runs the long-lived mailman worker. Must be started with enough "
+            "privileges to run mailman's bin/ scripts, e.g. with sudo.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--socket', dest='socket',
+            help='Path of the Unix socket to listen on. '
+                 'Defaults to settings.MAILMAN_WORKER_SOCKET.'),
+        make_option('--mode', dest='mode', default='0660',
+            help='Octal permissions for the socket file.'),
+    )
+
+    def handle_noargs(self, **options):
+        socket_path = options.get('socket') or settings.MAILMAN_WORKER_SOCKET
+        if not socket_path:
+            raise CommandError('No socket path given and '
+                               'settings.MAILMAN_WORKER_SOCKET is not set.')
+        self.stdout.write('mailman worker listening on %s\n' % socket_path)
+        worker.serve(socket_path, int(options['mode'], 8))
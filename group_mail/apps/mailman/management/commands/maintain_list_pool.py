@@ -0,0 +1,42 @@
+import time
+from django.conf import settings
+from django.core.management.base import NoArgsCommand
+from optparse import make_option
+from group_mail.apps.group.models import Group
+
+
+class Command(NoArgsCommand):
+
+    help = ("Tops up the pool of spare groups whose mailman lists already "
+            "exist, so that creating a group doesn't wait on mailman.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--size', dest='size', type='int', default=None,
+            help='Number of spare groups to keep. '
+                 'Defaults to settings.MAILMAN_LIST_POOL_SIZE.'),
+        make_option('--loop', action='store_true', dest='loop', default=False,
+            help='Keep the pool topped up instead of exiting.'),
+        make_option('--interval', dest='interval', type='float', default=10.0,
+            help='Seconds between checks when looping.'),
+    )
+
+    def handle_noargs(self, **options):
+        size = options['size']
+        if size is None:
+            size = settings.MAILMAN_LIST_POOL_SIZE
+        while True:
+            missing = size - Group.objects.filter(is_spare=True,
+                                                  spare_pending=False).count()
+            created = 0
+            for i in xrange(missing):
+                try:
+                    Group.objects.create_spare_group()
+                    created += 1
+                except Exception, e:
+                    # mailman or the mail db may be back for the next one
+                    self.stderr.write('failed to create a spare list: %s\n' % e)
+            if created:
+                self.stdout.write('created %d spare groups\n' % created)
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
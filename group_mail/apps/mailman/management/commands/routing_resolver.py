@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import NoArgsCommand, CommandError
+from optparse import make_option
+from group_mail.apps.mailman import resolver
+
+
+class Command(NoArgsCommand):
+
+    help = ("Runs the routing resolver, which answers the mailman qrunners' "
+            "listname lookups from memory.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--socket', dest='socket',
+            help='Path of the Unix socket to listen on. '
+                 'Defaults to settings.ROUTING_RESOLVER_SOCKET.'),
+        make_option('--mode', dest='mode', default='0660',
+            help='Octal permissions for the socket file.'),
+        make_option('--interval', dest='interval', type='float', default=5.0,
+            help='Seconds between refreshes of the changed routes.'),
+        make_option('--full-interval', dest='full_interval', type='float',
+            default=3600.0, help='Seconds between rereads of every route.'),
+    )
+
+    def handle_noargs(self, **options):
+        socket_path = options.get('socket') or settings.ROUTING_RESOLVER_SOCKET
+        if not socket_path:
+            raise CommandError('No socket path given and '
+                               'settings.ROUTING_RESOLVER_SOCKET is not set.')
+        self.stdout.write('routing resolver listening on %s\n' % socket_path)
+        resolver.serve(socket_path, int(options['mode'], 8),
+                options['interval'], options['full_interval'])
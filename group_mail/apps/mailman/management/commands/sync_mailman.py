@@ -0,0 +1,93 @@
+from datetime import datetime
+from django.conf import settings
+from django.core.management.base import NoArgsCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from optparse import make_option
+from group_mail.apps.group.models import Group
+from group_mail.apps.mailman import sync
+
+WATERMARK_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+class Command(NoArgsCommand):
+
+    help = ("Makes each group's mailman roster match its emails, adding and "
+            "removing only the addresses that differ.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--since', dest='since',
+            help="Only check groups whose members changed after this UTC time "
+                 "(YYYY-MM-DDTHH:MM:SS), or 'last' for the end of the last "
+                 "successful run. Checks every group by default."),
+        make_option('--workers', dest='workers', type='int', default=4,
+            help='Number of lists to work on at once.'),
+        make_option('--batch-size', dest='batch_size', type='int', default=500,
+            help='Maximum addresses per mailman command.'),
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+            help='Report drift without fixing it.'),
+    )
+
+    def handle_noargs(self, **options):
+        started = timezone.now()
+        # spares' lists have no members to sync, or may not exist yet
+        groups = Group.objects.filter(is_spare=False)
+        since = self.get_since(options['since'])
+        if since:
+            groups = groups.filter(members_changed__gte=since)
+
+        checked = drifted = added = removed = 0
+        errors, skipped = [], []
+        for result in sync.sync_groups(groups.iterator(), options['workers'],
+                options['batch_size'], options['dry_run']):
+            checked += 1
+            if result.skipped:
+                skipped.append(result.group_id)
+            elif result.error:
+                errors.append('group %d: %s' % (result.group_id, result.error))
+            elif result.drifted:
+                drifted += 1
+                added += len(result.added)
+                removed += len(result.removed)
+
+        for error in errors:
+            self.stderr.write(error + '\n')
+        verb = 'would fix' if options['dry_run'] else 'fixed'
+        self.stdout.write('checked %d groups (%d skipped while the outbox works '
+                'on them); %s drift in %d: %d added, %d removed; %d errors\n' %
+                (checked, len(skipped), verb, drifted, added, removed, len(errors)))
+
+        if not errors and not options['dry_run']:
+            self.write_watermark(self.get_watermark(started, skipped))
+
+    def get_since(self, since):
+        if not since:
+            return None
+        if since == 'last':
+            try:
+                with open(settings.MAILMAN_SYNC_WATERMARK_FILE) as f:
+                    since = f.read().strip()
+            except IOError:
+                # we've never finished a run, so check everything
+                return None
+        try:
+            return datetime.strptime(since, WATERMARK_FORMAT).replace(
+                    tzinfo=timezone.utc)
+        except ValueError:
+            raise CommandError('Bad --since value: %s' % since)
+
+    def get_watermark(self, started, skipped):
+        """
+        Returns where the next --since=last run should start: when this one
+        did, or earlier, so that it checks the groups we skipped again.
+        """
+        if skipped:
+            oldest = Group.objects.filter(id__in=skipped).aggregate(
+                    oldest=Min('members_changed'))['oldest']
+            if oldest is not None:
+                return min(started, oldest)
+        return started
+
+    def write_watermark(self, watermark):
+        with open(settings.MAILMAN_SYNC_WATERMARK_FILE, 'w') as f:
+            f.write(watermark.astimezone(timezone.utc).strftime(WATERMARK_FORMAT))
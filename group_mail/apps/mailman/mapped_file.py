@@ -0,0 +1,41 @@
+import os
+import mmap
+import time
+
+
+class MappedFile(object):
+    """
+    A read-only memory map of the file at path that follows the file when
+    it's replaced (renamed over), checking at most every check_interval
+    seconds. get() returns None while there's no file, or it's empty.
+    """
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._map = None
+        self._identity = None
+        self._checked = 0
+
+    def get(self):
+        now = time.time()
+        if now - self._checked < self.check_interval:
+            return self._map
+        self._checked = now
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self.close()
+            return None
+        identity = (st.st_ino, st.st_mtime, st.st_size)
+        if identity != self._identity:
+            self.close()
+            if st.st_size:
+                with open(self.path, 'rb') as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._identity = identity
+        return self._map
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._map = self._identity = None
@@ -0,0 +1,60 @@
+from django.db import models
+from django.db.models.signals import post_save
+from django.utils import timezone
+from group_mail.apps.common.models import Email
+from group_mail.apps.mailman import sender_filter
+
+
+class MailmanOperation(models.Model):
+    """
+    A change we intend to make to mailman, written in the same transaction
+    as the corresponding change to our own db. The mailman_outbox command
+    carries these out in order, per list.
+    """
+    NEWLIST = 'newlist'
+    ADD_MEMBERS = 'add_members'
+    REMOVE_MEMBERS = 'remove_members'
+    RMLIST = 'rmlist'
+    ADOPT_LIST = 'adopt_list'  # set up a list taken from the spare pool
+    KIND_CHOICES = ((NEWLIST, 'newlist'),
+                    (ADD_MEMBERS, 'add_members'),
+                    (REMOVE_MEMBERS, 'remove_members'),
+                    (RMLIST, 'rmlist'),
+                    (ADOPT_LIST, 'adopt_list'))
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    DEAD = 'dead'  # gave up after too many attempts
+    STATUS_CHOICES = ((PENDING, 'pending'),
+                      (RUNNING, 'running'),
+                      (DONE, 'done'),
+                      (DEAD, 'dead'))
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # operations on the same list are carried out in id order
+    listname = models.CharField(max_length=64, db_index=True)
+    # not a foreign key; the group may be gone by the time we get to an rmlist
+    group_id = models.IntegerField()
+    members = models.TextField(blank=True)  # newline-delimited emails
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+            default=PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    # when a pending operation may next be tried, or when a running
+    # operation's claim expires
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('id',)
+
+    def __unicode__(self):
+        return '%s %s (%s)' % (self.kind, self.listname, self.status)
+
+    def get_members(self):
+        return [m for m in self.members.split('\n') if m]
+
+
+post_save.connect(sender_filter.email_saved, sender=Email,
+        dispatch_uid='sender_filter_email_saved')
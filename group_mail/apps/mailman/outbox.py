@@ -0,0 +1,254 @@
+"""
+A db-backed outbox for mailman operations.
+
+With settings.MAILMAN_OUTBOX set, submit() records the operation as a
+MailmanOperation row instead of running it, so the caller's request only
+waits on the database. The row is written in the caller's transaction, so
+it exists exactly when the change to our own db does. drain(), run by
+manage.py mailman_outbox, carries the operations out with retries and
+exponential backoff, and marks them dead once they've failed too often.
+It collects the membership changes to each list for a short window and
+applies them together.
+"""
+
+import sys
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
+from group_mail.apps.mailman import mailman_cmds, coalesce, executor
+from group_mail.apps.mailman.coalesce import MembershipCoalescer
+from group_mail.apps.mailman.models import MailmanOperation
+
+# how long a worker may hold an operation before another worker may retry it
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+MEMBERSHIP_KINDS = (MailmanOperation.ADD_MEMBERS, MailmanOperation.REMOVE_MEMBERS)
+
+
+def submit(kind, group, members=()):
+    """
+    Carries out the mailman operation kind (one of the MailmanOperation kinds)
+    for group, now or later depending on settings.MAILMAN_OUTBOX.
+
+    Returns the per-address outcomes of membership changes carried out now,
+    and None otherwise.
+    """
+    if settings.MAILMAN_OUTBOX:
+        enqueue(kind, group, members)
+    else:
+        return execute(kind, group, members)
+
+
+def submit_many(kind, group_members, raise_errors=True):
+    """
+    Does what submit does for each (group, members) pair in group_members.
+    With settings.MAILMAN_OUTBOX, records all the operations in one insert.
+    Otherwise carries them out now, on the executor (see the executor
+    module), so that they take about as long as the slowest list, and
+    returns a dict mapping each group's id to its outcomes. Raises the first
+    error once they're all done, or, if not raise_errors, maps the groups
+    whose operation failed to the exception instead.
+
+    The operations run in the executor's threads, with their own db
+    connections, so they mustn't need to see the caller's uncommitted changes.
+    """
+    group_members = list(group_members)
+    if settings.MAILMAN_OUTBOX:
+        MailmanOperation.objects.bulk_create([_operation(kind, group, members)
+                                              for group, members in group_members])
+        return None
+
+    futures = [executor.get_executor().submit(mailman_cmds.to_listname(group),
+                                              execute, kind, group, members)
+               for group, members in group_members]
+    if raise_errors:
+        outcomes = executor.gather(futures)
+    else:
+        executor.wait(futures)
+        outcomes = [future.exception() or future.result() for future in futures]
+    return dict((group.id, group_outcomes) for (group, members), group_outcomes
+                in zip(group_members, outcomes))
+
+
+def enqueue(kind, group, members=()):
+    op = _operation(kind, group, members)
+    op.save()
+    return op
+
+
+def _operation(kind, group, members=()):
+    return MailmanOperation(kind=kind,
+            listname=mailman_cmds.to_listname(group),
+            group_id=group.id,
+            members='\n'.join(members))
+
+
+def execute(kind, group, members=()):
+    """
+    Runs the mailman operation kind for group right away. Returns the
+    per-address outcomes of membership changes.
+    """
+    if kind == MailmanOperation.NEWLIST:
+        mailman_cmds.newlist(group)
+    elif kind == MailmanOperation.ADD_MEMBERS:
+        return mailman_cmds.add_members(group, list(members))
+    elif kind == MailmanOperation.REMOVE_MEMBERS:
+        return mailman_cmds.remove_members(group, list(members))
+    elif kind == MailmanOperation.RMLIST:
+        mailman_cmds.rmlist(group)
+    elif kind == MailmanOperation.ADOPT_LIST:
+        mailman_cmds.adopt_list(group)
+    else:
+        raise ValueError('unknown mailman operation: %s' % kind)
+
+
+def drain(batch_size=100, max_attempts=None, window=None):
+    """
+    Carries out up to batch_size due operations and returns a dict counting
+    how many were done, retried and marked dead.
+
+    Operations on the same list are carried out in the order they were
+    submitted: while an operation is waiting to be retried, or is held by
+    another worker, later operations on its list wait too.
+
+    Membership changes are coalesced: all the due add_members and
+    remove_members operations on a list are sent to mailman together at the
+    end of the pass (see MembershipCoalescer). A list's changes are left to
+    collect until the oldest of them is window seconds old (by default
+    settings.MAILMAN_OUTBOX_COALESCE_WINDOW), so that a burst of them goes
+    out in one command rather than in one per pass.
+    """
+    if max_attempts is None:
+        max_attempts = settings.MAILMAN_OUTBOX_MAX_ATTEMPTS
+    if window is None:
+        window = settings.MAILMAN_OUTBOX_COALESCE_WINDOW
+    counts = {'done': 0, 'retried': 0, 'dead': 0}
+    blocked = set()  # listnames with an earlier operation still outstanding
+    coalescer = MembershipCoalescer()
+    coalesced = []  # (op, group) pairs waiting on the coalescer
+    claimed = 0
+    now = timezone.now()
+    collecting_since = now - timedelta(seconds=window)
+
+    unfinished = MailmanOperation.objects.filter(
+            status__in=(MailmanOperation.PENDING, MailmanOperation.RUNNING))
+    for op in unfinished.iterator():
+        if claimed >= batch_size:
+            break
+        if op.listname in blocked:
+            continue
+        is_membership = op.kind in MEMBERSHIP_KINDS
+        if not is_membership and coalescer.has_changes(op.listname):
+            # wait for the coalesced changes ahead of it to be applied
+            blocked.add(op.listname)
+            continue
+        if is_membership and not coalescer.has_changes(op.listname) and \
+                op.created > collecting_since:
+            # leave the list's changes to collect a while longer
+            blocked.add(op.listname)
+            continue
+        if op.next_attempt > now or not _claim(op, now):
+            blocked.add(op.listname)
+            continue
+        claimed += 1
+
+        try:
+            group = _get_group(op)
+        except ObjectDoesNotExist, e:
+            _record_failure(op, e, max_attempts, counts)
+            blocked.add(op.listname)
+            continue
+
+        if is_membership:
+            if op.kind == MailmanOperation.ADD_MEMBERS:
+                coalescer.add(group, op.get_members())
+            else:
+                coalescer.remove(group, op.get_members())
+            coalesced.append((op, group))
+            continue
+
+        try:
+            execute(op.kind, group, op.get_members())
+        except Exception, e:
+            # whatever went wrong (a mailman traceback, a lock timeout, an
+            # error from the mail db), the operation is retried or dead-lettered
+            # rather than left running
+            _record_failure(op, e, max_attempts, counts)
+            blocked.add(op.listname)
+            continue
+        _record_success(op, counts)
+
+    flushed = coalescer.flush()
+    for op, group in coalesced:
+        action = coalesce.ADDED
+        if op.kind == MailmanOperation.REMOVE_MEMBERS:
+            action = coalesce.REMOVED
+        outcomes = dict((m, coalesce.outcome(flushed, group, m, action))
+                        for m in op.get_members())
+        if action == coalesce.ADDED:
+            rejected = group.discard_rejected_members(outcomes)
+            if rejected:
+                print >>sys.stderr, 'mailman rejected %s' % ', '.join(rejected)
+
+        failed = [m for m, outcome in outcomes.iteritems()
+                  if outcome == coalesce.FAILED]
+        if failed:
+            # only the addresses that failed are tried again
+            op.members = '\n'.join(failed)
+            _record_failure(op, '%s failed for %s' % (op.kind, ', '.join(failed)),
+                    max_attempts, counts)
+        else:
+            _record_success(op, counts)
+    return counts
+
+
+def _claim(op, now):
+    """
+    Marks op as running, unless another worker got to it first. Returns
+    whether we got it.
+    """
+    claimed = MailmanOperation.objects.filter(id=op.id, status=op.status,
+            next_attempt=op.next_attempt).update(
+                    status=MailmanOperation.RUNNING,
+                    next_attempt=now + CLAIM_TIMEOUT)
+    return claimed == 1
+
+
+def _get_group(op):
+    from group_mail.apps.group.models import Group
+    try:
+        return Group.objects.get(id=op.group_id)
+    except Group.DoesNotExist:
+        if op.kind != MailmanOperation.RMLIST:
+            raise
+        # removing a list only needs the group's id
+        return Group(id=op.group_id)
+
+
+def _record_success(op, counts):
+    op.attempts += 1
+    op.status = MailmanOperation.DONE
+    op.last_error = ''
+    op.save()
+    counts['done'] += 1
+
+
+def _record_failure(op, error, max_attempts, counts):
+    op.attempts += 1
+    op.last_error = str(error)
+    print >>sys.stderr, 'mailman operation %d failed: %s' % (op.id, error)
+    if op.attempts >= max_attempts:
+        op.status = MailmanOperation.DEAD
+        counts['dead'] += 1
+    else:
+        op.status = MailmanOperation.PENDING
+        op.next_attempt = timezone.now() + backoff(op.attempts)
+        counts['retried'] += 1
+    op.save()
+
+
+def backoff(attempts):
+    """ Returns how long to wait before the next try after attempts failures. """
+    seconds = settings.MAILMAN_OUTBOX_BACKOFF * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.MAILMAN_OUTBOX_MAX_BACKOFF))
@@ -0,0 +1,14 @@
+"""
+Where mailman's scripts and lists live. Kept free of other imports so the
+worker and the config reader can use it without loading a backend.
+"""
+
+ROOT_MAILMAN_DIR = '/var/lib/mailman'
+
+
+def get_script_dir(script_name):
+    return ROOT_MAILMAN_DIR + '/bin/' + script_name
+
+
+def get_list_dir(listname):
+    return ROOT_MAILMAN_DIR + '/lists/' + listname
@@ -1,121 +1,33 @@
 """
 redirect_list is called in mailman/Mailman/Queue/Switchboard.py
 to redirect mailman to the proper group_mail mailing list.
-"""
-
-import email
-from Mailman.Logging.Syslog import syslog
-from django.core.management import setup_environ
-from group_mail import settings
-setup_environ(settings)
-
-from group_mail.apps.common.models import Email
-from group_mail.apps.mailman.mailman_cmds import to_listname, is_internal_listname
-
-TO_HEADER = 'To'
-DOMAIN = '@' + settings.EMAIL_DOMAIN
 
+redirect_lists does the same for a batch of messages, looking up each
+distinct (sender, listname) pair once; a queue runner that dequeues several
+messages at a time should hand them all to it.
 
-def redirect_list(msg, data):
-    """
-    Redirects the msg and rewrites the data if this a message
-    to one of our mailing lists.
-
-    In particular, we manipulate data['listname'] and the msg
-    To header to deal with internal/external listnames.
-    """
-    syslog('debug', 'in the redirect_list function')
-    if _sent_to_mailing_list(msg):
-        sender = msg.get_sender()
-        try:
-            listname = data['listname']
-        except KeyError:
-            syslog('error', 'no listname key in message data')
-            return
-
-        syslog('debug', 'listname: %s', listname)
-
-        real_listname = _get_real_listname(sender, listname)
-        syslog('debug', 'real_listname: %s', str(real_listname))
-        if real_listname:
-            error = _replace_header(msg, TO_HEADER, real_listname)
-            if error:
-                syslog('error', error)
-                return
-            data['listname'] = real_listname
-    else:
-        syslog('debug', "email wasn't sent to mailing list")
-
-
-def _sent_to_mailing_list(msg):
-    """
-    Returns True if msg was sent to a mailing list,
-    i.e. sent to an email that ends with our site's domain.
-    """
-    fieldvals = msg.get_all(TO_HEADER)
-    for name, addr in email.utils.getaddresses(fieldvals):
-        syslog('debug', 'addr: %s', addr)
-        if addr.find(DOMAIN) != -1:
-            return True
-    return False
+Both rewrite the message and its data in place, routing each copy postfix
+hands mailman to the list it was addressed to. A Switchboard that calls
+redirect_fanned_out instead routes a message sent to several of our lists
+to all of them at once (see routing.fan_out):
 
+    msg, data = ...  # as dequeued
+    redirect_fanned_out(self, msg, data)
+    return msg, data
 
-def _replace_header(msg, header, real_listname):
-    try:
-        msg.replace_header(header, real_listname + DOMAIN)
-        return None
-    except KeyError:
-        return 'no %s header in msg' % header
-
-
-def _get_real_listname(sender_email, listname):
-    """
-    Returns the 'real' name of listname.
-
-    For external names, this function returns the internal name.
-        e.g. listname = group@tmail.com ==> return _4839@tmail.com
-
-    For internal names, this function returns the external name.
-        e.g. listname = _4839@tmail.com ==> return group@tmail.com
-    """
-    if is_internal_listname(listname):
-        name = _get_group_name_from_internal_name(listname)
-    else:
-        # listname is the name of the relevant group
-        name = _get_internal_name_from_group_name(sender_email, listname)
-    return name
-
+See the routing module, which does the work.
+"""
 
-def _get_group_name_from_internal_name(internal_name):
-    """
-    Returns the external name of the list whose group id is given by
-    internal_name, since internal name takes the form _id.
-    """
-    from group_mail.apps.group.models import Group
-    group_id = internal_name[1:]
-    try:
-        return Group.objects.get(id=group_id).name
-    except Group.DoesNotExist:
-        syslog('error', "group object didn't exist")
-        return None
+from group_mail.apps.mailman.routing import redirect_list, redirect_lists, fan_out
 
 
-def _get_internal_name_from_group_name(sender_email, group_name):
+def redirect_fanned_out(switchboard, msg, data):
     """
-    Returns the internal name of the list which is associated with group_name
-    and to which sender_email is subscribed.
+    Routes msg, fanning it out to every one of our lists it was sent to.
+    The delivery to the first list is msg and data themselves, rewritten in
+    place; the deliveries to the others are enqueued on switchboard. A copy
+    another copy covers is discarded.
     """
-    from group_mail.apps.group.models import Group
-    syslog('debug', 'attempting to get internal name')
-    try:
-        email_obj = Email.objects.get(email=sender_email)
-    except Email.DoesNotExist:
-        syslog('error', "email object didn't exist: %s " % sender_email)
-        return None
-
-    group = Group.objects.get_group_for_email([email_obj], group_name)
-    if not group:
-        # we didn't find a single group with the listname for this sender
-        syslog('error', "group object didn't exist")
-
-    return to_listname(group)
+    deliveries = fan_out([(msg, data)])
+    for extra_msg, extra_data in deliveries[1:]:
+        switchboard.enqueue(extra_msg, extra_data)
@@ -0,0 +1,89 @@
+"""
+A long-lived process that keeps every route in memory and answers the
+mailman qrunners' routing questions over a Unix socket, so they don't need
+django or a db connection of their own. See manage.py routing_resolver.
+
+The routes are refreshed from the db every few seconds, reading only the
+groups that changed (see routing_table.refresh). Answers are authoritative:
+a sender we don't know isn't in the group, as of the last refresh.
+
+A request looks like:
+    {'senders': [['brian@gmail.com', 'friends'], ...], 'groups': ['42', ...]}
+
+and the response like:
+    {'senders': ['_42', null, ...], 'groups': ['friends', ...]}
+
+giving the internal listname for each (sender, group name) pair and the
+name of each group id, or null. Either key may be left out of a request.
+"""
+
+import sys
+import time
+import threading
+from group_mail.apps.mailman import unix_rpc, routing_table
+from group_mail.apps.mailman.listnames import INTERNAL_LISTNAME_PREFIX
+
+
+class Resolver(object):
+    def __init__(self):
+        self.data = None
+        self.senders = {}
+        self.groups = {}
+
+    def refresh(self, full=False):
+        """ Rereads the routes that changed. Returns the number of groups read. """
+        data, count = routing_table.refresh(None if full else self.data)
+        senders = routing_table.get_senders(data[2])
+        # readers may be using the old dicts; swap in new ones
+        self.data, self.senders, self.groups = data, senders, data[1]
+        return count
+
+    def handle_request(self, request):
+        try:
+            response = {'senders': [self.listname(sender, name) for sender, name
+                                    in request.get('senders', [])],
+                        'groups': [self.group_name(group_id) for group_id
+                                   in request.get('groups', [])]}
+        except (AttributeError, TypeError, ValueError):
+            return {'error': 'malformed request'}
+        return response
+
+    def listname(self, sender, group_name):
+        group_id = self.senders.get((sender.lower(), group_name))
+        if group_id is None:
+            return None
+        return '%s%d' % (INTERNAL_LISTNAME_PREFIX, group_id)
+
+    def group_name(self, group_id):
+        group_id = str(group_id)
+        return self.groups.get(int(group_id)) if group_id.isdigit() else None
+
+
+def serve(socket_path, mode=0660, interval=5.0, full_interval=3600.0):
+    """
+    Loads every route, then answers requests on socket_path forever while a
+    thread refreshes the routes every interval seconds, and rereads all of
+    them every full_interval seconds.
+    """
+    resolver = Resolver()
+    resolver.refresh(full=True)
+
+    def refresh_forever():
+        from django.db import connection
+        last_full = time.time()
+        while True:
+            time.sleep(interval)
+            full = time.time() - last_full >= full_interval
+            try:
+                resolver.refresh(full)
+                if full:
+                    last_full = time.time()
+            except Exception, e:
+                print >>sys.stderr, 'failed to refresh routes: %s' % e
+                # start over with a fresh connection next time
+                connection.close()
+
+    refresher = threading.Thread(target=refresh_forever)
+    refresher.daemon = True
+    refresher.start()
+    unix_rpc.serve(socket_path, resolver.handle_request, mode)
@@ -0,0 +1,67 @@
+"""
+Per-address outcomes of mailman membership changes.
+
+add_members and remove_members return a dict mapping each address they were
+given to one of the outcomes below, so that one bad address doesn't cost
+the whole batch. Problems with the list itself (no such list, permission
+errors, a script that crashed, ...) still raise MailmanError.
+
+An address is only ADDED once mailman says it subscribed it; an address
+the output doesn't account for is FAILED, and tried again.
+"""
+
+ADDED = 'added'
+ALREADY_MEMBER = 'already a member'
+INVALID = 'invalid'
+REMOVED = 'removed'
+NO_SUCH_MEMBER = 'no such member'
+FAILED = 'failed'
+
+# the outcomes that leave the address in the state the caller asked for
+SUCCESSES = frozenset([ADDED, ALREADY_MEMBER, REMOVED, NO_SUCH_MEMBER])
+
+# lines in bin/add_members and bin/remove_members output that take the form
+# 'prefix: address'
+_LINE_OUTCOMES = {
+    'Subscribed': ADDED,
+    'Already a member': ALREADY_MEMBER,
+    'Bad/Invalid email address': INVALID,
+    'Hostile address (illegal characters)': INVALID,
+    'No such member': NO_SUCH_MEMBER,
+}
+
+# output that means the command failed for every address
+LIST_ERRORS = ['Illegal list name', 'List already exists', 'No such list',
+               'sudo',  # catch sudo (permission) errors
+               'Traceback (most recent call last)',  # the script crashed
+               ]
+
+
+def parse_member_output(output, members, default):
+    """
+    Reads the output of bin/add_members or bin/remove_members for members
+    in a single pass. Returns a (results, errors) tuple, where results maps
+    each address in members to its outcome (default if the output doesn't
+    mention it) and errors lists the lines reporting list-wide failures.
+    """
+    originals = dict((m.lower(), m) for m in members)
+    results = dict((m, default) for m in members)
+    errors = []
+    for line in output.split('\n'):
+        prefix, sep, address = line.partition(': ')
+        outcome = _LINE_OUTCOMES.get(prefix.strip())
+        if not outcome and 'Banned address' in line:
+            # banned addresses are reported as 'address Banned address (...)'
+            outcome, address = INVALID, line.split(' ', 1)[0]
+        if outcome:
+            member = originals.get(address.strip().lower())
+            if member is not None:
+                results[member] = outcome
+        elif line and any(err in line for err in LIST_ERRORS):
+            errors.append(line)
+    return results, errors
+
+
+def failures(results):
+    """ Returns the addresses in results whose change didn't take effect. """
+    return [m for m, outcome in results.iteritems() if outcome not in SUCCESSES]
@@ -0,0 +1,514 @@
+"""
+Works out which lists a message to our addresses is meant for; see
+redirect.redirect_list.
+
+This runs in every mailman qrunner, so importing it only loads what routing
+needs: our settings module (which is plain python), the routing table and
+the caches. Django and our models are loaded on the first message we have
+to look up in the db.
+
+If settings.ROUTING_RESOLVER_SOCKET is set, listnames come from the
+routing resolver (see the resolver module), which keeps them all in
+memory. Otherwise, or if the
+resolver doesn't answer, we look listnames up in the routing table (see
+routing_table) and then in the db. Listnames we had to resolve from the db
+are cached for settings.REDIRECT_CACHE_TTL seconds, so busy lists route
+without touching the db even when the table is behind. Changes made in
+this process invalidate the affected entries through signals; changes made
+by other processes (the web app, the outbox) are only seen once the entries
+expire.
+"""
+
+import sys
+import email
+import socket
+from group_mail import settings
+from group_mail.apps.mailman import unix_rpc
+from group_mail.apps.mailman.listnames import to_listname, is_internal_listname
+from group_mail.apps.mailman.lru import LRUCache
+from group_mail.apps.mailman.routing_table import RoutingTable
+from group_mail.apps.mailman.sender_filter import SenderFilter
+from group_mail.apps.mailman.stats import get_stats
+
+try:
+    from Mailman.Logging.Syslog import syslog
+except ImportError:
+    # outside mailman's qrunners
+    def syslog(kind, msg, *args):
+        if kind == 'error':
+            print >>sys.stderr, msg % args if args else msg
+
+try:
+    from Mailman.MailList import MailList
+    from Mailman.Handlers import CalcRecips
+except ImportError:
+    # outside mailman's qrunners; see _set_recipients
+    MailList = CalcRecips = None
+
+
+# so that debug messages aren't even formatted unless we want them
+if settings.ROUTING_DEBUG:
+    def debug(msg, *args):
+        syslog('debug', msg, *args)
+else:
+    def debug(msg, *args):
+        pass
+
+TO_HEADER = 'To'
+CC_HEADER = 'Cc'
+# marks the msgdata of the deliveries a message fanned out to; see fan_out
+ROUTED = 'group_mail_routed'
+DOMAIN = '@' + settings.EMAIL_DOMAIN
+
+# (lowercased sender email, group name) -> internal listname, or None if the
+# sender isn't in a group with the name
+_internal_names = LRUCache(settings.REDIRECT_CACHE_SIZE,
+        ttl=settings.REDIRECT_CACHE_TTL)
+# group id -> group name, or None if there's no such group
+_group_names = LRUCache(settings.REDIRECT_CACHE_SIZE,
+        ttl=settings.REDIRECT_CACHE_TTL)
+# Message-ID -> the (listname, sender) hops it took through us, most recent
+# last; see _count_hop
+_hops = LRUCache(settings.ROUTING_LOOP_CACHE_SIZE, ttl=settings.ROUTING_LOOP_TTL)
+# hops kept per message, for the log
+MAX_TRACE = 20
+_MISSING = object()
+_table = RoutingTable(settings.ROUTING_TABLE_FILE) \
+        if settings.ROUTING_TABLE_FILE else None
+_senders = SenderFilter(settings.SENDER_FILTER_FILE) \
+        if settings.SENDER_FILTER_FILE else None
+_models = None
+_stats = get_stats(settings.ROUTING_STATS_SINK, settings.ROUTING_STATS_INTERVAL)
+
+
+def _get_models():
+    """
+    Returns the (Email, Group) models, setting up django the first time
+    we're called.
+    """
+    global _models
+    if _models is None:
+        from django.core.management import setup_environ
+        setup_environ(settings)
+        from django.db.models.signals import m2m_changed, post_save, post_delete
+        from group_mail.apps.common.models import Email
+        from group_mail.apps.group.models import Group
+
+        m2m_changed.connect(_emails_changed, sender=Group.emails.through,
+                dispatch_uid='redirect_emails_changed')
+        post_save.connect(_group_changed, sender=Group,
+                dispatch_uid='redirect_group_saved')
+        post_delete.connect(_group_changed, sender=Group,
+                dispatch_uid='redirect_group_deleted')
+        post_save.connect(_email_saved, sender=Email,
+                dispatch_uid='redirect_email_saved')
+        post_delete.connect(_email_deleted, sender=Email,
+                dispatch_uid='redirect_email_deleted')
+        _models = Email, Group
+    return _models
+
+
+def redirect_list(msg, data):
+    """
+    Redirects the msg and rewrites the data if this a message
+    to one of our mailing lists.
+
+    In particular, we manipulate data['listname'] and the msg
+    To header to deal with internal/external listnames. A message that has
+    been looping is discarded (see _count_hop).
+    """
+    redirect_lists([(msg, data)])
+
+
+def redirect_lists(messages):
+    """
+    Does what redirect_list does for every (msg, data) pair in messages,
+    looking up all the distinct (sender, listname) pairs among them at once.
+    """
+    _route(messages, fanning_out=False)
+
+
+def fan_out(messages):
+    """
+    Routes messages like redirect_lists, except that a message To or Cc
+    several of our lists goes to all of them at once, so that each person
+    in several of those lists only gets it once. Only the hook in the
+    redirect module uses this, since the hook has to queue the extra
+    deliveries.
+
+    Returns the resulting deliveries as a list of (msg, data) pairs, one per
+    list, all sharing msg. Postfix hands mailman a copy of such a message
+    for each of our addresses; the copy for the first address we can route
+    fans out to all of them, and the other copies are discarded. The
+    deliveries of a message that fanned out are marked ROUTED, so that they
+    pass through unchanged once queued.
+    """
+    return _route(messages, fanning_out=True)
+
+
+def _route(messages, fanning_out):
+    with _stats.timer('route.batch'):
+        deliveries = _redirect_lists(messages, fanning_out)
+    _stats.incr('route.messages', len(messages))
+    _stats.incr('route.deliveries', len(deliveries))
+    _stats.maybe_flush()
+    return deliveries
+
+
+def _discard(data):
+    # mailman's IncomingRunner finishes a message with an empty pipeline
+    # without delivering it
+    data['pipeline'] = []
+
+
+def _redirect_lists(messages, fanning_out):
+    debug('redirecting %d messages', len(messages))
+    routed = []
+    pairs = set()
+    deliveries = []
+    for msg, data in messages:
+        if data.get(ROUTED):
+            # a delivery fan_out queued earlier
+            _stats.incr('route.requeued')
+            deliveries.append((msg, data))
+            continue
+        with _stats.timer('route.parse'):
+            addresses = _get_list_addresses(msg)
+        if not addresses:
+            debug("email wasn't sent to mailing list")
+            _stats.incr('route.not_ours')
+            deliveries.append((msg, data))
+            continue
+        try:
+            listname = data['listname']
+        except KeyError:
+            syslog('error', 'no listname key in message data')
+            deliveries.append((msg, data))
+            continue
+        debug('listname: %s', listname)
+
+        if not fanning_out or \
+                listname.lower() not in [address.lower() for address in addresses]:
+            # each copy is routed to its own list, as is a copy we were bcc'd
+            addresses = [listname]
+        with _stats.timer('route.sender'):
+            sender = msg.get_sender()
+        if _count_hop(msg, listname, sender):
+            _stats.incr('route.loops')
+            _discard(data)
+            continue
+        routed.append((msg, data, sender, listname, addresses))
+        pairs.update((sender, address) for address in addresses)
+
+    with _stats.timer('route.lookup'):
+        real_listnames = _get_real_listnames(pairs)
+    fanned_out = []
+    for msg, data, sender, listname, addresses in routed:
+        targets = []
+        for address in addresses:
+            real_listname = real_listnames.get((sender, address))
+            if real_listname and real_listname not in targets:
+                targets.append(real_listname)
+        debug('real listnames: %s', targets)
+        if not targets:
+            _stats.incr('route.unresolved')
+            deliveries.append((msg, data))
+            continue
+        leader = [a for a in addresses if real_listnames.get((sender, a))][0]
+        if leader.lower() != listname.lower():
+            debug('the copy for %s delivers to %s', leader, listname)
+            _stats.incr('route.covered_copies')
+            _discard(data)
+            continue
+
+        with _stats.timer('route.rewrite'):
+            error = _replace_header(msg, TO_HEADER, targets)
+        if error:
+            syslog('error', error)
+            deliveries.append((msg, data))
+            continue
+        data['listname'] = targets[0]
+        if len(targets) == 1:
+            deliveries.append((msg, data))
+            continue
+        # the deliveries share a To header naming all the lists, which
+        # mustn't be routed again
+        data[ROUTED] = True
+        copies = [(msg, data)]
+        copies.extend((msg, dict(data, listname=target)) for target in targets[1:])
+        deliveries.extend(copies)
+        fanned_out.append(copies)
+
+    if fanned_out:
+        _stats.incr('route.fanned_out', len(fanned_out))
+        with _stats.timer('route.recipients'):
+            _set_recipients(fanned_out)
+    return deliveries
+
+
+def _count_hop(msg, listname, sender):
+    """
+    Records that msg reached listname and returns True if it's been looping:
+    if it has reached listname more than settings.ROUTING_MAX_HOPS times
+    within settings.ROUTING_LOOP_TTL seconds. A misconfigured alias or an
+    auto-responder among the members can otherwise bounce a message between
+    a list's external and internal names forever.
+
+    Each copy postfix hands us of a message sent to several of our lists
+    reaches a different list, so those don't count against each other.
+    """
+    message_id = msg.get('Message-ID')
+    if not message_id:
+        return False
+    trace = _hops.get(message_id)
+    if trace is None:
+        trace = []
+        _hops.set(message_id, trace)
+    trace.append((listname.lower(), sender))
+    del trace[:-MAX_TRACE]
+    hops = sum(1 for name, s in trace if name == listname.lower())
+    if hops <= settings.ROUTING_MAX_HOPS:
+        return False
+    syslog('error', 'dropping %s, which reached %s %d times: %s', message_id,
+           listname, hops, ' -> '.join('%s from %s' % hop for hop in trace))
+    return True
+
+
+def _get_list_addresses(msg):
+    """
+    Returns the local parts of the addresses on our site's domain that msg
+    was sent To or Cc, in the order they appear.
+    """
+    fieldvals = msg.get_all(TO_HEADER, []) + msg.get_all(CC_HEADER, [])
+    addresses = []
+    for name, addr in email.utils.getaddresses(fieldvals):
+        debug('addr: %s', addr)
+        local, at, domain = addr.rpartition('@')
+        if at and '@' + domain.lower() == DOMAIN and local not in addresses:
+            addresses.append(local)
+    return addresses
+
+
+def _replace_header(msg, header, real_listnames):
+    if header not in msg:
+        return 'no %s header in msg' % header
+    msg.replace_header(header, ', '.join(name + DOMAIN for name in real_listnames))
+    return None
+
+
+def _set_recipients(fanned_out):
+    """
+    Takes lists of deliveries of the same message and sets each delivery's
+    data['recips'] (which mailman's CalcRecips handler uses as is) so that
+    someone in several of the lists only gets the message once, through the
+    first of them.
+
+    Each list's recipients are the ones CalcRecips itself picks, so the
+    members' nomail, digest, bounce and not-metoo settings still apply. A
+    delivery whose recipients we can't work out is left to mailman, at the
+    cost of a second copy for some. Outside mailman, none are set.
+    """
+    if CalcRecips is None:
+        return
+    for copies in fanned_out:
+        seen = set()
+        for msg, data in copies:
+            recips = _calc_recips(msg, data)
+            if recips is None:
+                continue
+            recips = [address for address in recips if address.lower() not in seen]
+            seen.update(address.lower() for address in recips)
+            data['recips'] = recips
+
+
+def _calc_recips(msg, data):
+    """
+    Returns the recipients mailman would deliver msg to on data['listname'],
+    or None if we can't tell.
+    """
+    msgdata = dict(data)
+    msgdata.pop('recips', None)
+    try:
+        mlist = MailList(data['listname'], lock=False)
+        CalcRecips.process(mlist, msg, msgdata)
+    except Exception, e:
+        _stats.incr('route.recipients.error')
+        syslog('error', 'no recipients for %s: %s', data['listname'], e)
+        return None
+    return msgdata.get('recips')
+
+
+def _get_real_listnames(pairs):
+    """
+    Takes (sender email, listname) pairs and returns a dict mapping each
+    to the 'real' name of listname, or None if there isn't one.
+
+    For external names, the real name is the internal name.
+        e.g. listname = group@tmail.com ==> return _4839@tmail.com
+
+    For internal names, the real name is the external name.
+        e.g. listname = _4839@tmail.com ==> return group@tmail.com
+    """
+    internal = [(sender, listname) for sender, listname in pairs
+                if is_internal_listname(listname)]
+    # listname is the name of the relevant group
+    external = [pair for pair in pairs if not is_internal_listname(pair[1])]
+
+    internal_names = list(set(listname for sender, listname in internal))
+    response = None
+    if settings.ROUTING_RESOLVER_SOCKET and (external or internal_names):
+        response = _ask_resolver({'senders': external,
+                                  'groups': [name[1:] for name in internal_names]})
+    if response:
+        names = dict(zip(internal_names, response['groups']))
+        real_listnames = dict((pair, str(listname) if listname else None)
+                              for pair, listname in zip(external, response['senders']))
+    else:
+        names = _get_group_names(internal_names)
+        real_listnames = _get_internal_names(external)
+    for sender, listname in internal:
+        real_listnames[(sender, listname)] = names[listname]
+    return real_listnames
+
+
+def _ask_resolver(request):
+    """
+    Sends request to the routing resolver (see the resolver module) and
+    returns its response, or None if it didn't answer the whole request.
+    """
+    try:
+        with _stats.timer('route.resolver'):
+            response = unix_rpc.call(settings.ROUTING_RESOLVER_SOCKET, request,
+                    timeout=settings.ROUTING_RESOLVER_TIMEOUT)
+        for key, values in request.iteritems():
+            if len(response[key]) != len(values):
+                raise unix_rpc.RPCError('response does not match request')
+    except (socket.error, unix_rpc.RPCError, KeyError, TypeError), e:
+        _stats.incr('route.resolver.error')
+        syslog('error', 'routing resolver unavailable: %s', e)
+        return None
+    return response
+
+
+def _get_group_names(internal_names):
+    """
+    Returns a dict mapping each of internal_names to the external name of
+    the list whose group id it gives, since internal names take the form
+    _id, or to None if there's no such group.
+    """
+    names, missing = {}, {}
+    for internal_name in internal_names:
+        group_id = internal_name[1:]
+        name = _table.group_name(group_id) if _table else None
+        if name is not None:
+            _stats.incr('route.group_names.table_hit')
+            names[internal_name] = name
+            continue
+        name = _group_names.get(group_id, _MISSING)
+        if name is _MISSING:
+            _stats.incr('route.group_names.miss')
+            missing[group_id] = internal_name
+        else:
+            _stats.incr('route.group_names.cache_hit')
+            names[internal_name] = name
+
+    if missing:
+        Email, Group = _get_models()
+        ids = [group_id for group_id in missing if group_id.isdigit()]
+        with _stats.timer('route.group_names.db'):
+            found = dict((str(group_id), name) for group_id, name in
+                         Group.objects.filter(id__in=ids).values_list('id', 'name'))
+        for group_id, internal_name in missing.iteritems():
+            name = found.get(group_id)
+            _group_names.set(group_id, name)
+            names[internal_name] = name
+
+    for internal_name, name in names.iteritems():
+        if name is None:
+            syslog('error', "group object didn't exist: %s", internal_name)
+    return names
+
+
+def _get_internal_names(pairs):
+    """
+    Takes (sender email, group name) pairs and returns a dict mapping each
+    to the internal name of the list which is associated with the group name
+    and to which the sender is subscribed, or to None.
+    """
+    listnames, missing = {}, []
+    for pair in pairs:
+        listname = _table.listname(*pair) if _table else None
+        if listname is not None:
+            _stats.incr('route.senders.table_hit')
+            listnames[pair] = listname
+            continue
+        listname = _internal_names.get(_cache_key(*pair), _MISSING)
+        if listname is not _MISSING:
+            _stats.incr('route.senders.cache_hit')
+            listnames[pair] = listname
+        elif _senders and not _senders.might_know(pair[0]):
+            # a stranger, and so in none of our groups
+            _stats.incr('route.senders.filtered')
+            listnames[pair] = None
+        else:
+            _stats.incr('route.senders.miss')
+            missing.append(pair)
+
+    if missing:
+        debug('looking up %d senders in the db', len(missing))
+        Email, Group = _get_models()
+        with _stats.timer('route.senders.db'):
+            groups = Group.objects.get_groups_for_senders(missing)
+        for pair, group in groups.iteritems():
+            listname = to_listname(group)
+            _internal_names.set(_cache_key(*pair), listname)
+            listnames[pair] = listname
+
+    for (sender, name), listname in listnames.iteritems():
+        if listname is None:
+            # we didn't find a single group with the listname for this
+            # sender; mostly spam, so not worth an error each
+            _stats.incr('route.senders.unknown')
+            debug("no group %s for %s", name, sender)
+    return listnames
+
+
+def _cache_key(sender_email, group_name):
+    return (sender_email.lower(), group_name)
+
+
+""" Cache invalidation """
+
+
+def _emails_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # instance is an Email whose groups changed
+        address = instance.email.lower()
+        _internal_names.delete_where(lambda key, value: key[0] == address)
+    else:
+        # instance is a Group whose emails changed
+        _internal_names.delete_where(lambda key, value: key[1] == instance.name)
+
+
+def _group_changed(sender, instance, **kwargs):
+    # a renamed group both stops answering to its old name and starts
+    # answering to its new one
+    listname = to_listname(instance)
+    _group_names.delete(str(instance.id))
+    _internal_names.delete_where(
+            lambda key, value: key[1] == instance.name or value == listname)
+
+
+def _email_saved(sender, instance, created, **kwargs):
+    if not created:
+        # the address may have changed, and we don't know what it was
+        _internal_names.clear()
+    else:
+        _email_deleted(sender, instance)
+
+
+def _email_deleted(sender, instance, **kwargs):
+    address = instance.email.lower()
+    _internal_names.delete_where(lambda key, value: key[0] == address)
@@ -0,0 +1,204 @@
+"""
+A precomputed routing table, so that redirect_list can route most mail
+without a db connection.
+
+The table is a text file of sorted, tab-separated lines:
+
+    #built<TAB><unix time the data was read>
+    g<TAB><group id><TAB><group name>
+    s<TAB><lowercased sender email><TAB><group name><TAB><internal listname>
+
+RoutingTable memory-maps it and binary searches it, so a lookup touches a
+handful of pages no matter how big the table is. manage.py
+build_routing_table keeps it up to date, rewriting only the groups whose
+members or names changed since it was built, and renames the new table into
+place so readers never see a partial file.
+
+Reading the table doesn't need django; only building it does.
+"""
+
+import os
+import time
+from group_mail.apps.mailman.listnames import INTERNAL_LISTNAME_PREFIX
+from group_mail.apps.mailman.mapped_file import MappedFile
+
+HEADER = '#built\t'
+# members_changed is set by the web servers' clocks; reread groups changed
+# this many seconds before the last build in case ours disagrees
+CLOCK_SLACK = 60
+GROUP = 'g'
+SENDER = 's'
+
+
+class RoutingTable(object):
+    """
+    Looks up routes in the table at path. Notices when the table is
+    replaced, checking at most every check_interval seconds. Returns None
+    for anything the table doesn't know, including when there's no table.
+    """
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self._file = MappedFile(path, check_interval)
+
+    def listname(self, sender_email, group_name):
+        """ Returns the internal listname of sender_email's group group_name. """
+        return self._find(_join(SENDER, sender_email.lower(), group_name) + '\t')
+
+    def group_name(self, group_id):
+        """ Returns the name of the group with id group_id. """
+        name = self._find(_join(GROUP, str(group_id)) + '\t')
+        return name.decode('utf-8') if name is not None else None
+
+    def _find(self, prefix):
+        """ Returns the rest of the line starting with prefix. """
+        mm = self._file.get()
+        if mm is None:
+            return None
+        start = _bisect(mm, prefix)
+        end = mm.find('\n', start)
+        if end == -1 or mm[start:start + len(prefix)] != prefix:
+            return None
+        return mm[start + len(prefix):end]
+
+
+def _join(*fields):
+    return '\t'.join(field.encode('utf-8') if isinstance(field, unicode) else field
+                     for field in fields)
+
+
+def _bisect(mm, key):
+    """
+    Returns the offset of the first line in mm that sorts at or after key,
+    or the size of mm if there's none. The lines in mm must be sorted.
+    """
+    lo, hi = 0, mm.size()
+    # lo and hi are always at the start of a line
+    while lo < hi:
+        newline = mm.rfind('\n', lo, (lo + hi) // 2)
+        start = newline + 1 if newline != -1 else lo
+        end = mm.find('\n', start)
+        if mm[start:end] < key:
+            lo = end + 1
+        else:
+            hi = start
+    return lo
+
+
+""" Building """
+
+
+def read(path):
+    """
+    Reads the table at path. Returns a (built, groups, routes) tuple, where
+    built is when its data was read, groups maps group ids to names and
+    routes maps group ids to lists of (sender, group name) pairs. Returns
+    None if there's no table.
+    """
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        return None
+    built, groups, routes = None, {}, {}
+    with f:
+        for line in f:
+            fields = line.rstrip('\n').decode('utf-8').split('\t')
+            if line.startswith(HEADER):
+                built = float(fields[1])
+            elif fields[0] == GROUP:
+                groups[int(fields[1])] = fields[2]
+            elif fields[0] == SENDER:
+                group_id = int(fields[3][len(INTERNAL_LISTNAME_PREFIX):])
+                routes.setdefault(group_id, []).append((fields[1], fields[2]))
+    if built is None:
+        return None
+    return built, groups, routes
+
+
+def build(path, full=False, batch_size=500):
+    """
+    Brings the table at path up to date with the db and swaps it into
+    place. Unless full is True or there's no table yet, only the groups
+    that are new, renamed or whose emails changed since the table was built
+    are read from the db (see refresh). Returns the number of groups read.
+    """
+    data, count = refresh(None if full else read(path), batch_size)
+    write(path, data)
+    return count
+
+
+def refresh(old=None, batch_size=500):
+    """
+    Reads routes from the db. old is a (built, groups, routes) tuple like
+    read() returns; if given, only the groups that are new, renamed or whose
+    emails changed since it was built are read, and the rest of the routes
+    are taken from old, which isn't modified. Returns the new tuple and the
+    number of groups read.
+
+    A changed email address isn't noticed until the group's members change
+    again, so a full refresh should still be done now and then.
+    """
+    from datetime import datetime
+    from django.db import transaction
+    from django.utils import timezone
+    from group_mail.apps.group.models import Group
+
+    started = time.time()
+    groups = dict(Group.objects.filter(is_spare=False).values_list('id', 'name'))
+    if old:
+        built, old_groups, routes = old
+        since = datetime.fromtimestamp(built - CLOCK_SLACK, timezone.utc)
+        stale = set(Group.objects.filter(is_spare=False,
+                members_changed__gte=since).values_list('id', flat=True))
+        stale.update(group_id for group_id, name in groups.iteritems()
+                     if old_groups.get(group_id) != name)
+        routes = dict((group_id, pairs) for group_id, pairs in routes.iteritems()
+                      if group_id in groups and group_id not in stale)
+    else:
+        stale, routes = set(groups), {}
+
+    stale = sorted(stale)
+    through = Group.emails.through
+    for i in xrange(0, len(stale), batch_size):
+        rows = through.objects.filter(group__in=stale[i:i + batch_size]) \
+                .values_list('group_id', 'email__email')
+        for group_id in stale[i:i + batch_size]:
+            routes[group_id] = []
+        for group_id, email in rows:
+            routes[group_id].append((email.lower(), groups[group_id]))
+    # end the read transaction, or long-running callers would keep reading
+    # the same snapshot
+    transaction.commit_unless_managed()
+    return (started, groups, routes), len(stale)
+
+
+def get_senders(routes):
+    """
+    Takes routes like read() returns and maps each (sender, group name) pair
+    to the id of the group it routes to: the oldest of the sender's groups
+    with the name.
+    """
+    senders = {}
+    for group_id in sorted(routes, reverse=True):
+        for pair in routes[group_id]:
+            senders[pair] = group_id
+    return senders
+
+
+def write(path, data):
+    """ Writes the (built, groups, routes) tuple data to a table at path. """
+    built, groups, routes = data
+    lines = [_join(GROUP, str(group_id), name)
+             for group_id, name in groups.iteritems()]
+    lines.extend(_join(SENDER, sender, name,
+                       '%s%d' % (INTERNAL_LISTNAME_PREFIX, group_id))
+                 for (sender, name), group_id in get_senders(routes).iteritems())
+    lines.sort()
+
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write('%s%r\n' % (HEADER, built))
+        for line in lines:
+            f.write(line + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp_path, path)
@@ -0,0 +1,155 @@
+"""
+A Bloom filter of every address we know, so that redirect_list can turn
+away mail from strangers (most of it spam) without touching the db.
+
+The filter is a file: a header followed by the filter's bits.
+SenderFilter memory-maps it, so checking an address reads a few bytes of
+pages every process on the host shares. manage.py build_sender_filter
+rebuilds it from the db now and then, sized so that it wrongly claims to
+know about settings.SENDER_FILTER_ERROR_RATE of the addresses it doesn't,
+and renames the new file into place. In between, whichever process saves
+an Email sets the address's bits in the current file (see add).
+
+A filter never claims not to know an address it was given, so a sender
+it doesn't know isn't in any of our groups. The one gap is an Email saved
+while the filter is being rebuilt, which the rebuild may miss; see build.
+
+Checking the filter doesn't need django; only building it does.
+"""
+
+import os
+import math
+import fcntl
+import mmap
+import struct
+import hashlib
+from group_mail.apps.mailman.mapped_file import MappedFile
+
+MAGIC = 'GMBLOOM1'
+# magic, number of bits, number of hashes
+HEADER = struct.Struct('<8sQQ')
+# room to grow between rebuilds, as a multiple of the addresses built from
+GROWTH = 2.0
+MIN_CAPACITY = 1000
+
+
+class SenderFilter(object):
+    """
+    Checks addresses against the filter at path, noticing when it's
+    replaced at most every check_interval seconds.
+    """
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self._file = MappedFile(path, check_interval)
+
+    def might_know(self, address):
+        """
+        Returns False if address definitely isn't one of our Emails. Returns
+        True if it might be, including whenever there's no usable filter.
+        """
+        mm = self._file.get()
+        if mm is None or mm.size() < HEADER.size:
+            return True
+        magic, num_bits, num_hashes = HEADER.unpack(mm[:HEADER.size])
+        if magic != MAGIC:
+            return True
+        for bit in _bits(address, num_bits, num_hashes):
+            if not ord(mm[HEADER.size + bit // 8]) & (1 << bit % 8):
+                return False
+        return True
+
+
+def _bits(address, num_bits, num_hashes):
+    """ Returns the positions of address's bits, by double hashing. """
+    if isinstance(address, unicode):
+        address = address.encode('utf-8')
+    h1, h2 = struct.unpack('<QQ', hashlib.md5(address.lower()).digest())
+    return [(h1 + i * h2) % num_bits for i in xrange(num_hashes)]
+
+
+def get_size(capacity, error_rate):
+    """
+    Returns the (number of bits, number of hashes) a filter of capacity
+    addresses needs to claim to know about only error_rate of the others.
+    """
+    if not 0 < error_rate < 1:
+        raise ValueError('error_rate must be between 0 and 1')
+    num_bits = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+    num_hashes = max(1, int(round(float(num_bits) / capacity * math.log(2))))
+    return num_bits, num_hashes
+
+
+def add(path, addresses):
+    """
+    Sets the bits of addresses in the filter at path, if there is one.
+    Writers take turns through a lock on the file, so no bit is lost to a
+    concurrent write.
+    """
+    try:
+        f = open(path, 'r+b')
+    except IOError:
+        return
+    with f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        mm = mmap.mmap(f.fileno(), 0)
+        try:
+            magic, num_bits, num_hashes = HEADER.unpack(mm[:HEADER.size])
+            if magic != MAGIC:
+                return
+            for address in addresses:
+                for bit in _bits(address, num_bits, num_hashes):
+                    i = HEADER.size + bit // 8
+                    mm[i] = chr(ord(mm[i]) | (1 << bit % 8))
+        finally:
+            mm.close()
+
+
+""" Building """
+
+
+def build(path, error_rate):
+    """
+    Builds a filter of every Email address, with room for as many again,
+    and swaps it into place. Returns the number of addresses.
+
+    An Email saved while we read the db may set its bits in the file we're
+    replacing, so once the new filter is in place we add the Emails newer
+    than the ones we read. An address changed on an existing Email in that
+    window is still missed until the next build.
+    """
+    from django.db import transaction
+    from group_mail.apps.common.models import Email
+
+    rows = list(Email.objects.values_list('id', 'email'))
+    transaction.commit_unless_managed()
+    max_id = max([email_id for email_id, address in rows] or [0])
+    num_bits, num_hashes = get_size(max(int(len(rows) * GROWTH), MIN_CAPACITY),
+                                    error_rate)
+
+    bits = bytearray((num_bits + 7) // 8)
+    for email_id, address in rows:
+        for bit in _bits(address, num_bits, num_hashes):
+            bits[bit // 8] |= 1 << bit % 8
+
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, num_bits, num_hashes))
+        f.write(bits)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp_path, path)
+
+    add(path, Email.objects.filter(id__gt=max_id).values_list('email', flat=True))
+    transaction.commit_unless_managed()
+    return len(rows)
+
+
+def email_saved(sender, instance, **kwargs):
+    """ Adds a saved Email's address to the filter. Connected in models. """
+    from django.conf import settings
+    if settings.SENDER_FILTER_FILE:
+        try:
+            add(settings.SENDER_FILTER_FILE, [instance.email])
+        except (IOError, OSError):
+            # the next build will add it
+            pass
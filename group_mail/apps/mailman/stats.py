@@ -0,0 +1,133 @@
+"""
+In-process counters and timing histograms, flushed now and then to a local
+sink as one line of JSON:
+
+    {"time": 1350000000.0, "pid": 123, "interval": 60.2,
+     "counters": {"route.messages": 42, ...},
+     "timers": {"route.lookup": {"count": 42, "sum": 0.0123, "max": 0.002,
+                                 "buckets": {"100": 40, "3000": 2}}, ...}}
+
+Timer buckets are keyed by their upper bound in microseconds ("inf" for the
+last); each counts the timings above the previous bound.
+
+A sink is either a file path, which each flush appends to, or
+udp://host:port, which each flush sends a datagram to. Stats never raise;
+a sink we can't write to just loses that interval's data.
+"""
+
+import os
+import time
+import json
+import socket
+from bisect import bisect_left
+
+BUCKETS = (10, 30, 100, 300, 1000, 3000, 10000, 30000, 100000, 300000, 1000000)
+
+
+def get_stats(sink, interval=60):
+    """ Returns a Stats writing to sink, or a NullStats if sink is None. """
+    if not sink:
+        return NullStats()
+    return Stats(sink, interval)
+
+
+class Stats(object):
+    def __init__(self, sink, interval=60, clock=time.time):
+        self.sink = sink
+        self.interval = interval
+        self.clock = clock
+        self._socket = None
+        self._reset()
+
+    def incr(self, name, count=1):
+        self.counters[name] = self.counters.get(name, 0) + count
+
+    def record(self, name, seconds):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = {'count': 0, 'sum': 0.0, 'max': 0.0,
+                                         'buckets': [0] * (len(BUCKETS) + 1)}
+        timer['count'] += 1
+        timer['sum'] += seconds
+        timer['max'] = max(timer['max'], seconds)
+        timer['buckets'][bisect_left(BUCKETS, seconds * 1e6)] += 1
+
+    def timer(self, name):
+        """ Returns a context manager that records how long its block takes. """
+        return _Timer(self, name)
+
+    def maybe_flush(self):
+        """ Flushes if the last flush was at least interval seconds ago. """
+        if self.clock() - self._started >= self.interval:
+            self.flush()
+
+    def flush(self):
+        now = self.clock()
+        timers = {}
+        for name, timer in self.timers.iteritems():
+            buckets = dict((str(bound), count) for bound, count in
+                           zip(BUCKETS + ('inf',), timer['buckets']) if count)
+            timers[name] = dict(timer, buckets=buckets)
+        line = json.dumps({'time': now, 'pid': os.getpid(),
+                           'interval': now - self._started,
+                           'counters': self.counters, 'timers': timers})
+        self._reset()
+        try:
+            self._write(line)
+        except (IOError, OSError, socket.error):
+            pass
+
+    def _write(self, line):
+        if self.sink.startswith('udp://'):
+            host, port = self.sink[len('udp://'):].rsplit(':', 1)
+            if self._socket is None:
+                self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.sendto(line, (host, int(port)))
+        else:
+            with open(self.sink, 'a') as f:
+                f.write(line + '\n')
+
+    def _reset(self):
+        self.counters = {}
+        self.timers = {}
+        self._started = self.clock()
+
+
+class _Timer(object):
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.time()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stats.record(self.name, time.time() - self.started)
+
+
+class NullStats(object):
+    """ Stands in for Stats when there's nowhere to send them. """
+    def incr(self, name, count=1):
+        pass
+
+    def record(self, name, seconds):
+        pass
+
+    def timer(self, name):
+        return _NULL_TIMER
+
+    def maybe_flush(self):
+        pass
+
+    def flush(self):
+        pass
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+_NULL_TIMER = _NullTimer()
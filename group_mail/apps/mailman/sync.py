@@ -0,0 +1,98 @@
+"""
+Reconciles mailman's rosters with Group.emails, which is what we consider
+the truth. Used by manage.py sync_mailman.
+"""
+
+from multiprocessing.dummy import Pool
+from group_mail.apps.mailman import mailman_cmds
+from group_mail.apps.mailman.models import MailmanOperation
+
+
+class SyncResult(object):
+    def __init__(self, group_id, added=(), removed=(), error=None, skipped=False):
+        self.group_id = group_id
+        self.added = list(added)
+        self.removed = list(removed)
+        self.error = error
+        self.skipped = skipped
+
+    @property
+    def drifted(self):
+        return bool(self.added or self.removed)
+
+
+def diff_sorted(expected, actual):
+    """
+    Takes two sorted lists of distinct addresses and returns a
+    (missing, extra) tuple: the addresses only in expected and the
+    addresses only in actual. Runs in a single merge pass.
+    """
+    missing, extra = [], []
+    i = j = 0
+    while i < len(expected) and j < len(actual):
+        if expected[i] == actual[j]:
+            i += 1
+            j += 1
+        elif expected[i] < actual[j]:
+            missing.append(expected[i])
+            i += 1
+        else:
+            extra.append(actual[j])
+            j += 1
+    missing.extend(expected[i:])
+    extra.extend(actual[j:])
+    return missing, extra
+
+
+def sync_group(group, batch_size=500, dry_run=False):
+    """
+    Brings group's mailman roster in line with group.emails, adding and
+    removing at most batch_size addresses per mailman command. Returns a
+    SyncResult.
+    """
+    if MailmanOperation.objects.filter(listname=mailman_cmds.to_listname(group),
+            status__in=(MailmanOperation.PENDING, MailmanOperation.RUNNING)).exists():
+        # the outbox is still working on this list; it'll converge on its own
+        return SyncResult(group.id, skipped=True)
+
+    try:
+        emails = group.emails.values_list('email', flat=True)
+        originals = dict((email.lower(), email) for email in emails)
+        actual = _normalize(mailman_cmds.list_members(group))
+        missing, extra = diff_sorted(sorted(originals), actual)
+        missing = [originals[address] for address in missing]
+        if not dry_run:
+            for batch in _batches(missing, batch_size):
+                mailman_cmds.add_members(group, batch)
+            for batch in _batches(extra, batch_size):
+                mailman_cmds.remove_members(group, batch)
+    except (mailman_cmds.MailmanError, EnvironmentError), e:
+        return SyncResult(group.id, error=str(e))
+    return SyncResult(group.id, missing, extra)
+
+
+def sync_groups(groups, workers=4, batch_size=500, dry_run=False):
+    """
+    Runs sync_group on every group in the iterable groups, working on up to
+    workers lists at once. Yields a SyncResult per group as each finishes.
+    """
+    def sync(group):
+        return sync_group(group, batch_size, dry_run)
+
+    pool = Pool(workers)
+    try:
+        for result in pool.imap_unordered(sync, groups):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _normalize(addresses):
+    # mailman compares addresses case-insensitively
+    return sorted(set(address.lower() for address in addresses))
+
+
+def _batches(items, size):
+    for i in xrange(0, len(items), size):
+        yield items[i:i + size]
@@ -0,0 +1,13 @@
+from group_mail.apps.mailman.tests.backend_tests import *
+from group_mail.apps.mailman.tests.executor_tests import *
+from group_mail.apps.mailman.tests.listconfig_tests import *
+from group_mail.apps.mailman.tests.lru_tests import *
+from group_mail.apps.mailman.tests.outbox_tests import *
+from group_mail.apps.mailman.tests.resolver_tests import *
+from group_mail.apps.mailman.tests.results_tests import *
+from group_mail.apps.mailman.tests.routing_table_tests import *
+from group_mail.apps.mailman.tests.routing_tests import *
+from group_mail.apps.mailman.tests.sender_filter_tests import *
+from group_mail.apps.mailman.tests.stats_tests import *
+from group_mail.apps.mailman.tests.sync_tests import *
+from group_mail.apps.mailman.tests.unix_rpc_tests import *
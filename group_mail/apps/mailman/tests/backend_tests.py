@@ -0,0 +1,147 @@
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from group_mail.apps.common.models import CustomUser, Email
+from group_mail.apps.group.models import Group
+from group_mail.apps.mailman import backends, mailman_cmds, results
+from group_mail.apps.mailman.backends import scripts
+from group_mail.apps.mailman.backends.memory import MemoryBackend
+
+MEMORY_BACKEND = 'group_mail.apps.mailman.backends.memory.MemoryBackend'
+
+
+class MemoryBackendTest(SimpleTestCase):
+    def setUp(self):
+        self.backend = MemoryBackend(latency=0, failure_rate=0)
+        self.backend.newlist('_1', 'owner@gmail.com', 'code')
+
+    def test_membership_outcomes(self):
+        outcomes, errors = self.backend.add_members('_1',
+                ['a@gmail.com', 'A@gmail.com', 'bad address'])
+        self.assertEqual(errors, [])
+        self.assertEqual(outcomes, {'a@gmail.com': results.ADDED,
+                                    'A@gmail.com': results.ALREADY_MEMBER,
+                                    'bad address': results.INVALID})
+        outcomes, errors = self.backend.remove_members('_1',
+                ['A@gmail.com', 'b@gmail.com'])
+        self.assertEqual(outcomes, {'A@gmail.com': results.REMOVED,
+                                    'b@gmail.com': results.NO_SUCH_MEMBER})
+        self.assertEqual(self.backend.list_members('_1'), ([], []))
+
+    def test_list_errors(self):
+        self.assertEqual(self.backend.newlist('_1', 'owner@gmail.com', 'code'),
+                         ['List already exists: _1'])
+        self.assertEqual(self.backend.rmlist('_1'), [])
+        self.assertEqual(self.backend.add_members('_1', ['a@gmail.com']),
+                         ({}, ['No such list: _1']))
+
+    def test_injected_failures(self):
+        backend = MemoryBackend(latency=0, failure_rate=1)
+        self.assertTrue(backend.newlist('_1', 'owner@gmail.com', 'code'))
+        self.assertEqual(backend.lists, {})
+
+
+class ScriptBackendTest(SimpleTestCase):
+    """ Feeds ScriptBackend canned script output instead of running mailman. """
+    def setUp(self):
+        self.old_run_cmd = scripts._run_cmd
+        self.result = ('', '', 0)
+        scripts._run_cmd = lambda *args, **kwargs: self.result
+
+    def tearDown(self):
+        scripts._run_cmd = self.old_run_cmd
+
+    def test_unreported_addresses_fail(self):
+        self.result = ('Subscribed: a@gmail.com\n', '', 0)
+        outcomes, errors = scripts.ScriptBackend().add_members('_1',
+                ['a@gmail.com', 'b@gmail.com'])
+        self.assertEqual(errors, [])
+        self.assertEqual(outcomes, {'a@gmail.com': results.ADDED,
+                                    'b@gmail.com': results.FAILED})
+
+    def test_exit_status(self):
+        self.result = ('', 'Lock timeout\n', 1)
+        backend = scripts.ScriptBackend()
+        self.assertEqual(backend.add_members('_1', ['a@gmail.com'])[1],
+                         ['add_members exited with status 1'])
+        self.assertEqual(backend.remove_members('_1', ['a@gmail.com'])[1],
+                         ['remove_members exited with status 1'])
+
+
+@override_settings(MODIFY_MAILMAN_DB=True, MAILMAN_OUTBOX=False,
+        MAILMAN_BACKEND=MEMORY_BACKEND,
+        MAILMAN_MEMORY_BACKEND={'LATENCY': 0, 'FAILURE_RATE': 0})
+class MemoryBackendGroupTest(TestCase):
+    """ Runs group changes against the in-memory backend. """
+    def setUp(self):
+        backends._backends.pop(MEMORY_BACKEND, None)
+        self.backend = backends.get_backend()
+        CustomUser.objects.create_user(email='creator@gmail.com',
+                send_welcome=False)
+
+    def test_create_group_and_add_members(self):
+        group = Group.objects.create_group('creator@gmail.com', 'name', 'code')
+        listname = mailman_cmds.to_listname(group)
+        self.assertEqual(set(self.backend.lists), set(['name', listname]))
+        self.assertEqual(self.backend.aliases, set(['name', listname]))
+
+        group.add_members(['member@gmail.com'])
+        self.assertEqual(sorted(mailman_cmds.list_members(group)),
+                         ['creator@gmail.com', 'member@gmail.com'])
+
+    def test_newlist_creates_lists_concurrently(self):
+        self.backend.latency = {'default': 0, 'newlist': 0.2}
+        self.backend.jitter = 0
+        group = Group.objects.create_group('creator@gmail.com', 'name', 'code')
+        self.assertEqual(self.backend.max_running, 2)
+        self.assertEqual(set(self.backend.lists),
+                         set(['name', mailman_cmds.to_listname(group)]))
+
+    def test_spare_group_gets_its_internal_list(self):
+        spare = Group.objects.create_spare_group()
+        listname = mailman_cmds.to_listname(spare)
+        self.assertEqual(set(self.backend.lists), set([listname]))
+        self.assertEqual(self.backend.aliases, set([listname]))
+        self.assertEqual(self.backend.lists[listname]['password'], spare.code)
+
+    def test_list_error_raises(self):
+        self.backend.failure_rate = 1
+        self.assertRaises(mailman_cmds.MailmanError,
+                Group.objects.create_group, 'creator@gmail.com', 'name', 'code')
+
+    def test_failed_create_removes_its_lists(self):
+        def add_members(listname, members):
+            return {}, ['No such list: %s' % listname]
+        self.backend.add_members = add_members
+        self.assertRaises(mailman_cmds.MailmanError,
+                Group.objects.create_group, 'creator@gmail.com', 'name', 'code')
+        # (TestCase can't show the group's rollback)
+        self.assertEqual(self.backend.lists, {})
+
+    def test_failing_list_does_not_undo_other_removals(self):
+        groups = [Group.objects.create_group('creator@gmail.com', 'name%d' % i, 'code')
+                  for i in xrange(3)]
+        broken = mailman_cmds.to_listname(groups[0])
+        remove_members = self.backend.remove_members
+
+        def remove_members_unless_broken(listname, members):
+            if listname == broken:
+                return {}, ['No such list: %s' % listname]
+            return remove_members(listname, members)
+        self.backend.remove_members = remove_members_unless_broken
+        Email.objects.get(email='creator@gmail.com').unsubscribe_all()
+        for group in groups:
+            self.assertEqual(group.emails.count(), 0)
+        self.assertEqual(mailman_cmds.list_members(groups[0]), ['creator@gmail.com'])
+        self.assertEqual(mailman_cmds.list_members(groups[1]), [])
+
+    def test_unsubscribe_all_runs_lists_concurrently(self):
+        groups = [Group.objects.create_group('creator@gmail.com', 'name%d' % i, 'code')
+                  for i in xrange(4)]
+        self.backend.latency = {'default': 0.2}
+        self.backend.jitter = 0
+        self.backend.max_running = 0
+        Email.objects.get(email='creator@gmail.com').unsubscribe_all()
+        self.assertEqual(self.backend.max_running, 4)
+        for group in groups:
+            self.assertEqual(mailman_cmds.list_members(group), [])
+            self.assertEqual(group.emails.count(), 0)
@@ -0,0 +1,62 @@
+import time
+import threading
+from django.test import SimpleTestCase
+from group_mail.apps.mailman.executor import (ListExecutor, Timeout, gather,
+        spawn)
+
+
+class ListExecutorTest(SimpleTestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running = set()
+        self.overlapped = False
+        self.max_running = 0
+        self.log = []
+
+    def operation(self, listname, i, seconds=0.05):
+        with self.lock:
+            self.overlapped = self.overlapped or listname in self.running
+            self.running.add(listname)
+            self.max_running = max(self.max_running, len(self.running))
+        time.sleep(seconds)
+        with self.lock:
+            self.running.discard(listname)
+            self.log.append((listname, i))
+        return i
+
+    def test_same_list_is_serial(self):
+        executor = ListExecutor(4)
+        futures = [executor.submit('a', self.operation, 'a', i) for i in xrange(4)]
+        self.assertEqual(gather(futures), [0, 1, 2, 3])
+        self.assertFalse(self.overlapped)
+        self.assertEqual(self.log, [('a', 0), ('a', 1), ('a', 2), ('a', 3)])
+
+    def test_different_lists_are_parallel(self):
+        executor = ListExecutor(4)
+        gather([executor.submit(name, self.operation, name, 0, 0.1)
+                for name in 'abcd'])
+        self.assertEqual(self.max_running, 4)
+
+    def test_bounded(self):
+        executor = ListExecutor(2)
+        gather([executor.submit(name, self.operation, name, 0, 0.1)
+                for name in 'abcd'])
+        self.assertTrue(self.max_running <= 2)
+        self.assertEqual(len(self.log), 4)
+
+    def test_exceptions(self):
+        executor = ListExecutor(1)
+        future = executor.submit('a', int, 'not a number')
+        self.assertRaises(ValueError, future.result)
+        self.assertTrue(isinstance(future.exception(), ValueError))
+        slow = executor.submit('a', time.sleep, 0.2)
+        self.assertRaises(Timeout, slow.result, 0.01)
+        self.assertEqual(slow.result(), None)
+
+    def test_spawn_from_busy_executor(self):
+        executor = ListExecutor(1)
+
+        def wait_on_spawned():
+            return spawn(self.operation, 'b', 1).result(5)
+        self.assertEqual(executor.submit('a', wait_on_spawned).result(5), 1)
+        self.assertRaises(ValueError, spawn(int, 'not a number').result)
@@ -0,0 +1,70 @@
+import os
+import sys
+import types
+import shutil
+import cPickle
+import tempfile
+from django.test import SimpleTestCase
+from group_mail.apps.mailman import listconfig, mailman_cmds, paths
+
+
+class ReadConfigTest(SimpleTestCase):
+    """ Reads config.pck files written to a stand-in mailman dir. """
+    def setUp(self):
+        self.old_root = paths.ROOT_MAILMAN_DIR
+        paths.ROOT_MAILMAN_DIR = tempfile.mkdtemp()
+        listconfig._cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(paths.ROOT_MAILMAN_DIR)
+        paths.ROOT_MAILMAN_DIR = self.old_root
+
+    def write_config(self, listname, data):
+        list_dir = paths.get_list_dir(listname)
+        if not os.path.isdir(list_dir):
+            os.makedirs(list_dir)
+        with open(os.path.join(list_dir, 'config.pck'), 'wb') as f:
+            cPickle.dump(data, f, 1)
+
+    def test_read(self):
+        self.write_config('_1', {'members': {'a@gmail.com': 0,
+                                             'b@gmail.com': 'B@gmail.com'},
+                                 'digest_members': {'c@gmail.com': 0},
+                                 'real_name': '_1', 'password': 'secret'})
+        config = listconfig.read_config('_1')
+        self.assertEqual(config.members, ['B@gmail.com', 'a@gmail.com'])
+        self.assertEqual(config.digest_members, ['c@gmail.com'])
+        self.assertEqual(config.settings, {'real_name': '_1'})
+
+    def test_cached_until_changed(self):
+        self.write_config('_1', {'members': {'a@gmail.com': 0}})
+        config = listconfig.read_config('_1')
+        self.assertTrue(listconfig.read_config('_1') is config)
+
+        self.write_config('_1', {'members': {'a@gmail.com': 0, 'b@gmail.com': 0}})
+        self.assertEqual(listconfig.read_config('_1').members,
+                         ['a@gmail.com', 'b@gmail.com'])
+
+    def test_no_such_list(self):
+        self.assertRaises(mailman_cmds.MailmanError, listconfig.read_config, '_1')
+
+    def test_mailman_objects_are_opaque(self):
+        # pickle an instance of a stand-in Mailman.Bouncer._BounceInfo
+        package = types.ModuleType('Mailman')
+        package.Bouncer = module = types.ModuleType('Mailman.Bouncer')
+
+        class _BounceInfo:
+            pass
+        _BounceInfo.__module__ = module.__name__
+        module._BounceInfo = _BounceInfo
+        sys.modules['Mailman'], sys.modules['Mailman.Bouncer'] = package, module
+        try:
+            self.write_config('_1', {'bounce_info': {'a@gmail.com': _BounceInfo()}})
+        finally:
+            del sys.modules['Mailman'], sys.modules['Mailman.Bouncer']
+        config = listconfig.read_config('_1')
+        self.assertEqual(config.members, [])
+
+    def test_refuses_other_globals(self):
+        self.write_config('_1', {'evil': os.system})
+        self.assertRaises(mailman_cmds.MailmanError, listconfig.read_config, '_1')
@@ -0,0 +1,32 @@
+from django.test import SimpleTestCase
+from group_mail.apps.mailman.lru import LRUCache
+
+
+class LRUCacheTest(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_expires(self):
+        now = [100.0]
+        cache = LRUCache(2, ttl=10, clock=lambda: now[0])
+        cache.set('a', 1)
+        now[0] += 9
+        self.assertEqual(cache.get('a'), 1)
+        now[0] += 1
+        self.assertEqual(cache.get('a'), None)
+        self.assertFalse('a' in cache)
+
+    def test_delete_where(self):
+        cache = LRUCache(10)
+        for i in range(5):
+            cache.set(i, i * i)
+        cache.delete_where(lambda key, value: key % 2 or value == 16)
+        self.assertEqual([key for key in range(5) if key in cache], [0, 2])
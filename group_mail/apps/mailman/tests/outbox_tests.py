@@ -0,0 +1,176 @@
+from django.conf import settings
+from datetime import timedelta
+from django.utils import timezone
+from group_mail.apps.test.test_utils import NoMMTestCase
+from group_mail.apps.common.models import CustomUser
+from group_mail.apps.group.models import Group
+from group_mail.apps.mailman import outbox, mailman_cmds, results
+from group_mail.apps.mailman.models import MailmanOperation
+
+
+class OutboxTest(NoMMTestCase):
+    """
+    Queues mailman operations in the outbox and drains them with stand-ins
+    for the mailman_cmds functions, so no mailman commands are run.
+    """
+    def setUp(self):
+        super(OutboxTest, self).setUp()
+        settings.MODIFY_MAILMAN_DB = True
+        self.old_outbox = settings.MAILMAN_OUTBOX
+        settings.MAILMAN_OUTBOX = True
+        self.old_window = settings.MAILMAN_OUTBOX_COALESCE_WINDOW
+        settings.MAILMAN_OUTBOX_COALESCE_WINDOW = 0
+
+        self.executed = []
+        self.failing = set()  # kinds that should fail
+        self.error = mailman_cmds.MailmanError(['No such list'])  # how they fail
+        self.outcomes = {}  # per-address outcomes other than success
+        self.old_cmds = {}
+        for kind in (MailmanOperation.NEWLIST, MailmanOperation.ADD_MEMBERS,
+                MailmanOperation.REMOVE_MEMBERS):
+            self.old_cmds[kind] = getattr(mailman_cmds, kind)
+            setattr(mailman_cmds, kind, self.fake_cmd(kind))
+
+        self.email = 'myemail@gmail.com'
+        CustomUser.objects.create_user(email=self.email, send_welcome=False)
+
+    def tearDown(self):
+        for kind, cmd in self.old_cmds.items():
+            setattr(mailman_cmds, kind, cmd)
+        settings.MAILMAN_OUTBOX = self.old_outbox
+        settings.MAILMAN_OUTBOX_COALESCE_WINDOW = self.old_window
+        super(OutboxTest, self).tearDown()
+
+    def fake_cmd(self, kind):
+        def cmd(group, members=()):
+            if kind in self.failing:
+                raise self.error
+            self.executed.append((kind, group.id, sorted(members)))
+            outcome = results.ADDED
+            if kind == MailmanOperation.REMOVE_MEMBERS:
+                outcome = results.REMOVED
+            return dict((m, self.outcomes.get(m, outcome)) for m in members)
+        return cmd
+
+    def test_create_group_enqueues_in_order(self):
+        group = Group.objects.create_group(self.email, 'name', 'code')
+        ops = MailmanOperation.objects.all()
+        self.assertEqual([op.kind for op in ops],
+                [MailmanOperation.NEWLIST, MailmanOperation.ADD_MEMBERS])
+        self.assertEqual(ops[1].get_members(), [self.email])
+        self.assertEqual(self.executed, [], 'operation ran inside the request')
+
+        counts = outbox.drain()
+        self.assertEqual(counts['done'], 2)
+        self.assertEqual(self.executed,
+                [(MailmanOperation.NEWLIST, group.id, []),
+                 (MailmanOperation.ADD_MEMBERS, group.id, [self.email])])
+
+    def test_failure_blocks_later_operations_on_list(self):
+        Group.objects.create_group(self.email, 'name', 'code')
+        self.failing.add(MailmanOperation.NEWLIST)
+
+        counts = outbox.drain()
+        self.assertEqual(counts, {'done': 0, 'retried': 1, 'dead': 0})
+        self.assertEqual(self.executed, [])
+
+        newlist_op = MailmanOperation.objects.get(kind=MailmanOperation.NEWLIST)
+        self.assertEqual(newlist_op.status, MailmanOperation.PENDING)
+        self.assertTrue(newlist_op.next_attempt > timezone.now(), 'no backoff')
+
+    def test_dead_letter_after_max_attempts(self):
+        Group.objects.create_group(self.email, 'name', 'code')
+        self.failing.add(MailmanOperation.NEWLIST)
+
+        counts = outbox.drain(max_attempts=1)
+        self.assertEqual(counts['dead'], 1)
+        newlist_op = MailmanOperation.objects.get(kind=MailmanOperation.NEWLIST)
+        self.assertEqual(newlist_op.status, MailmanOperation.DEAD)
+        self.assertTrue(newlist_op.last_error)
+
+        # a dead operation no longer holds up the rest of its list
+        outbox.drain()
+        self.assertEqual(len(self.executed), 1)
+
+    def test_unexpected_errors_are_retried_and_dead_lettered(self):
+        group = Group.objects.create_group(self.email, 'name', 'code')
+        self.failing.update([MailmanOperation.NEWLIST, MailmanOperation.ADD_MEMBERS,
+                             MailmanOperation.REMOVE_MEMBERS])
+        self.error = ValueError('not a mailman error')
+
+        counts = outbox.drain(max_attempts=1)
+        self.assertEqual(counts, {'done': 0, 'retried': 0, 'dead': 1})
+        newlist_op = MailmanOperation.objects.get(kind=MailmanOperation.NEWLIST)
+        self.assertEqual(newlist_op.status, MailmanOperation.DEAD)
+        self.assertEqual(newlist_op.last_error, 'not a mailman error')
+
+        outbox.enqueue(MailmanOperation.REMOVE_MEMBERS, group, ['a@a.com'])
+        counts = outbox.drain(max_attempts=2)
+        self.assertEqual(counts, {'done': 0, 'retried': 2, 'dead': 0})
+        self.assertFalse(MailmanOperation.objects.filter(
+                status=MailmanOperation.RUNNING).exists())
+
+    def test_backoff_doubles(self):
+        self.assertEqual(outbox.backoff(2), 2 * outbox.backoff(1))
+
+    def test_membership_changes_are_coalesced(self):
+        group = Group.objects.create_group(self.email, 'name', 'code')
+        outbox.drain()
+        self.executed = []
+
+        outbox.enqueue(MailmanOperation.ADD_MEMBERS, group, ['a@a.com'])
+        outbox.enqueue(MailmanOperation.ADD_MEMBERS, group, ['b@b.com', 'c@c.com'])
+        outbox.enqueue(MailmanOperation.REMOVE_MEMBERS, group, ['c@c.com'])
+
+        counts = outbox.drain()
+        self.assertEqual(counts['done'], 3)
+        self.assertEqual(sorted(self.executed),
+                [(MailmanOperation.ADD_MEMBERS, group.id, ['a@a.com', 'b@b.com']),
+                 (MailmanOperation.REMOVE_MEMBERS, group.id, ['c@c.com'])])
+
+    def test_membership_changes_collect_for_window(self):
+        group = Group.objects.create_group(self.email, 'name', 'code')
+        outbox.drain()
+        self.executed = []
+
+        outbox.enqueue(MailmanOperation.ADD_MEMBERS, group, ['a@a.com'])
+        self.assertEqual(outbox.drain(window=60)['done'], 0)
+        self.assertEqual(self.executed, [])
+
+        MailmanOperation.objects.update(created=timezone.now() - timedelta(minutes=1))
+        outbox.enqueue(MailmanOperation.ADD_MEMBERS, group, ['b@b.com'])
+        counts = outbox.drain(window=60)
+        # the changes that came in since join the ones whose window is up
+        self.assertEqual(counts['done'], 2)
+        self.assertEqual(self.executed,
+                [(MailmanOperation.ADD_MEMBERS, group.id, ['a@a.com', 'b@b.com'])])
+
+    def test_coalesced_failure_retries_only_failed_members(self):
+        group = Group.objects.create_group(self.email, 'name', 'code')
+        outbox.drain()
+
+        self.failing.add(MailmanOperation.REMOVE_MEMBERS)
+        add_op = outbox.enqueue(MailmanOperation.ADD_MEMBERS, group, ['a@a.com'])
+        rm_op = outbox.enqueue(MailmanOperation.REMOVE_MEMBERS, group, ['b@b.com'])
+
+        counts = outbox.drain()
+        self.assertEqual(counts, {'done': 1, 'retried': 1, 'dead': 0})
+        add_op = MailmanOperation.objects.get(id=add_op.id)
+        rm_op = MailmanOperation.objects.get(id=rm_op.id)
+        self.assertEqual(add_op.status, MailmanOperation.DONE)
+        self.assertEqual(rm_op.status, MailmanOperation.PENDING)
+        self.assertEqual(rm_op.get_members(), ['b@b.com'])
+
+    def test_rejected_members_are_discarded(self):
+        group = Group.objects.create_group(self.email, 'name', 'code')
+        outbox.drain()
+
+        bad = 'bad@bad.com'
+        self.outcomes[bad] = results.INVALID
+        group.add_members(['good@good.com', bad])
+        self.assertEqual(group.emails.filter(email=bad).count(), 1)
+
+        counts = outbox.drain()
+        self.assertEqual(counts['done'], 1, 'rejected address was retried')
+        self.assertEqual(group.emails.filter(email=bad).count(), 0)
+        self.assertEqual(group.emails.filter(email='good@good.com').count(), 1)
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import threading
+from group_mail.apps.test.test_utils import NoMMTestCase
+from group_mail.apps.common.models import CustomUser
+from group_mail.apps.group.models import Group
+from group_mail.apps.mailman import routing, unix_rpc
+from group_mail.apps.mailman.resolver import Resolver
+from group_mail.apps.mailman.mailman_cmds import to_listname
+from group_mail.apps.mailman.tests.routing_tests import _Message
+
+
+class ResolverTest(NoMMTestCase):
+    def setUp(self):
+        super(ResolverTest, self).setUp()
+        CustomUser.objects.create_user(email='creator@gmail.com', send_welcome=False)
+        self.group = Group.objects.create_group('creator@gmail.com', 'name', 'code')
+        self.group.add_members(['Member@gmail.com'])
+        self.resolver = Resolver()
+        self.resolver.refresh(full=True)
+
+    def test_handle_request(self):
+        response = self.resolver.handle_request({
+            'senders': [['CREATOR@gmail.com', 'name'], ['nobody@gmail.com', 'name']],
+            'groups': [str(self.group.id), '0', 'junk']})
+        self.assertEqual(response, {
+            'senders': [to_listname(self.group), None],
+            'groups': ['name', None, None]})
+        self.assertEqual(self.resolver.handle_request({'senders': 'x'}),
+                         {'error': 'malformed request'})
+        self.assertEqual(self.resolver.handle_request([]),
+                         {'error': 'malformed request'})
+
+    def test_refresh(self):
+        other = Group.objects.create_group('creator@gmail.com', 'other', 'code')
+        # groups changed within routing_table.CLOCK_SLACK are reread too
+        self.assertEqual(self.resolver.refresh(), 2)
+        self.assertEqual(self.resolver.listname('creator@gmail.com', 'other'),
+                         to_listname(other))
+        self.assertEqual(self.resolver.group_name(other.id), 'other')
+
+
+class ResolverClientTest(NoMMTestCase):
+    def setUp(self):
+        super(ResolverClientTest, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.dir, 'resolver')
+        self.old_socket = routing.settings.ROUTING_RESOLVER_SOCKET
+        # routing reads our settings module directly, not django's settings
+        routing.settings.ROUTING_RESOLVER_SOCKET = self.socket_path
+        self.old_table = routing._table
+        routing._table = None
+        routing._internal_names.clear()
+        routing._group_names.clear()
+
+        CustomUser.objects.create_user(email='creator@gmail.com', send_welcome=False)
+        self.group = Group.objects.create_group('creator@gmail.com', 'name', 'code')
+        self.other = Group.objects.create_group('creator@gmail.com', 'other', 'code')
+        self.other.add_members(['member@gmail.com'])
+
+    def tearDown(self):
+        routing.settings.ROUTING_RESOLVER_SOCKET = self.old_socket
+        routing._table = self.old_table
+        shutil.rmtree(self.dir)
+        super(ResolverClientTest, self).tearDown()
+
+    def start_resolver(self):
+        resolver = Resolver()
+        resolver.refresh(full=True)
+        sock = unix_rpc.listen(self.socket_path)
+
+        def serve():
+            while True:
+                conn, _ = sock.accept()
+                try:
+                    unix_rpc.handle_connection(conn, resolver.handle_request)
+                finally:
+                    conn.close()
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+
+    def route(self, sender, listname, cc=None):
+        msg = _Message(sender)
+        msg['To'] = listname + '@' + routing.settings.EMAIL_DOMAIN
+        if cc:
+            msg['Cc'] = cc + '@' + routing.settings.EMAIL_DOMAIN
+        return routing.fan_out([(msg, {'listname': listname})])
+
+    def test_routes_from_resolver(self):
+        self.start_resolver()
+        with self.assertNumQueries(0):
+            deliveries = self.route('creator@gmail.com', 'name', cc='other')
+        self.assertEqual([d['listname'] for m, d in deliveries],
+                         [to_listname(self.group), to_listname(self.other)])
+
+    def test_falls_back_without_resolver(self):
+        deliveries = self.route('creator@gmail.com', 'name')
+        self.assertEqual([d['listname'] for m, d in deliveries],
+                         [to_listname(self.group)])
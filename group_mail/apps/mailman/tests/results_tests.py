@@ -0,0 +1,40 @@
+from django.test import SimpleTestCase
+from group_mail.apps.mailman import results
+
+
+class ParseMemberOutputTest(SimpleTestCase):
+    def test_add_members_output(self):
+        members = ['a@a.com', 'B@b.com', 'c@c', 'd@d.com']
+        output = ('Subscribed: a@a.com\n'
+                  'Already a member: b@b.com\n'
+                  'Bad/Invalid email address: c@c\n')
+        outcomes, errors = results.parse_member_output(output, members,
+                default=results.FAILED)
+        self.assertEqual(errors, [])
+        self.assertEqual(outcomes, {'a@a.com': results.ADDED,
+                                    'B@b.com': results.ALREADY_MEMBER,
+                                    'c@c': results.INVALID,
+                                    'd@d.com': results.FAILED})
+        self.assertEqual(sorted(results.failures(outcomes)), ['c@c', 'd@d.com'])
+
+    def test_remove_members_output(self):
+        members = ['a@a.com', 'b@b.com']
+        outcomes, errors = results.parse_member_output(
+                'No such member: b@b.com\n', members, default=results.REMOVED)
+        self.assertEqual(errors, [])
+        self.assertEqual(outcomes, {'a@a.com': results.REMOVED,
+                                    'b@b.com': results.NO_SUCH_MEMBER})
+
+    def test_list_errors(self):
+        outcomes, errors = results.parse_member_output(
+                'No such list: _42\n', ['a@a.com'], default=results.ADDED)
+        self.assertEqual(errors, ['No such list: _42'])
+
+    def test_traceback(self):
+        output = ('Subscribed: a@a.com\n'
+                  'Traceback (most recent call last):\n'
+                  'LockFile.TimeOutError: /var/lib/mailman/locks/_42.lock\n')
+        outcomes, errors = results.parse_member_output(output,
+                ['a@a.com', 'b@b.com'], default=results.FAILED)
+        self.assertEqual(errors, ['Traceback (most recent call last):'])
+        self.assertEqual(outcomes['b@b.com'], results.FAILED)
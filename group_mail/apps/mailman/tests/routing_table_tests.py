@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+from group_mail.apps.test.test_utils import NoMMTestCase
+from group_mail.apps.common.models import CustomUser
+from group_mail.apps.group.models import Group
+from group_mail.apps.mailman import routing_table
+from group_mail.apps.mailman.mailman_cmds import to_listname
+
+
+class RoutingTableTest(NoMMTestCase):
+    def setUp(self):
+        super(RoutingTableTest, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'routes')
+        self.table = routing_table.RoutingTable(self.path, check_interval=0)
+
+        CustomUser.objects.create_user(email='creator@gmail.com', send_welcome=False)
+        self.group = Group.objects.create_group('creator@gmail.com', 'name', 'code')
+        self.other = Group.objects.create_group('creator@gmail.com', 'other', 'code')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        super(RoutingTableTest, self).tearDown()
+
+    def test_lookups(self):
+        self.assertEqual(self.table.listname('creator@gmail.com', 'name'), None)
+        routing_table.build(self.path)
+        self.assertEqual(self.table.listname('Creator@gmail.com', 'name'),
+                         to_listname(self.group))
+        self.assertEqual(self.table.listname('creator@gmail.com', 'other'),
+                         to_listname(self.other))
+        self.assertEqual(self.table.listname('creator@gmail.com', 'nam'), None)
+        self.assertEqual(self.table.listname('nobody@gmail.com', 'name'), None)
+        self.assertEqual(self.table.group_name(self.group.id), 'name')
+        self.assertEqual(self.table.group_name(self.other.id + 1), None)
+
+    def test_incremental_build(self):
+        self.assertEqual(routing_table.build(self.path), 2)
+        self.group.add_members(['member@gmail.com'])
+        self.other.name = 'renamed'
+        self.other.save()
+        Group.objects.filter(id=self.other.id).update(
+                members_changed=self.group.members_changed.replace(year=2000))
+        Group.objects.filter(id=self.group.id).update(
+                members_changed=self.group.members_changed.replace(year=3000))
+
+        self.assertEqual(routing_table.build(self.path), 2)
+        self.assertEqual(self.table.listname('member@gmail.com', 'name'),
+                         to_listname(self.group))
+        self.assertEqual(self.table.group_name(self.other.id), 'renamed')
+        self.assertEqual(self.table.listname('creator@gmail.com', 'renamed'),
+                         to_listname(self.other))
+        self.assertEqual(self.table.listname('creator@gmail.com', 'other'), None)
+
+        # nothing changed since
+        Group.objects.update(members_changed=self.group.members_changed.replace(year=2000))
+        self.assertEqual(routing_table.build(self.path), 0)
+        self.assertEqual(self.table.listname('member@gmail.com', 'name'),
+                         to_listname(self.group))
+
+    def test_deleted_group(self):
+        routing_table.build(self.path)
+        other_id = self.other.id
+        self.other.delete()
+        routing_table.build(self.path)
+        self.assertEqual(self.table.group_name(other_id), None)
+        self.assertEqual(self.table.listname('creator@gmail.com', 'other'), None)
@@ -0,0 +1,253 @@
+import os
+import json
+import sys
+import shutil
+import tempfile
+import subprocess
+from email.message import Message
+from django.conf import settings
+from django.test import SimpleTestCase
+from group_mail.apps.test.test_utils import NoMMTestCase
+from group_mail.apps.common.models import CustomUser
+from group_mail.apps.group.models import Group
+from group_mail.apps.mailman import redirect, routing, routing_table
+from group_mail.apps.mailman.stats import Stats
+from group_mail.apps.mailman.mailman_cmds import to_listname
+
+# what importing the routing module may cost a mailman qrunner. The module
+# budgets are exact; the time and memory ones leave plenty of headroom for a
+# loaded or cold box, and only catch something heavy (like django) creeping in.
+IMPORT_MODULES_BUDGET = 150
+IMPORT_GROUP_MAIL_MODULES_BUDGET = 15
+IMPORT_SECONDS_BUDGET = 2.0
+IMPORT_RSS_KB_BUDGET = 32 * 1024
+
+IMPORT_SCRIPT = """
+import resource, sys, time
+loaded = set(sys.modules)
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started = time.time()
+from group_mail.apps.mailman import routing
+print time.time() - started
+# ru_maxrss is in kilobytes on linux
+print resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+new = [m for m in set(sys.modules) - loaded if sys.modules[m] is not None]
+print len(new)
+print ' '.join(m for m in new if m.split('.')[0] == 'group_mail')
+print ' '.join(m for m in new if m.split('.')[0] == 'django')
+"""
+
+
+class RoutingImportTest(SimpleTestCase):
+    def test_import_budget(self):
+        project_dir = os.path.dirname(settings.PROJECT_DIR)
+        output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT],
+                cwd=project_dir)
+        seconds, rss_kb, modules, group_mail_modules, django_modules = \
+                (output.split('\n') + [''] * 5)[:5]
+        self.assertEqual(django_modules, '')
+        self.assertTrue(int(modules) <= IMPORT_MODULES_BUDGET,
+                'importing routing loaded %s modules' % modules)
+        self.assertTrue(len(group_mail_modules.split()) <= IMPORT_GROUP_MAIL_MODULES_BUDGET,
+                'importing routing loaded %s' % group_mail_modules)
+        self.assertTrue(float(seconds) < IMPORT_SECONDS_BUDGET,
+                'importing routing took %ss' % seconds)
+        self.assertTrue(int(rss_kb) < IMPORT_RSS_KB_BUDGET,
+                'importing routing grew rss by %skB' % rss_kb)
+
+
+class RedirectListTest(NoMMTestCase):
+    def setUp(self):
+        super(RedirectListTest, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'routes')
+        self.old_table = routing._table
+        routing._table = None
+        self.old_mailman = routing.MailList, routing.CalcRecips
+        routing._internal_names.clear()
+        routing._group_names.clear()
+        routing._hops.clear()
+
+        CustomUser.objects.create_user(email='creator@gmail.com', send_welcome=False)
+        self.group = Group.objects.create_group('creator@gmail.com', 'name', 'code')
+
+    def tearDown(self):
+        routing._table = self.old_table
+        routing.MailList, routing.CalcRecips = self.old_mailman
+        shutil.rmtree(self.dir)
+        super(RedirectListTest, self).tearDown()
+
+    def message(self, sender, listname):
+        msg = _Message(sender)
+        msg['To'] = listname + '@' + settings.EMAIL_DOMAIN
+        return msg, {'listname': listname}
+
+    def route(self, sender, listname):
+        msg, data = self.message(sender, listname)
+        routing.redirect_list(msg, data)
+        return data['listname']
+
+    def test_routes_from_table(self):
+        routing_table.build(self.path)
+        routing._table = routing_table.RoutingTable(self.path)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.route('creator@gmail.com', 'name'),
+                             to_listname(self.group))
+            self.assertEqual(self.route('creator@gmail.com', to_listname(self.group)),
+                             'name')
+
+    def test_falls_back_to_db(self):
+        routing._table = routing_table.RoutingTable(self.path)  # no table yet
+        self.assertEqual(self.route('creator@gmail.com', 'name'),
+                         to_listname(self.group))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.route('creator@gmail.com', 'name'),
+                             to_listname(self.group))
+
+    def test_batch(self):
+        self.group.add_members(['member@gmail.com'])
+        other = Group.objects.create_group('creator@gmail.com', 'other', 'code')
+        routing._get_models()
+        messages = [self.message('creator@gmail.com', 'name'),
+                    self.message('member@gmail.com', 'name'),
+                    self.message('creator@gmail.com', 'name'),
+                    self.message('member@gmail.com', 'other'),
+                    self.message('creator@gmail.com', to_listname(other)),
+                    self.message('creator@gmail.com', to_listname(self.group))]
+        with self.assertNumQueries(2):
+            routing.redirect_lists(messages)
+        self.assertEqual([data['listname'] for msg, data in messages],
+                         [to_listname(self.group), to_listname(self.group),
+                          to_listname(self.group), 'other', 'other', 'name'])
+        self.assertEqual(messages[0][0]['To'],
+                         to_listname(self.group) + '@' + settings.EMAIL_DOMAIN)
+
+    def test_fan_out(self):
+        self.group.add_members(['member@gmail.com'])
+        other = Group.objects.create_group('creator@gmail.com', 'other', 'code')
+        other.add_members(['member2@gmail.com', 'nomail@gmail.com'])
+        domain = '@' + settings.EMAIL_DOMAIN
+        # the recipients mailman picks for each list, leaving out the member
+        # with delivery disabled
+        routing.MailList, routing.CalcRecips = _MailList, _CalcRecips({
+                to_listname(self.group): ['creator@gmail.com', 'member@gmail.com'],
+                to_listname(other): ['Creator@gmail.com', 'member2@gmail.com']})
+
+        def copy_for(listname):
+            msg, data = self.message('creator@gmail.com', listname)
+            msg.replace_header('To', 'Someone <someone@gmail.com>, name' + domain)
+            msg['Cc'] = 'other' + domain.upper()
+            return msg, data
+
+        msg, data = copy_for('name')
+        deliveries = routing.fan_out([(msg, data)])
+        self.assertEqual([(m, d['listname']) for m, d in deliveries],
+                         [(msg, to_listname(self.group)), (msg, to_listname(other))])
+        self.assertEqual(msg['To'], '%s%s, %s%s' % (to_listname(self.group), domain,
+                                                    to_listname(other), domain))
+        self.assertEqual([d['recips'] for m, d in deliveries],
+                         [['creator@gmail.com', 'member@gmail.com'],
+                          ['member2@gmail.com']])
+
+        # the copy postfix delivered for other is covered by the one for name
+        covered = copy_for('other')
+        self.assertEqual(routing.fan_out([covered]), [])
+        self.assertEqual(covered[1]['pipeline'], [])
+        # the extra delivery, once queued, goes through as it is
+        self.assertEqual(routing.fan_out([deliveries[1]]), [deliveries[1]])
+
+        # without fan_out, each copy is routed to its own list, as before
+        msg, data = copy_for('other')
+        routing.redirect_list(msg, data)
+        self.assertEqual(data, {'listname': to_listname(other)})
+        self.assertEqual(msg['To'], to_listname(other) + domain)
+
+    def test_single_list_is_not_marked(self):
+        msg, data = self.message('creator@gmail.com', 'name')
+        self.assertEqual(routing.fan_out([(msg, data)]), [(msg, data)])
+        self.assertFalse(routing.ROUTED in data)
+        # so that it's routed again if it comes back to us
+        msg, data = self.message('creator@gmail.com', data['listname'])
+        routing.redirect_list(msg, data)
+        self.assertEqual(data['listname'], 'name')
+
+    def test_redirect_fanned_out(self):
+        other = Group.objects.create_group('creator@gmail.com', 'other', 'code')
+        msg, data = self.message('creator@gmail.com', 'name')
+        msg['Cc'] = 'other@' + settings.EMAIL_DOMAIN
+        queued = []
+
+        class Switchboard(object):
+            def enqueue(self, msg, data):
+                queued.append((msg, data))
+        redirect.redirect_fanned_out(Switchboard(), msg, data)
+        self.assertEqual(data['listname'], to_listname(self.group))
+        self.assertEqual([(m, d['listname']) for m, d in queued],
+                         [(msg, to_listname(other))])
+        # outside mailman, the recipients are left to it
+        self.assertFalse('recips' in data)
+
+    def test_stats(self):
+        path = os.path.join(self.dir, 'stats')
+        old_stats, routing._stats = routing._stats, Stats(path)
+        try:
+            self.route('creator@gmail.com', 'name')
+            self.route('creator@gmail.com', 'name')
+            self.route('stranger@gmail.com', 'name')
+            routing._stats.flush()
+        finally:
+            routing._stats = old_stats
+        with open(path) as f:
+            flushed = json.loads(f.read())
+        self.assertEqual(flushed['counters']['route.messages'], 3)
+        self.assertEqual(flushed['counters']['route.senders.miss'], 2)
+        self.assertEqual(flushed['counters']['route.senders.cache_hit'], 1)
+        self.assertEqual(flushed['counters']['route.senders.unknown'], 1)
+        for step in ('parse', 'sender', 'lookup', 'rewrite', 'senders.db'):
+            self.assertTrue('route.' + step in flushed['timers'], step)
+
+    def test_loop(self):
+        def bounce(listname):
+            msg, data = self.message('creator@gmail.com', listname)
+            msg['Message-ID'] = '<loop@gmail.com>'
+            routing.redirect_list(msg, data)
+            return 'pipeline' not in data
+
+        for i in xrange(settings.ROUTING_MAX_HOPS):
+            self.assertTrue(bounce('name'))
+            self.assertTrue(bounce(to_listname(self.group)))
+        self.assertFalse(bounce('name'), 'looping message was not discarded')
+        self.assertEqual(len(routing._hops.get('<loop@gmail.com>')),
+                         2 * settings.ROUTING_MAX_HOPS + 1)
+
+    def test_membership_change_invalidates(self):
+        self.assertEqual(self.route('member@gmail.com', 'name'), 'name')
+        self.group.add_members(['member@gmail.com'])
+        self.assertEqual(self.route('member@gmail.com', 'name'),
+                         to_listname(self.group))
+
+
+class _Message(Message):
+    # stands in for mailman's Message, which knows its sender
+    def __init__(self, sender):
+        Message.__init__(self)
+        self.sender = sender
+
+    def get_sender(self):
+        return self.sender
+
+
+class _MailList(object):
+    # stands in for mailman's MailList
+    def __init__(self, listname, lock=True):
+        self.listname = listname
+
+
+class _CalcRecips(object):
+    # stands in for mailman's CalcRecips handler, given the recipients it
+    # picks for each list
+    def __init__(self, recips):
+        self.recips = recips
+
+    def process(self, mlist, msg, msgdata):
+        msgdata['recips'] = list(self.recips[mlist.listname])
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+from django.test.utils import override_settings
+from group_mail.apps.test.test_utils import NoMMTestCase
+from group_mail.apps.common.models import CustomUser
+from group_mail.apps.group.models import Group
+from group_mail.apps.mailman import routing, sender_filter
+from group_mail.apps.mailman.mailman_cmds import to_listname
+from group_mail.apps.mailman.tests.routing_tests import _Message
+
+
+class SenderFilterTest(NoMMTestCase):
+    def setUp(self):
+        super(SenderFilterTest, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'senders')
+        self.filter = sender_filter.SenderFilter(self.path, check_interval=0)
+        CustomUser.objects.create_user(email='creator@gmail.com', send_welcome=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        super(SenderFilterTest, self).tearDown()
+
+    def test_no_filter(self):
+        self.assertTrue(self.filter.might_know('stranger@gmail.com'))
+
+    def test_build(self):
+        self.assertEqual(sender_filter.build(self.path, 0.0001), 1)
+        self.assertTrue(self.filter.might_know('Creator@gmail.com'))
+        self.assertFalse(self.filter.might_know('stranger@gmail.com'))
+
+    def test_new_email(self):
+        sender_filter.build(self.path, 0.0001)
+        with override_settings(SENDER_FILTER_FILE=self.path):
+            CustomUser.objects.create_user(email='new@gmail.com', send_welcome=False)
+        self.assertTrue(self.filter.might_know('new@gmail.com'))
+
+    def test_error_rate(self):
+        sender_filter.build(self.path, 0.01)
+        sender_filter.add(self.path, ['member%d@gmail.com' % i for i in xrange(999)])
+        self.assertTrue(all(self.filter.might_know('member%d@gmail.com' % i)
+                            for i in xrange(999)))
+        known = sum(self.filter.might_know('stranger%d@gmail.com' % i)
+                    for i in xrange(10000))
+        self.assertTrue(known < 200, '%d false positives' % known)
+        self.assertRaises(ValueError, sender_filter.get_size, 1000, 0)
+
+    def test_routing_skips_db(self):
+        group = Group.objects.create_group('creator@gmail.com', 'name', 'code')
+        sender_filter.build(self.path, 0.0001)
+        old_senders, routing._senders = routing._senders, self.filter
+        old_table, routing._table = routing._table, None
+        routing._internal_names.clear()
+        try:
+            with self.assertNumQueries(0):
+                self.assertEqual(self.route('stranger@gmail.com', 'name'), 'name')
+            self.assertEqual(self.route('creator@gmail.com', 'name'),
+                             to_listname(group))
+        finally:
+            routing._senders, routing._table = old_senders, old_table
+
+    def route(self, sender, listname):
+        msg = _Message(sender)
+        msg['To'] = listname + '@' + routing.settings.EMAIL_DOMAIN
+        data = {'listname': listname}
+        routing.redirect_list(msg, data)
+        return data['listname']
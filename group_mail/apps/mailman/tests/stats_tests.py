@@ -0,0 +1,68 @@
+import os
+import json
+import socket
+import shutil
+import tempfile
+from django.test import SimpleTestCase
+from group_mail.apps.mailman.stats import Stats, NullStats, get_stats
+
+
+class StatsTest(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'stats')
+        self.now = [1000.0]
+        self.stats = Stats(self.path, interval=60, clock=lambda: self.now[0])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_flushes_every_interval(self):
+        self.stats.incr('messages')
+        self.stats.incr('messages', 2)
+        for seconds in (0.000005, 0.00005, 0.00006, 5):
+            self.stats.record('lookup', seconds)
+        self.now[0] += 59
+        self.stats.maybe_flush()
+        self.assertFalse(os.path.exists(self.path))
+
+        self.now[0] += 1
+        self.stats.maybe_flush()
+        [flushed] = self.read()
+        self.assertEqual(flushed['interval'], 60)
+        self.assertEqual(flushed['counters'], {'messages': 3})
+        lookup = flushed['timers']['lookup']
+        self.assertEqual(lookup['count'], 4)
+        self.assertEqual(lookup['max'], 5)
+        self.assertEqual(lookup['buckets'], {'10': 1, '100': 2, 'inf': 1})
+
+        # each flush starts afresh
+        self.stats.incr('messages')
+        self.stats.flush()
+        self.assertEqual(self.read()[1]['counters'], {'messages': 1})
+
+    def test_udp_sink(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        try:
+            stats = Stats('udp://127.0.0.1:%d' % server.getsockname()[1])
+            with stats.timer('parse'):
+                pass
+            stats.flush()
+            flushed = json.loads(server.recv(65536))
+        finally:
+            server.close()
+        self.assertEqual(flushed['timers']['parse']['count'], 1)
+
+    def test_unwritable_sink(self):
+        stats = Stats(os.path.join(self.dir, 'missing', 'stats'))
+        stats.incr('messages')
+        stats.flush()
+
+    def test_disabled(self):
+        self.assertTrue(isinstance(get_stats(None), NullStats))
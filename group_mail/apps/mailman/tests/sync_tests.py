@@ -0,0 +1,65 @@
+from datetime import timedelta
+from django.test import SimpleTestCase
+from django.utils import timezone
+from group_mail.apps.test.test_utils import NoMMTestCase
+from group_mail.apps.common.models import CustomUser
+from group_mail.apps.group.models import Group
+from group_mail.apps.mailman import sync, mailman_cmds
+from group_mail.apps.mailman.management.commands import sync_mailman
+
+
+class DiffSortedTest(SimpleTestCase):
+    def test_diff(self):
+        missing, extra = sync.diff_sorted(['a', 'b', 'd', 'f'], ['b', 'c', 'd', 'e'])
+        self.assertEqual(missing, ['a', 'f'])
+        self.assertEqual(extra, ['c', 'e'])
+
+    def test_no_drift(self):
+        self.assertEqual(sync.diff_sorted(['a', 'b'], ['a', 'b']), ([], []))
+
+
+class SyncGroupTest(NoMMTestCase):
+    """ Syncs against a stand-in mailman roster. """
+    def setUp(self):
+        super(SyncGroupTest, self).setUp()
+        self.roster = set()
+        self.old_cmds = (mailman_cmds.list_members, mailman_cmds.add_members,
+                         mailman_cmds.remove_members)
+        mailman_cmds.list_members = lambda group: list(self.roster)
+        mailman_cmds.add_members = lambda group, members: self.roster.update(members)
+        mailman_cmds.remove_members = \
+                lambda group, members: self.roster.difference_update(members)
+
+        email = 'Creator@gmail.com'
+        CustomUser.objects.create_user(email=email, send_welcome=False)
+        self.group = Group.objects.create_group(email, 'name', 'code')
+
+    def tearDown(self):
+        (mailman_cmds.list_members, mailman_cmds.add_members,
+                mailman_cmds.remove_members) = self.old_cmds
+        super(SyncGroupTest, self).tearDown()
+
+    def test_sync_fixes_drift(self):
+        self.roster.update(['stale@gmail.com'])
+        result = sync.sync_group(self.group, batch_size=1)
+        self.assertEqual(result.added, ['Creator@gmail.com'])
+        self.assertEqual(result.removed, ['stale@gmail.com'])
+        self.assertEqual(self.roster, set(['Creator@gmail.com']))
+
+    def test_dry_run_changes_nothing(self):
+        result = sync.sync_group(self.group, dry_run=True)
+        self.assertTrue(result.drifted)
+        self.assertEqual(self.roster, set())
+
+    def test_case_differences_are_not_drift(self):
+        self.roster.update(['creator@gmail.com'])
+        self.assertFalse(sync.sync_group(self.group).drifted)
+
+    def test_watermark_stays_behind_skipped_groups(self):
+        command = sync_mailman.Command()
+        now = timezone.now()
+        self.assertEqual(command.get_watermark(now, []), now)
+        changed = now - timedelta(days=1)
+        Group.objects.filter(id=self.group.id).update(members_changed=changed)
+        # the next run checks the group we skipped again
+        self.assertEqual(command.get_watermark(now, [self.group.id]), changed)
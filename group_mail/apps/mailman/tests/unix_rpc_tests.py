@@ -0,0 +1,42 @@
+import json
+import socket
+import threading
+from django.test import SimpleTestCase
+from group_mail.apps.mailman import unix_rpc, worker
+
+
+class HandleConnectionTest(SimpleTestCase):
+    def setUp(self):
+        self.client, server = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.thread = threading.Thread(target=unix_rpc.handle_connection,
+                                       args=(server, self.handle))
+        self.thread.daemon = True
+        self.thread.start()
+        self.f = self.client.makefile('rb')
+
+    def tearDown(self):
+        self.f.close()
+        self.client.close()
+        self.thread.join(5)
+
+    def handle(self, request):
+        if request == 'crash':
+            raise ValueError('bad request')
+        if request == 'latin-1':
+            return {'stdout': 'Subscribed: caf\xe9@gmail.com\n'}
+        return {'echo': request}
+
+    def call(self, request):
+        self.client.sendall(json.dumps(request) + '\n')
+        return json.loads(self.f.readline())
+
+    def test_keeps_serving_after_errors(self):
+        self.assertEqual(self.call('crash'), {'error': 'ValueError: bad request'})
+        self.assertTrue('error' in self.call('latin-1'))
+        self.assertEqual(self.call('hello'), {'echo': 'hello'})
+
+
+class WorkerOutputTest(SimpleTestCase):
+    def test_output_is_text(self):
+        self.assertEqual(worker._text('caf\xe9'), u'caf\ufffd')
+        json.dumps(worker._text('caf\xe9'))
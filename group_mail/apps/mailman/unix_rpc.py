@@ -0,0 +1,111 @@
+"""
+A tiny request/response protocol over a local Unix socket.
+
+Each request and each response is a single line of JSON. A connection may
+carry any number of request/response pairs.
+"""
+
+import os
+import json
+import socket
+import traceback
+
+
+class RPCError(Exception):
+    """ Raised when the other end of the socket misbehaves. """
+    pass
+
+
+def call(path, request, timeout=None):
+    """
+    Sends request (a json-serializable object) to the server listening on the
+    Unix socket at path and returns the decoded response.
+
+    Raises socket.error if the server can't be reached or times out, and
+    RPCError if the server hangs up or sends something we can't decode.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+        sock.sendall(json.dumps(request) + '\n')
+        f = sock.makefile('rb')
+        try:
+            line = f.readline()
+        finally:
+            f.close()
+    finally:
+        sock.close()
+    return _decode(line)
+
+
+def serve(path, handler, mode=0660):
+    """
+    Listens on the Unix socket at path forever, calling handler(request) for
+    each request and sending back its return value.
+
+    Connections are handled one at a time, so handler never runs concurrently
+    with itself.
+    """
+    sock = listen(path, mode)
+    try:
+        while True:
+            conn, _ = sock.accept()
+            try:
+                handle_connection(conn, handler)
+            finally:
+                conn.close()
+    finally:
+        sock.close()
+        _unlink(path)
+
+
+def listen(path, mode=0660):
+    """ Returns a listening socket bound to path, replacing any stale socket. """
+    _unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, mode)
+    sock.listen(socket.SOMAXCONN)
+    return sock
+
+
+def handle_connection(conn, handler):
+    """
+    Answers the requests on conn until the client hangs up. A request the
+    handler fails on gets an {'error': ...} response, so that one bad
+    request can't take the server down.
+    """
+    f = conn.makefile('rb')
+    try:
+        for line in iter(f.readline, ''):
+            try:
+                response = json.dumps(handler(_decode(line)))
+            except RPCError, e:
+                response = json.dumps({'error': str(e)})
+            except Exception, e:
+                # including a response json can't encode
+                traceback.print_exc()
+                response = json.dumps({'error': '%s: %s' % (type(e).__name__, e)})
+            conn.sendall(response + '\n')
+    except socket.error:
+        # the client went away; nothing more to do for it
+        pass
+    finally:
+        f.close()
+
+
+def _decode(line):
+    if not line:
+        raise RPCError('connection closed before a response was received')
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise RPCError('malformed message: %r' % line[:100])
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
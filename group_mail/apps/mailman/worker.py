@@ -0,0 +1,101 @@
+"""
+A long-lived, privileged process that runs mailman's bin/ scripts on behalf
+of the web and sms processes.
+
+Spawning sudo and a fresh python interpreter for every add_members or
+remove_members call costs a few hundred milliseconds. The worker is started
+once (as root or the mailman user) and runs the scripts inside its own
+interpreter, so mailman's modules are only imported the first time they're
+needed. It listens on a Unix socket; see unix_rpc for the wire format.
+
+A request looks like:
+    {'args': ['/var/lib/mailman/bin/add_members', '-r', '-', '_42'],
+     'stdin': 'brian@gmail.com\\nellie@gmail.com'}
+
+and the response like:
+    {'stdout': '...', 'stderr': '...', 'status': 0}
+"""
+
+import os
+import sys
+import runpy
+import traceback
+from cStringIO import StringIO
+from group_mail.apps.mailman import paths, unix_rpc
+
+# the scripts the worker is willing to run
+ALLOWED_SCRIPTS = ('add_members', 'remove_members', 'newlist', 'rmlist',
+                   'dumpdb', 'list_members', 'change_pw')
+
+
+def serve(socket_path, mode=0660):
+    # mailman's scripts start with 'import paths', which lives in bin/
+    bin_dir = os.path.join(paths.ROOT_MAILMAN_DIR, 'bin')
+    if bin_dir not in sys.path:
+        sys.path.insert(0, bin_dir)
+    unix_rpc.serve(socket_path, handle_request, mode)
+
+
+def handle_request(request):
+    try:
+        args = [str(arg) for arg in request['args']]
+        stdin = request.get('stdin') or ''
+    except (KeyError, TypeError):
+        return {'error': 'malformed request'}
+
+    if args and args[0] == 'sudo':
+        args = args[1:]
+    if not args:
+        return {'error': 'no command given'}
+
+    script_name = os.path.basename(args[0])
+    if script_name not in ALLOWED_SCRIPTS:
+        return {'error': 'command not allowed: %s' % script_name}
+
+    args[0] = paths.get_script_dir(script_name)
+    return run_script(args, stdin.encode('utf-8'))
+
+
+def run_script(args, stdin):
+    """
+    Runs the python script args[0] with argv set to args and stdin fed from
+    the string stdin. Returns the script's output and exit status.
+
+    This swaps out the process-wide sys.argv and std streams, so it must
+    never run in more than one thread at a time.
+    """
+    stdout, stderr = StringIO(), StringIO()
+    saved = sys.argv, sys.stdin, sys.stdout, sys.stderr
+    sys.argv, sys.stdin, sys.stdout, sys.stderr = args, StringIO(stdin), stdout, stderr
+    status = 0
+    try:
+        try:
+            runpy.run_path(args[0], run_name='__main__')
+        except SystemExit, e:
+            status = _exit_status(e.code)
+        except Exception:
+            traceback.print_exc()
+            status = 1
+    finally:
+        sys.argv, sys.stdin, sys.stdout, sys.stderr = saved
+
+    return {'stdout': _text(stdout.getvalue()),
+            'stderr': _text(stderr.getvalue()),
+            'status': status}
+
+
+def _text(output):
+    # the response is json, which needs text; an address mailman echoes
+    # back needn't be utf-8
+    return output.decode('utf-8', 'replace')
+
+
+def _exit_status(code):
+    """ Mimics the way the interpreter turns sys.exit()'s argument into a status. """
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    # sys.exit('message') prints the message and exits with status 1
+    print >>sys.stderr, code
+    return 1
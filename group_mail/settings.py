@@ -4,6 +4,85 @@ import os.path  # used to make paths generic
 DEBUG = True
 TEMPLATE_DEBUG = DEBUG
 MODIFY_MAILMAN_DB = True  # not DEBUG
+# If set, mailman commands are sent to the worker listening on this Unix
+# socket (see manage.py mailman_worker) instead of spawning sudo each time.
+# We fall back to spawning sudo if the worker can't be reached.
+MAILMAN_WORKER_SOCKET = None
+MAILMAN_WORKER_TIMEOUT = 30  # seconds
+# What carries out mailman operations (see group_mail.apps.mailman.backends):
+# ScriptBackend runs mailman's bin/ scripts; ApiBackend uses mailman's python
+# API inside our own process (which must be able to write mailman's lists/
+# and locks/ dirs); MemoryBackend fakes mailman, for load testing.
+MAILMAN_BACKEND = 'group_mail.apps.mailman.backends.scripts.ScriptBackend'
+# Injected latency (seconds) and failures for MemoryBackend
+MAILMAN_MEMORY_BACKEND = {
+    'LATENCY': {'default': 0.3, 'newlist': 1.5, 'rmlist': 0.5,
+                'add_aliases': 0.01},
+    'JITTER': 0.5,  # latency varies by up to this fraction either way
+    'FAILURE_RATE': 0.0,
+    'SEED': None,
+}
+MAILMAN_PREFIX = '/usr/lib/mailman'  # where mailman's python package lives
+# If True, mailman changes are queued in the db and carried out by
+# manage.py mailman_outbox rather than inside the request.
+MAILMAN_OUTBOX = False
+# most mailman operations (on different lists) run at once; see mailman.executor
+MAILMAN_CONCURRENCY = 8
+MAILMAN_OUTBOX_MAX_ATTEMPTS = 8
+MAILMAN_OUTBOX_BACKOFF = 30  # seconds before the first retry; doubles after that
+MAILMAN_OUTBOX_MAX_BACKOFF = 60 * 60  # seconds
+# seconds the outbox collects membership changes to a list for before
+# sending them to mailman together
+MAILMAN_OUTBOX_COALESCE_WINDOW = 2
+# where manage.py sync_mailman remembers when it last finished
+MAILMAN_SYNC_WATERMARK_FILE = '/var/tmp/group_mail_sync_mailman.watermark'
+# number of spare, already-created lists manage.py maintain_list_pool keeps
+# around for create_group to claim
+MAILMAN_LIST_POOL_SIZE = 20
+
+# number of parsed list configs (see mailman.listconfig) kept per process
+MAILMAN_CONFIG_CACHE_SIZE = 2000
+
+# how many resolved listnames redirect_list keeps, and for how long (seconds)
+REDIRECT_CACHE_SIZE = 10000
+REDIRECT_CACHE_TTL = 60
+
+# the routing table redirect_list reads (see manage.py build_routing_table);
+# None to always resolve listnames from the db
+ROUTING_TABLE_FILE = '/var/tmp/group_mail_routing_table'
+
+# the filter of known senders redirect_list checks before looking a sender
+# up in the db (see manage.py build_sender_filter); None to not filter.
+# SENDER_FILTER_ERROR_RATE is the share of unknown senders it lets through.
+SENDER_FILTER_FILE = '/var/tmp/group_mail_sender_filter'
+SENDER_FILTER_ERROR_RATE = 0.001
+
+# If set, redirect_list asks the resolver listening on this Unix socket (see
+# manage.py routing_resolver), falling back to its own lookups if the
+# resolver doesn't answer within ROUTING_RESOLVER_TIMEOUT seconds
+ROUTING_RESOLVER_SOCKET = None
+ROUTING_RESOLVER_TIMEOUT = 0.5
+# redirect_list drops a message that reaches the same list more than
+# ROUTING_MAX_HOPS times within ROUTING_LOOP_TTL seconds, remembering the
+# last ROUTING_LOOP_CACHE_SIZE messages
+ROUTING_MAX_HOPS = 3
+ROUTING_LOOP_TTL = 60 * 60
+ROUTING_LOOP_CACHE_SIZE = 10000
+# log each routing step to mailman's debug log
+ROUTING_DEBUG = False
+# where routing timings and counters go (see mailman.stats): a file, or
+# udp://host:port; None to not collect them
+ROUTING_STATS_SINK = None
+ROUTING_STATS_INTERVAL = 60  # seconds between flushes
+
+# The postfix mysql database holding the aliases that route list mail to mailman
+MAILDB = {
+    'HOST': 'localhost',
+    'USER': 'root',
+    'PASSWORD': 'root',
+    'NAME': 'maildb',
+    'POOL_SIZE': 4,  # max idle connections kept per process
+}
 PROJECT_DIR = os.path.dirname(__file__)
 
 ADMINS = (
@@ -144,6 +223,7 @@ INSTALLED_APPS = (
     'group_mail.apps.sms',
     'group_mail.apps.common',
     'group_mail.apps.group',
+    'group_mail.apps.mailman',
 )
 
 # A sample logging configuration. The only tangible logging